@@ -3,15 +3,18 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import hashlib
 import os
 import sys
 import zipfile
 from datetime import date
 from array import array
+from multiprocessing import Pool
+from struct import Struct
 
 from .profilehooks import profile
 
-from sqlalchemy import select, Index, func, and_
+from sqlalchemy import select, Index, func, and_, bindparam
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.schema import DropIndex
 
@@ -20,9 +23,14 @@ from pychess.Utils.const import *
 from pychess.Utils.lutils.LBoard import LBoard
 from pychess.Savers.ChessFile import LoadingError
 from pychess.Savers.pgnbase import pgn_load
+from pychess.System.protoopen import protoopen, COMPRESSED_ENDINGS
 from pychess.Database.dbwalk import walk
+from pychess.Database.gameformat import encode, is_binary, to_array
 from pychess.Database.model import engine, metadata, collection, event,\
-                            site, player, game, annotator, ini_collection
+                            site, player, game, annotator, game_header, position, ini_collection, \
+                            pl1, pl2, upgrade_schema
+from pychess.Database.headers import header_row
+from pychess.Database.positions import mainline_positions
 
 CHUNK = 1000
 
@@ -39,6 +47,185 @@ removeDic = {
 LBoard_FEN_START = LBoard()
 LBoard_FEN_START.applyFen(FEN_START)
 
+def player_key(name):
+    """ The form of a player name the players are told apart by """
+    # Some .pgn use country after player names
+    if name[-4:-3]==" " and name[-3:].isupper():
+        name = name[:-4]
+    return name.title().translate(removeDic)
+
+fingerprintType = Struct(">q")
+
+def fingerprint(white, black, year, month, day, movelist):
+    """ Returns a 64 bit hash, as a signed integer, of the players, date and
+        encoded moves of a game, telling duplicate games apart """
+    key = "|".join((player_key(white or ""), player_key(black or ""),
+                    str(year), str(month), str(day)))
+    digest = hashlib.sha1(key.encode("utf-8") + movelist).digest()
+    return fingerprintType.unpack(digest[:8])[0]
+
+def _walk_movelist(movelist, fen, variant):
+    """ The walk() elements array, as a string, of a movelist column, the
+        fingerprints being made of those """
+    if not is_binary(movelist):
+        return movelist
+    board = LBoard(FISCHERRANDOMCHESS if variant else NORMALCHESS)
+    board.applyFen(fen or FEN_START)
+    return to_array(movelist, board)[0].tostring()
+
+def _slices(items, size=500):
+    # SQLite allows 999 parameters per statement by default
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def parse_game(cf, i, trusted=False, positions=0):
+    """ Parses and encodes game i of the pgn file cf. Returns a dict of the
+        game row, holding the names of the event, site, players and annotator
+        instead of their ids, or None if the game can't be imported. The
+        moves of trusted files are replayed without validation, see
+        PgnBase.parse_trusted. If positions > 0 the row holds the positions
+        of the game up to that ply too, see mainline_positions. The main line
+        is encoded as move indexes, see gameformat.encode. """
+    movelist = array("H")
+    comments = []
+    cf.error = None
+
+    fenstr = cf._getTag(i, "FEN")
+    variant = cf.get_variant(i)
+
+    # Fixes for some non statndard Chess960 .pgn
+    if variant==0 and (fenstr is not None) and "Chess960" in cf._getTag(i,"Event"):
+        cf.tagcache[i]["Variant"] = "Fischerandom"
+        variant = 1
+        parts = fenstr.split()
+        parts[0] = parts[0].replace(".", "/").replace("0", "")
+        if len(parts) == 1:
+            parts.append("w")
+            parts.append("-")
+            parts.append("-")
+        fenstr = " ".join(parts)
+
+    if variant:
+        board = LBoard(FISCHERRANDOMCHESS)
+    else:
+        board = LBoard()
+
+    if fenstr:
+        try:
+            board.applyFen(fenstr)
+        except SyntaxError as e:
+            print(_("The game #%s can't be loaded, because of an error parsing FEN") % (i+1), e.args[0])
+            return None
+    else:
+        board = LBoard_FEN_START.clone()
+
+    boards = [board]
+    start = board.clone()
+    movetext = cf.get_movetext(i)
+    boards = cf.parse_string(movetext, boards[0], -1, trusted=trusted)
+
+    if cf.error is not None:
+        print("ERROR in game #%s" % (i+1), cf.error.args[0])
+        return None
+
+    walk(boards[0], movelist, comments)
+
+    if not movelist:
+        if (not comments) and (cf._getTag(i, 'White') is None) and (cf._getTag(i, 'Black') is None):
+            print("empty game")
+            return None
+
+    game_date = cf._getTag(i, 'Date')
+    if game_date and not '?' in game_date:
+        ymd = game_date.split('.')
+        if len(ymd) == 3:
+            game_year, game_month, game_day = map(int, ymd)
+        else:
+            game_year, game_month, game_day = int(game_date[:4]), None, None
+    elif game_date and not '?' in game_date[:4]:
+        game_year, game_month, game_day = int(game_date[:4]), None, None
+    else:
+        game_year, game_month, game_day = None, None, None
+
+    white, black = cf.get_player_names(i)
+
+    white_elo = cf._getTag(i, 'WhiteElo')
+    white_elo = int(white_elo) if white_elo and white_elo.isdigit() else None
+
+    black_elo = cf._getTag(i, 'BlackElo')
+    black_elo = int(black_elo) if black_elo and black_elo.isdigit() else None
+
+    eco = cf._getTag(i, "ECO")
+    eco = eco[:3] if eco else None
+
+    if positions:
+        moves = [node.lastMove for node in boards[1:]]
+        positions = mainline_positions(start, moves, positions)
+    else:
+        positions = []
+
+    data = encode(movelist, comments, start)
+    # The fingerprints stay those of the walk() elements
+    movelist = movelist.tostring()
+
+    return {
+        'event': cf._getTag(i, 'Event'),
+        'site': cf._getTag(i, 'Site'),
+        'date_year': game_year,
+        'date_month': game_month,
+        'date_day': game_day,
+        'round': cf._getTag(i, 'Round'),
+        'white': white,
+        'black': black,
+        'result': cf.get_result(i),
+        'white_elo': white_elo,
+        'black_elo': black_elo,
+        'ply_count': cf._getTag(i, "PlyCount"),
+        'eco': eco,
+        'fen': cf._getTag(i, "FEN"),
+        'variant': cf.get_variant(i),
+        'board': cf._getTag(i, "Board"),
+        'annotator': cf._getTag(i, "Annotator"),
+        'movelist': data,
+        'comments': None,
+        'fingerprint': fingerprint(white, black, game_year, game_month, game_day, movelist),
+        'positions': positions,
+        }
+
+# The files do_import reads
+PGN_ENDINGS = (".pgn", ".zip", ".pgn.gz", ".pgn.bz2", ".pgn.xz")
+
+def open_pgn(filename, member=None, progress=None):
+    """ Loads the pgn file filename, or its member if it's a zip file.
+        Compressed files are decompressed while they're read, see
+        protoopen.CompressedFile, calling progress while they're scanned. """
+    if member is None and filename[filename.rfind(".")+1:].lower() not in COMPRESSED_ENDINGS:
+        return pgn_load(open(filename, "rU"))
+    return pgn_load(protoopen(filename, member), progress=progress)
+
+def _printProgress(filename):
+    """ Returns a pgn_load progress callback printing every tenth of
+        filename scanned """
+    shown = [0]
+    def progress(done):
+        if int(done * 10) > shown[0]:
+            shown[0] = int(done * 10)
+            print("%s scanned %d%%" % (filename, shown[0] * 10))
+    return progress
+
+# The pgn file of a pool worker process, and the parse_game options
+_worker_cf = None
+_worker_options = ()
+
+def _init_worker(filename, member, *options):
+    global _worker_cf, _worker_options
+    _worker_cf = open_pgn(filename, member)
+    _worker_options = options
+
+def _parse_games(job):
+    start, end = job
+    return [parse_game(_worker_cf, i, *_worker_options) for i in range(start, end)]
+
 class PgnImport():
     def __init__(self):
         self.conn = engine.connect()
@@ -49,6 +236,8 @@ class PgnImport():
         self.ins_player = player.insert()
         self.ins_annotator = annotator.insert()
         self.ins_game = game.insert()
+        self.ins_header = game_header.insert()
+        self.ins_position = position.insert()
         
         self.collection_dict = {}
         self.event_dict = {}
@@ -64,6 +253,10 @@ class PgnImport():
         self.next_id[PLAYER] = self.ini_names(player, PLAYER)
         self.next_id[ANNOTATOR] = self.ini_names(annotator, ANNOTATOR)
 
+        # The game ids are given here too, for the position rows
+        maxid = self.conn.execute(select([func.max(game.c.id)])).scalar()
+        self.next_game_id = 1 if maxid is None else maxid + 1
+
     def get_id(self, name, name_table, field):
         if not name:
             return None
@@ -72,7 +265,11 @@ class PgnImport():
         if field == COLLECTION:
             name_dict = self.collection_dict
             name_data = self.collection_data
-            name = os.path.basename(name)[:-4]
+            name = os.path.basename(name)
+            for ending in PGN_ENDINGS:
+                if name.lower().endswith(ending):
+                    name = name[:-len(ending)]
+                    break
         elif field == EVENT:
             name_dict = self.event_dict
             name_data = self.event_data
@@ -85,11 +282,7 @@ class PgnImport():
         elif field == PLAYER:
             name_dict = self.player_dict
             name_data = self.player_data
-
-            # Some .pgn use country after player names
-            if name[-4:-3]==" " and name[-3:].isupper():
-                name = name[:-4]
-            name = name.title().translate(removeDic)
+            name = player_key(name)
 
         if name in name_dict:
             return name_dict[name]
@@ -126,8 +319,86 @@ class PgnImport():
 
         return next_id
 
+    def existing_fingerprints(self, fingerprints):
+        """ Returns the set of fingerprints of games already in the database """
+        existing = set()
+        for part in _slices(fingerprints):
+            s = select([game.c.fingerprint], game.c.fingerprint.in_(part))
+            existing.update(row[0] for row in self.conn.execute(s))
+        return existing
+
+    def add_games(self, records, pgnfile):
+        """ Adds the parse_game() records of a chunk of games, skipping the
+            duplicates of games in the database or in the chunk """
+        existing = self.existing_fingerprints([record['fingerprint'] for record in records])
+        for record in records:
+            if record['fingerprint'] in existing:
+                self.duplicates += 1
+                continue
+            existing.add(record['fingerprint'])
+            self.add_game(record, pgnfile)
+
+    def add_game(self, record, pgnfile):
+        """ Resolves the names of a parse_game() record to ids and queues
+            the game for insertion """
+        game_data = dict(record)
+        game_data['id'] = game_id = self.next_game_id
+        self.next_game_id += 1
+        for hash, ply, move in game_data.pop('positions'):
+            self.position_data.append({'hash': hash, 'game_id': game_id, 'ply': ply, 'move': move})
+        game_data['event_id'] = self.get_id(game_data.pop('event'), event, EVENT)
+        game_data['site_id'] = self.get_id(game_data.pop('site'), site, SITE)
+        game_data['white_id'] = self.get_id(game_data.pop('white'), player, PLAYER)
+        game_data['black_id'] = self.get_id(game_data.pop('black'), player, PLAYER)
+        game_data['annotator_id'] = self.get_id(game_data.pop('annotator'), annotator, ANNOTATOR)
+        game_data['collection_id'] = self.get_id(unicode(pgnfile), collection, COLLECTION)
+        self.game_data.append(game_data)
+        self.header_data.append(header_row(game_id, game_data, record))
+
+    def flush(self):
+        """ Inserts the queued names and games """
+        if self.collection_data:
+            self.conn.execute(self.ins_collection, self.collection_data)
+            self.collection_data = []
+
+        if self.event_data:
+            self.conn.execute(self.ins_event, self.event_data)
+            self.event_data = []
+
+        if self.site_data:
+            self.conn.execute(self.ins_site, self.site_data)
+            self.site_data = []
+
+        if self.player_data:
+            self.conn.execute(self.ins_player, self.player_data)
+            self.player_data = []
+
+        if self.annotator_data:
+            self.conn.execute(self.ins_annotator, self.annotator_data)
+            self.annotator_data = []
+
+        if self.game_data:
+            self.conn.execute(self.ins_game, self.game_data)
+            self.game_data = []
+
+        if self.header_data:
+            self.conn.execute(self.ins_header, self.header_data)
+            self.header_data = []
+
+        if self.position_data:
+            self.conn.execute(self.ins_position, self.position_data)
+            self.position_data = []
+
     #@profile
-    def do_import(self, filename):
+    def do_import(self, filename, processes=1, trusted=False, positions=0):
+        """ Imports the games of a .pgn file, of a .pgn.gz, .pgn.bz2 or .pgn.xz
+            file, or of the .pgn files in a .zip file. With processes > 1 the games are parsed by a pool of
+            processes, in chunks of CHUNK games, while this process resolves
+            the names and inserts the games in file order, so the database
+            ends up the same as with a serial import. Files from a trusted
+            source, like engine matches, can skip the move validation. The
+            positions of the games are written to the position table up to
+            ply positions, to be searched by the Database.positions module. """
         print(filename)
         # collect new names not in they dict yet
         self.collection_data = []
@@ -138,6 +409,9 @@ class PgnImport():
         
         # collect new games and commit them in big chunks for speed
         self.game_data = []
+        self.header_data = []
+        self.position_data = []
+        self.duplicates = 0
 
         if filename.lower().endswith(".zip") and zipfile.is_zipfile(filename):
             zf = zipfile.ZipFile(filename, "r")
@@ -147,191 +421,103 @@ class PgnImport():
             files = [filename]
         
         for pgnfile in files:
-            if zf is None:
-                cf = pgn_load(open(pgnfile, "rU"))
+            member = None if zf is None else pgnfile
+            cf = open_pgn(filename, member, _printProgress(pgnfile))
+
+            pool = None
+            if processes > 1 and len(cf.games) > CHUNK:
+                pool = Pool(processes, _init_worker, (filename, member, trusted, positions))
+                jobs = [(start, min(start + CHUNK, len(cf.games)))
+                        for start in range(0, len(cf.games), CHUNK)]
+                records = (record for chunk in pool.imap(_parse_games, jobs)
+                                  for record in chunk)
             else:
-                cf = pgn_load(zf.open(pgnfile, "rU"))
-             
+                records = (parse_game(cf, i, trusted, positions) for i in range(len(cf.games)))
+
             # use transaction to avoid autocommit slowness
             trans = self.conn.begin()
             try:
-                for i, game in enumerate(cf.games):
-                    #print i+1#, cf.get_player_names(i)
-                    movelist = array("H")
-                    comments = []
-                    cf.error = None
-
-                    fenstr = cf._getTag(i, "FEN")
-                    variant = cf.get_variant(i)
-
-                    # Fixes for some non statndard Chess960 .pgn
-                    if variant==0 and (fenstr is not None) and "Chess960" in cf._getTag(i,"Event"):
-                        cf.tagcache[i]["Variant"] = "Fischerandom"
-                        variant = 1
-                        parts = fenstr.split()
-                        parts[0] = parts[0].replace(".", "/").replace("0", "")
-                        if len(parts) == 1:
-                            parts.append("w")
-                            parts.append("-")
-                            parts.append("-")
-                        fenstr = " ".join(parts)
-                    
-                    if variant:
-                        board = LBoard(FISCHERRANDOMCHESS)
-                    else:
-                        board = LBoard()
-
-                    if fenstr:
-                        try:
-                            board.applyFen(fenstr)
-                        except SyntaxError as e:
-                            print(_("The game #%s can't be loaded, because of an error parsing FEN") % (i+1), e.args[0])
-                            continue
-                    else:
-                        board = LBoard_FEN_START.clone()
-
-                    boards = [board]
-                    movetext = cf.get_movetext(i)
-                    boards = cf.parse_string(movetext, boards[0], -1)
-
-                    if cf.error is not None:
-                        print("ERROR in game #%s" % (i+1), cf.error.args[0])
+                chunk = []
+                for i, record in enumerate(records):
+                    if record is None:
                         continue
+                    chunk.append(record)
 
-                    walk(boards[0], movelist, comments)
-                    
-                    if not movelist:
-                        if (not comments) and (cf._getTag(i, 'White') is None) and (cf._getTag(i, 'Black') is None):
-                            print("empty game")
-                            continue
-                    
-                    event_id = self.get_id(cf._getTag(i, 'Event'), event, EVENT)
-
-                    site_id = self.get_id(cf._getTag(i, 'Site'), site, SITE)
-
-                    game_date = cf._getTag(i, 'Date')
-                    if game_date and not '?' in game_date:
-                        ymd = game_date.split('.')
-                        if len(ymd) == 3:
-                            game_year, game_month, game_day = map(int, ymd)
-                        else:
-                            game_year, game_month, game_day = int(game_date[:4]), None, None
-                    elif game_date and not '?' in game_date[:4]:
-                        game_year, game_month, game_day = int(game_date[:4]), None, None
-                    else:
-                        game_year, game_month, game_day = None, None, None
-
-                    game_round = cf._getTag(i, 'Round')
-
-                    white, black = cf.get_player_names(i)
-                    white_id = self.get_id(white, player, PLAYER)
-                    black_id = self.get_id(black, player, PLAYER)
-
-                    result = cf.get_result(i)
-     
-                    white_elo = cf._getTag(i, 'WhiteElo')
-                    white_elo = int(white_elo) if white_elo and white_elo.isdigit() else None
-                    
-                    black_elo = cf._getTag(i, 'BlackElo')
-                    black_elo = int(black_elo) if black_elo and black_elo.isdigit() else None
-     
-                    ply_count = cf._getTag(i, "PlyCount")
-     
-                    event_date = cf._getTag(i, 'EventDate')
-     
-                    eco = cf._getTag(i, "ECO")
-                    eco = eco[:3] if eco else None
-
-                    fen = cf._getTag(i, "FEN")
-     
-                    variant = cf.get_variant(i)
-                    
-                    board = cf._getTag(i, "Board")
-                    
-                    annotator = cf._getTag(i, "Annotator")
-                    annotator_id = self.get_id(annotator, annotator, ANNOTATOR)
-
-                    collection_id = self.get_id(unicode(pgnfile), collection, COLLECTION)
-
-                    self.game_data.append({
-                        'event_id': event_id,
-                        'site_id': site_id,
-                        'date_year': game_year,
-                        'date_month': game_month,
-                        'date_day': game_day,
-                        'round': game_round,
-                        'white_id': white_id,
-                        'black_id': black_id,
-                        'result': result,
-                        'white_elo': white_elo,
-                        'black_elo': black_elo,
-                        'ply_count': ply_count,
-                        'eco': eco,
-                        'fen': fen,
-                        'variant': variant,
-                        'board': board,
-                        'annotator_id': annotator_id,
-                        'collection_id': collection_id,
-                        'movelist': movelist.tostring(),
-                        'comments': unicode("|".join(comments)),
-                        })
-
-                    if len(self.game_data) >= CHUNK:
-                        if self.collection_data:
-                            self.conn.execute(self.ins_collection, self.collection_data)
-                            self.collection_data = []
-
-                        if self.event_data:
-                            self.conn.execute(self.ins_event, self.event_data)
-                            self.event_data = []
-
-                        if self.site_data:
-                            self.conn.execute(self.ins_site, self.site_data)
-                            self.site_data = []
-
-                        if self.player_data:
-                            self.conn.execute(self.ins_player, self.player_data)
-                            self.player_data = []
-
-                        if self.annotator_data:
-                            self.conn.execute(self.ins_annotator, self.annotator_data)
-                            self.annotator_data = []
-
-                        self.conn.execute(self.ins_game, self.game_data)
-                        self.game_data = []
+                    if len(chunk) >= CHUNK:
+                        self.add_games(chunk, pgnfile)
+                        chunk = []
+                        self.flush()
                         print(pgnfile, i+1)
-                    
-                if self.collection_data:
-                    self.conn.execute(self.ins_collection, self.collection_data)
-                    self.collection_data = []
-
-                if self.event_data:
-                    self.conn.execute(self.ins_event, self.event_data)
-                    self.event_data = []
-
-                if self.site_data:
-                    self.conn.execute(self.ins_site, self.site_data)
-                    self.site_data = []
-
-                if self.player_data:
-                    self.conn.execute(self.ins_player, self.player_data)
-                    self.player_data = []
-
-                if self.annotator_data:
-                    self.conn.execute(self.ins_annotator, self.annotator_data)
-                    self.annotator_data = []
-
-                if self.game_data:
-                    self.conn.execute(self.ins_game, self.game_data)
-                    self.game_data = []
 
+                self.add_games(chunk, pgnfile)
+                self.flush()
                 print(pgnfile, i+1)
+                if self.duplicates:
+                    print("%s duplicate games skipped" % self.duplicates)
                 trans.commit()
 
             except ProgrammingError as e:
                 trans.rollback()
                 print("Importing %s failed! %s" % (file, e))
 
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+
+    def dedupe(self):
+        """ Fingerprints the games having no fingerprint, like the ones saved
+            by Savers.database or imported by older versions, and deletes
+            those turning out to be duplicates of other games """
+        update = game.update().where(game.c.id==bindparam('game_id')) \
+            .values(fingerprint=bindparam('game_fingerprint'))
+        s = select([game.c.id, pl1.c.name, pl2.c.name, game.c.date_year,
+                    game.c.date_month, game.c.date_day, game.c.movelist,
+                    game.c.fen, game.c.variant],
+                   from_obj=[
+                    game.outerjoin(pl1, game.c.white_id==pl1.c.id)\
+                        .outerjoin(pl2, game.c.black_id==pl2.c.id)]) \
+            .where(game.c.fingerprint==None).order_by(game.c.id).limit(CHUNK)
+
+        deleted = 0
+        last_id = 0
+        trans = self.conn.begin()
+        try:
+            while True:
+                rows = self.conn.execute(s.where(game.c.id > last_id)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                fingerprints = []
+                for row in rows:
+                    white, black, year, month, day = row[1:6]
+                    movelist = _walk_movelist(*row[6:9])
+                    fingerprints.append(fingerprint(white, black, year, month, day, movelist))
+                existing = self.existing_fingerprints(fingerprints)
+                updates = []
+                duplicates = []
+                for row, fp in zip(rows, fingerprints):
+                    if fp in existing:
+                        duplicates.append(row[0])
+                    else:
+                        existing.add(fp)
+                        updates.append({'game_id': row[0], 'game_fingerprint': fp})
+
+                if updates:
+                    self.conn.execute(update, updates)
+                for ids in _slices(duplicates):
+                    self.conn.execute(position.delete().where(position.c.game_id.in_(ids)))
+                    self.conn.execute(game_header.delete().where(game_header.c.game_id.in_(ids)))
+                    self.conn.execute(game.delete().where(game.c.id.in_(ids)))
+                deleted += len(duplicates)
+
+            print("%s duplicate games deleted" % deleted)
+            trans.commit()
+        except:
+            trans.rollback()
+            raise
+
     def import_FIDE_players(self):
         #print 'drop index'
         #idx = Index('ix_player_name', player.c.name)
@@ -408,6 +594,12 @@ class PgnImport():
 
 
 if __name__ == "__main__":
+    if "--dedupe" in sys.argv:
+        # Only fingerprints and dedupes the games already in the database
+        upgrade_schema()
+        PgnImport().dedupe()
+        sys.exit()
+
     if 1:
         metadata.drop_all(engine)
         metadata.create_all(engine)
@@ -415,16 +607,21 @@ if __name__ == "__main__":
     imp = PgnImport()
     
     from .timer import Timer
-    if len(sys.argv) > 1:
-        arg = sys.argv[1]
+    trusted = "--trusted" in sys.argv
+    positions = [int(arg[12:]) for arg in sys.argv if arg.startswith("--positions=")]
+    positions = positions[0] if positions else 0
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if args:
+        arg = args[0]
+        processes = int(args[1]) if len(args) > 1 else 1
         with Timer() as t:
-            if arg[-4:].lower() in (".pgn", ".zip"):
+            if arg.lower().endswith(PGN_ENDINGS):
                 if os.path.isfile(arg):
-                    imp.do_import(arg)
+                    imp.do_import(arg, processes, trusted, positions)
             elif os.path.exists(arg):
                 for file in sorted(os.listdir(arg)):
-                    if file[-4:].lower() in (".pgn", ".zip"):
-                        imp.do_import(os.path.join(arg, file))
+                    if file.lower().endswith(PGN_ENDINGS):
+                        imp.do_import(os.path.join(arg, file), processes, trusted, positions)
         print("Elapsed time (secs): %s" % t.elapsed_secs)
     else:
         path = os.path.abspath(os.path.dirname(__file__))
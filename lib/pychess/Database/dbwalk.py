@@ -50,3 +50,25 @@ def walk(node, arr, txt):
             node = node.next
         else:
             break
+
+def replay(arr, board, position=-1):
+    """Plays the main line moves of a movelist array made by walk() on board
+       itself, up to ply position if it isn't -1. Variations, comments and
+       nags are skipped, so the comment strings are never needed.
+       Returns the list of moves played."""
+    
+    moves = []
+    depth = 0
+    for elem in arr:
+        if elem < COMMENT:
+            if depth:
+                continue
+            if position != -1 and board.plyCount >= position:
+                break
+            board.applyMove(elem)
+            moves.append(elem)
+        elif elem == VARI_START:
+            depth += 1
+        elif elem == VARI_END:
+            depth -= 1
+    return moves
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+
+""" The binary format of the movelist column of the game table. After the
+    header, version 2 holds
+        the main line moves, as 16 bit lmoves, or if the INDEXED flag is set
+        as one byte each: the high nibble is the slot of the moving piece,
+        its place among the pieces of the side to move in iterBits() order,
+        and the low nibble the index of the move among the moves of that
+        piece, see _encodeMove. An index of 15 or more is stored in a second
+        byte, the low nibble being 15.
+        the ply offset table, a (ply, length) entry for each ply having nags,
+        comments or variations, where ply 0 holds the initial comments. The
+        ply is stored as the difference to the ply of the entry before, and
+        both as base 128 varints.
+        the annotations of those plies, as the elements dbwalk.walk() makes,
+        each COMMENT followed by the length, as a base 128 varint, and the
+        utf-8 bytes of the comment
+    All numbers are little endian.
+
+    Version 1 had the main line indexed by the genAllMoves() order and a
+    table of 16 bit, or 32 bit if the LONG_OFFSETS flag is set, (ply, offset)
+    entries. It's still read.
+
+    Movelists without the MAGIC prefix are native endian arrays of the walk()
+    elements, their comments being joined by "|" in the comments column. """
+
+from __future__ import absolute_import
+
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from struct import Struct
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.bitboard import bitPosArray, lsb
+from pychess.Utils.lutils.ldata import moveArray, rookAttacks, rookMask, \
+    bishopAttacks, bishopMask
+from pychess.Utils.lutils.lmove import FCORD, TCORD, FLAG, RANK
+from pychess.Utils.lutils.lmovegen import genAllMoves, genCastles, newMove
+from pychess.Database import dbwalk
+from pychess.Database.dbwalk import COMMENT, VARI_START, VARI_END
+
+# No walk() element has this value, in either byte order
+MAGIC = b"\xfe\xfe"
+VERSION = 2
+
+# flags
+INDEXED = 1
+# Version 1 only
+LONG_OFFSETS = 2
+
+# magic, version, flags, plies, number of ply offset table entries
+headerType = Struct("<2sBBHH")
+# Version 1 ply, offset from the start of the annotations
+entryTypes = (Struct("<HH"), Struct("<HI"))
+elementType = Struct("<H")
+
+# The low nibble of an indexed move whose index is in the next byte
+ESCAPE = 0xf
+# The promotions of an indexed pawn move, by index // 4
+PROMOTION_FLAGS = (QUEEN_PROMOTION, ROOK_PROMOTION, BISHOP_PROMOTION, KNIGHT_PROMOTION)
+
+def is_binary(data):
+    return data[:2] == MAGIC
+
+def _putVarint(data, value):
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+def _getVarint(data, offset):
+    """ Returns the varint at offset of the bytearray data and the offset
+        after it """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, offset
+
+def _bitCount(bitboard):
+    return bin(bitboard).count("1")
+
+def _nthBit(bitboard, n):
+    """ The cord iterBits(bitboard) yields as the nth one """
+    for i in range(n):
+        bitboard &= bitboard - 1
+    if not bitboard:
+        raise ValueError("Broken indexed movelist")
+    return lsb[bitboard & -bitboard]
+
+def _targets(board, cord):
+    """ The bitboard of the cords the piece on cord can move to, without
+        castling. Moves leaving the king in check are included. """
+    color = board.color
+    piece = board.arBoard[cord]
+    if piece == PAWN:
+        if color == WHITE:
+            ahead, targets, home = cord + 8, moveArray[PAWN][cord], 1
+        else:
+            ahead, targets, home = cord - 8, moveArray[BPAWN][cord], 6
+        enemies = board.friends[1-color]
+        if board.enpassant is not None:
+            enemies |= bitPosArray[board.enpassant]
+        targets &= enemies
+        if not board.arBoard[ahead]:
+            targets |= bitPosArray[ahead]
+            if RANK(cord) == home and not board.arBoard[2*ahead-cord]:
+                targets |= bitPosArray[2*ahead-cord]
+        return targets
+    if piece == KNIGHT or piece == KING:
+        targets = moveArray[piece][cord]
+    else:
+        blocker = board.blocker
+        targets = 0
+        if piece != BISHOP:
+            targets |= rookAttacks[cord][blocker & rookMask[cord]]
+        if piece != ROOK:
+            targets |= bishopAttacks[cord][blocker & bishopMask[cord]]
+    return targets & ~board.friends[color]
+
+def _encodeMove(board, move, data):
+    """ Appends the indexed move to the bytearray data. The index of a pawn
+        move is the index of its cord plus 4 times that of the promotion, and
+        the castlings of the king come after its other moves. Returns False
+        if the move can't be indexed. """
+    fcord, tcord, flag = FCORD(move), TCORD(move), FLAG(move)
+    friends = board.friends[board.color]
+    if not friends & bitPosArray[fcord]:
+        return False
+    # iterBits() yields the low bits, the high cords, first
+    slot = _bitCount(friends & (bitPosArray[fcord] - 1))
+    targets = _targets(board, fcord)
+    if flag in (KING_CASTLE, QUEEN_CASTLE):
+        index = _bitCount(targets) + (flag == QUEEN_CASTLE)
+    elif flag in (NORMAL_MOVE, ENPASSANT) or flag in PROMOTION_FLAGS:
+        if not targets & bitPosArray[tcord]:
+            return False
+        index = _bitCount(targets & (bitPosArray[tcord] - 1))
+        if flag in PROMOTION_FLAGS:
+            index += 4 * PROMOTION_FLAGS.index(flag)
+    else:
+        return False
+    if slot > 0xf or index > 0xff:
+        return False
+    if index < ESCAPE:
+        data.append(slot << 4 | index)
+    else:
+        data.append(slot << 4 | ESCAPE)
+        data.append(index)
+    return True
+
+def _decodeMove(board, data, offset):
+    """ Returns the move indexed at offset of the bytearray data and the
+        offset after it """
+    byte = data[offset]
+    offset += 1
+    index = byte & 0xf
+    if index == ESCAPE:
+        index = data[offset]
+        offset += 1
+    fcord = _nthBit(board.friends[board.color], byte >> 4)
+    targets = _targets(board, fcord)
+    piece = board.arBoard[fcord]
+    if piece == KING:
+        castle = index - _bitCount(targets)
+        if castle >= 0:
+            flag = (KING_CASTLE, QUEEN_CASTLE)[castle]
+            for move in genCastles(board):
+                if FLAG(move) == flag:
+                    return move, offset
+            raise ValueError("Broken indexed movelist")
+    elif piece == PAWN:
+        promotion, index = divmod(index, 4)
+        tcord = _nthBit(targets, index)
+        if tcord == board.enpassant:
+            return newMove(fcord, tcord, ENPASSANT), offset
+        if RANK(tcord) in (0, 7):
+            return newMove(fcord, tcord, PROMOTION_FLAGS[promotion]), offset
+        return newMove(fcord, tcord), offset
+    return newMove(fcord, _nthBit(targets, index)), offset
+
+def _indexes(board, moves):
+    if board.variant not in (NORMALCHESS, FISCHERRANDOMCHESS):
+        return None
+    board = board.clone()
+    data = bytearray()
+    for move in moves:
+        if not _encodeMove(board, move, data):
+            return None
+        board.applyMove(move)
+    return data
+
+def encode(arr, comments, board=None):
+    """ Returns the binary movelist of the elements arr and comment strings
+        comments, made by dbwalk.walk(). If board, the position the game
+        starts from, is given, the main line is stored as move indexes when
+        every move can be indexed. """
+    moves = []
+    # (ply, annotation bytes) of the plies having any
+    segments = []
+    comments = iter(comments)
+    depth = 0
+    for elem in arr:
+        if not depth and elem < COMMENT:
+            moves.append(elem)
+            continue
+        if not segments or segments[-1][0] != len(moves):
+            segments.append((len(moves), bytearray()))
+        segment = segments[-1][1]
+        segment += elementType.pack(elem)
+        if elem == COMMENT:
+            text = next(comments).encode("utf-8")
+            _putVarint(segment, len(text))
+            segment += text
+        elif elem == VARI_START:
+            depth += 1
+        elif elem == VARI_END:
+            depth -= 1
+
+    flags = 0
+    mainline = None
+    if board is not None:
+        mainline = _indexes(board, moves)
+        if mainline is not None:
+            flags |= INDEXED
+    if mainline is None:
+        mainline = Struct("<%dH" % len(moves)).pack(*moves)
+
+    data = bytearray(headerType.pack(MAGIC, VERSION, flags, len(moves), len(segments)))
+    data += mainline
+    last = 0
+    for ply, segment in segments:
+        _putVarint(data, ply - last)
+        _putVarint(data, len(segment))
+        last = ply
+    for ply, segment in segments:
+        data += segment
+    return bytes(data)
+
+def _header(data):
+    """ Returns the version, flags, number of plies, offset table entries
+        and the offsets of the main line and offset table """
+    magic, version, flags, plies, count = headerType.unpack_from(data)
+    if version not in (1, VERSION):
+        raise ValueError("Unknown movelist version %s" % version)
+    mainline = headerType.size
+    if not flags & INDEXED:
+        table = mainline + plies * 2
+    elif version == 1:
+        table = mainline + plies
+    else:
+        table = mainline
+        for i in range(plies):
+            table += 2 if data[table] & 0xf == ESCAPE else 1
+    return version, flags, plies, count, mainline, table
+
+def _replay(data, version, flags, plies, mainline, board):
+    moves = []
+    if not flags & INDEXED:
+        for move in Struct("<%dH" % plies).unpack_from(data, mainline):
+            board.applyMove(move)
+            moves.append(move)
+    elif version == 1:
+        for index in data[mainline:mainline+plies]:
+            move = next(islice(genAllMoves(board), index, None))
+            board.applyMove(move)
+            moves.append(move)
+    else:
+        offset = mainline
+        for i in range(plies):
+            move, offset = _decodeMove(board, data, offset)
+            board.applyMove(move)
+            moves.append(move)
+    return moves
+
+def replay(data, board, position=-1):
+    """ Plays the main line moves of a movelist on board itself, up to ply
+        position if it isn't -1, like dbwalk.replay. The annotations aren't
+        looked at. Returns the list of moves played. """
+    if not is_binary(data):
+        arr = array("H")
+        arr.fromstring(data)
+        return dbwalk.replay(arr, board, position)
+
+    data = bytearray(data)
+    magic, version, flags, plies, count = headerType.unpack_from(data)
+    if position != -1:
+        plies = max(0, min(plies, position - board.plyCount))
+    return _replay(data, version, flags, plies, headerType.size, board)
+
+def _table(data, version, flags, count, table):
+    """ Returns the (ply, offset) entries of the offset table, the offsets
+        being from the start of the annotations, and that start """
+    if version == 1:
+        entryType = entryTypes[bool(flags & LONG_OFFSETS)]
+        entries = [entryType.unpack_from(data, table + i * entryType.size)
+                   for i in range(count)]
+        return entries, table + count * entryType.size
+    entries = []
+    ply = offset = 0
+    for i in range(count):
+        delta, table = _getVarint(data, table)
+        length, table = _getVarint(data, table)
+        ply += delta
+        entries.append((ply, offset))
+        offset += length
+    return entries, table
+
+def _segment(data, offset, end, comments):
+    """ Yields the elements of the annotations from offset to end, appending
+        the comments to comments """
+    while offset < end:
+        elem = elementType.unpack_from(data, offset)[0]
+        offset += elementType.size
+        if elem == COMMENT:
+            length, offset = _getVarint(data, offset)
+            comments.append(data[offset:offset+length].decode("utf-8"))
+            offset += length
+        yield elem
+
+def annotations(data, ply, comments):
+    """ Returns the walk() elements of the nags, comments and variations of
+        the main line move ply, or the initial comments for ply 0, appending
+        the comments to comments. The ply offset table points at them, so
+        the moves aren't decoded. """
+    data = bytearray(data)
+    version, flags, plies, count, mainline, table = _header(data)
+    entries, start = _table(data, version, flags, count, table)
+    i = bisect_left(entries, (ply, 0))
+    if i == count or entries[i][0] != ply:
+        return []
+    end = entries[i+1][1] if i+1 < count else len(data) - start
+    return list(_segment(data, start + entries[i][1], start + end, comments))
+
+def elements(data, board, comments):
+    """ Returns the list of walk() elements of a binary movelist, appending
+        the comments to comments. board is the position the game starts
+        from, it is left unchanged. """
+    data = bytearray(data)
+    version, flags, plies, count, mainline, table = _header(data)
+    if flags & INDEXED:
+        moves = _replay(data, version, flags, plies, mainline, board.clone())
+    else:
+        moves = Struct("<%dH" % plies).unpack_from(data, mainline)
+    entries, start = _table(data, version, flags, count, table)
+    entries.append((plies, len(data) - start))
+    elems = []
+    ply = 0
+    for i in range(count):
+        nextply, offset = entries[i]
+        elems.extend(moves[ply:nextply])
+        elems.extend(_segment(data, start + offset, start + entries[i+1][1], comments))
+        ply = nextply
+    elems.extend(moves[ply:])
+    return elems
+
+def to_array(data, board):
+    """ Returns the walk() elements array and comment list of a binary
+        movelist, board being the position the game starts from """
+    comments = []
+    return array("H", elements(data, board, comments)), comments
@@ -1,12 +1,14 @@
 from __future__ import print_function
 # -*- coding: UTF-8 -*-
 
-from gi.repository import Gtk, GObject
+from threading import Thread, Lock
 
-from sqlalchemy import select, func, and_, or_
+from gi.repository import Gtk, GObject
 
-from pychess.Database.model import engine, game, player, pl1, pl2, pychess_pdb
-from pychess.Savers.database import load
+from pychess.Database.model import engine, game_header, pychess_pdb
+from pychess.Database.headers import plan, apply_filters
+from pychess.Savers.database import load, get_count
+from pychess.System import fident
 from pychess.Utils.const import *
 from pychess.System.prefix import addDataPrefix
 from pychess.Players.Human import Human
@@ -14,7 +16,14 @@ from pychess.widgets import ionest
 from pychess.Utils.GameModel import GameModel
 
 
+# The pages load_games can show
+FIRST, PREV, NEXT, LAST = range(4)
+
 class GameList(Gtk.TreeView):
+    """ Lists the games of the database a page at a time, in the order of
+        their ids. Pages are looked up by the id of the first or last game
+        of the shown page rather than by offset, and the next and previous
+        pages are fetched in the background while one is shown. """
 
     STEP = 50
 
@@ -22,10 +31,17 @@ class GameList(Gtk.TreeView):
         GObject.GObject.__init__(self)
         
         self.offset = 0
-        self.orderby = None
-        self.where = None
+        self.filters = {}
         self.count = 0
         self.conn = engine.connect()
+        self.first_id = None
+        self.last_id = None
+
+        # The pages fetched by prefetch(), keyed by (page, id), and the
+        # query they were fetched for
+        self.prefetched = {}
+        self.generation = 0
+        self.lock = Lock()
         
         self.liststore = Gtk.ListStore(int, str, str, str, str, str, str, str, str, str, str)
         self.modelsort = Gtk.TreeModelSort(self.liststore)
@@ -111,51 +127,98 @@ class GameList(Gtk.TreeView):
         w.show_all()
 
     def build_query(self):
-        self.query = self.chessfile.select
-        
-        if self.where is None:
-            self.count = self.chessfile.count
-        else:
-            s = select([func.count(game.c.id)],\
-                from_obj=[
-                    game.outerjoin(pl1, game.c.white_id==pl1.c.id)\
-                        .outerjoin(pl2, game.c.black_id==pl2.c.id)])
-            self.count = self.conn.execute(s.where(self.where)).scalar()
-            self.query = self.query.where(self.where)
+        self.query = apply_filters(self.chessfile.select, self.filters)
+        self.count = get_count(self.conn, plan(self.filters)[0])
         print("%s game(s) match to query" % self.count)
 
-        if self.orderby is not None:
-            self.query = self.query.order_by(self.orderby)
+        with self.lock:
+            self.generation += 1
+            self.prefetched = {}
         
     def activate_entry(self, entry):
         text = entry.get_text()
-        self.where = or_(pl1.c.name.startswith(text), pl2.c.name.startswith(text))
-        self.offset = 0
+        self.filters = {"player": text}
         self.build_query()
-        self.load_games()
+        self.load_games(FIRST)
 
     def on_first_clicked(self, widget):
-        self.offset = 0
-        self.load_games()
+        self.load_games(FIRST)
 
     def on_prev_clicked(self, widget):
-        if self.offset - self.STEP >= 0:
-            self.offset = self.offset - self.STEP
-            self.load_games()
+        if self.offset > 0:
+            self.load_games(PREV)
 
     def on_next_clicked(self, widget):
-        if self.offset + self.STEP <= self.count:
-            self.offset = self.offset + self.STEP
-            self.load_games()
+        if self.offset + self.STEP < self.count:
+            self.load_games(NEXT)
 
     def on_last_clicked(self, widget):
-        self.offset = (self.count // self.STEP) * self.STEP
-        self.load_games()
+        self.load_games(LAST)
         
     def column_clicked(self, col, data):
         self.set_search_column(data)
+
+    def fetch_page(self, conn, query, page, game_id):
+        """ Returns the rows of a page of query, the one after or before the
+            game game_id for NEXT and PREV """
+        column = game_header.c.game_id
+        if page == NEXT:
+            query = query.where(column > game_id).order_by(column)
+        elif page == PREV:
+            query = query.where(column < game_id).order_by(column.desc())
+        elif page == FIRST:
+            query = query.order_by(column)
+        else:
+            query = query.order_by(column.desc())
+        rows = conn.execute(query.limit(self.STEP)).fetchall()
+        if page in (PREV, LAST):
+            rows.reverse()
+        return rows
+
+    def prefetch(self):
+        """ Fetches the pages around the shown one in a thread, with a
+            connection of its own """
+        query, generation = self.query, self.generation
+        pages = ((NEXT, self.last_id), (PREV, self.first_id))
+        def prefetch_pages():
+            conn = engine.connect()
+            try:
+                rows = dict((key, self.fetch_page(conn, query, *key)) for key in pages)
+            finally:
+                conn.close()
+            with self.lock:
+                if generation == self.generation:
+                    self.prefetched = rows
+        t = Thread(target=prefetch_pages, name=fident(prefetch_pages))
+        t.daemon = True
+        t.start()
         
-    def load_games(self):
+    def load_games(self, page=FIRST):
+        if page == NEXT:
+            key = (page, self.last_id)
+        elif page == PREV:
+            key = (page, self.first_id)
+        else:
+            key = (page, None)
+        with self.lock:
+            rows = self.prefetched.get(key)
+        if rows is None:
+            rows = self.fetch_page(self.conn, self.query, *key)
+        if not rows and page in (NEXT, PREV):
+            return
+
+        if page == FIRST:
+            self.offset = 0
+        elif page == NEXT:
+            self.offset += self.STEP
+        elif page == PREV:
+            self.offset = max(0, self.offset - self.STEP)
+        else:
+            self.offset = max(0, self.count - len(rows))
+        self.first_id = rows[0]["Id"] if rows else None
+        self.last_id = rows[-1]["Id"] if rows else None
+        self.prefetch()
+
         self.liststore.clear()
 
         getTag = self.chessfile._getTag
@@ -163,10 +226,7 @@ class GameList(Gtk.TreeView):
         getPlayers = self.chessfile.get_player_names
         add = self.liststore.append
 
-        query = self.query.offset(self.offset).limit(self.STEP)
-        
-        result = self.conn.execute(query)
-        self.chessfile.games = result.fetchall()
+        self.chessfile.games = rows
         print("%s selected" % len(self.chessfile.games))
         self.id_list = []
         for i in range(len(self.chessfile.games)):
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+""" The game_header table, and the planning of the game list filters on it.
+    The filters are given as a dict with any of these keys:
+        white, black, player   a prefix of the white, black or any player name
+        eco                    a prefix of the eco code
+        year                   the (first, last) years, either may be None
+        result                 a game result, like WHITEWON
+        elo                    the lowest elo of both players """
+
+from __future__ import absolute_import
+
+from sqlalchemy import select, and_, or_
+
+from pychess.Database.model import game, game_header, event, site, annotator, pl1, pl2
+
+# The game columns copied to game_header as they are
+GAME_COLUMNS = ("date_year", "date_month", "date_day", "round", "result",
+                "white_elo", "black_elo", "eco", "fen", "variant")
+
+def header_row(game_id, game_data, names):
+    """ Returns the game_header row of a game table row, names being a dict
+        of its white, black, event, site and annotator names """
+    row = dict((column, game_data.get(column)) for column in GAME_COLUMNS)
+    row['game_id'] = game_id
+    row['white_id'] = game_data.get('white_id')
+    row['black_id'] = game_data.get('black_id')
+    for key in ('white', 'black', 'event', 'site', 'annotator'):
+        row[key] = names.get(key)
+    return row
+
+def rebuild_headers(conn):
+    """ Writes the headers of the games having none, like those of a database
+        from before the game_header table """
+    columns = ['game_id', 'white_id', 'black_id', 'white', 'black', 'event',
+               'site', 'annotator'] + list(GAME_COLUMNS)
+    s = select([game.c.id, game.c.white_id, game.c.black_id, pl1.c.name,
+                pl2.c.name, event.c.name, site.c.name, annotator.c.name] +
+               [game.c[column] for column in GAME_COLUMNS],
+               ~game.c.id.in_(select([game_header.c.game_id])),
+               from_obj=[
+                    game.outerjoin(pl1, game.c.white_id==pl1.c.id)\
+                        .outerjoin(pl2, game.c.black_id==pl2.c.id)\
+                        .outerjoin(event, game.c.event_id==event.c.id)\
+                        .outerjoin(site, game.c.site_id==site.c.id)\
+                        .outerjoin(annotator, game.c.annotator_id==annotator.c.id)])
+    conn.execute(game_header.insert().from_select(columns, s))
+
+################################################################################
+# The query planner                                                            #
+################################################################################
+
+def _like_prefix(column, prefix):
+    # A bound pattern without wildcards in the prefix lets SQLite use the
+    # index of the NOCASE name columns
+    prefix = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(prefix + "%", escape="\\")
+
+def _prefix_range(column, prefix):
+    return and_(column >= prefix,
+                column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def _terms(filters):
+    """ Yields the where clause, index and guessed share of the matching
+        games of each filter. The index is None when the clause can't be
+        looked up in a single index. """
+    for key in ("white", "black"):
+        if filters.get(key):
+            column = game_header.c[key]
+            yield _like_prefix(column, filters[key]), \
+                  "ix_game_header_%s" % key, 0.2 ** len(filters[key])
+
+    if filters.get("player"):
+        prefix = filters["player"]
+        # SQLite looks up both indexes for the or
+        yield or_(_like_prefix(game_header.c.white, prefix),
+                  _like_prefix(game_header.c.black, prefix)), \
+              None, 2 * 0.2 ** len(prefix)
+
+    if filters.get("eco"):
+        prefix = filters["eco"]
+        yield _prefix_range(game_header.c.eco, prefix), \
+              "ix_game_header_eco", 0.2 * 0.1 ** (len(prefix) - 1)
+
+    if filters.get("year"):
+        first, last = filters["year"]
+        clauses = []
+        if first is not None:
+            clauses.append(game_header.c.date_year >= first)
+        if last is not None:
+            clauses.append(game_header.c.date_year <= last)
+        if clauses:
+            years = (last or 2100) - (first or 1800) + 1
+            yield and_(*clauses), "ix_game_header_date", min(1.0, years / 50.0)
+
+    if filters.get("result") is not None:
+        yield game_header.c.result == filters["result"], "ix_game_header_result", 0.4
+
+    if filters.get("elo"):
+        elo = filters["elo"]
+        yield and_(game_header.c.white_elo >= elo, game_header.c.black_elo >= elo), \
+              "ix_game_header_white_elo", min(1.0, max(0.01, (2700 - elo) / 1000.0))
+
+def plan(filters):
+    """ Returns the where clause of filters, or None if there are none, and
+        the index of the filter likely matching the fewest games, or None if
+        SQLite should choose """
+    clauses = []
+    best = None
+    for clause, index, share in _terms(filters):
+        clauses.append(clause)
+        if best is None or share < best[1]:
+            best = (index, share)
+    if not clauses:
+        return None, None
+    # Scanning the games in id order is better than an index most games match
+    index = best[0] if best[1] < 0.3 else None
+    return and_(*clauses), index
+
+def apply_filters(query, filters):
+    """ Returns query, a select from game_header, restricted to the games
+        matching filters """
+    where, index = plan(filters)
+    if where is None:
+        return query
+    query = query.where(where)
+    if index is not None:
+        query = query.with_hint(game_header, "INDEXED BY %s" % index, "sqlite")
+    return query
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import os
-from sqlalchemy import create_engine, MetaData, Table, Column, Sequence, Integer, String, SmallInteger, CHAR, LargeBinary, UnicodeText
+from sqlalchemy import create_engine, inspect, MetaData, Table, Column, Index, Sequence, Integer, BigInteger, String, SmallInteger, CHAR, LargeBinary, UnicodeText
+from sqlalchemy.pool import QueuePool
 
 from pychess.compat import unicode
 from pychess.Utils.const import LOCAL, ARTIFICIAL, REMOTE
@@ -10,7 +11,14 @@ from pychess.System.prefix import addUserDataPrefix
 engine = None
 def set_engine(url, echo=False):
     global engine
-    engine = create_engine(url, echo=echo)
+    if url.startswith("sqlite") and url not in ("sqlite://", "sqlite:///:memory:"):
+        # Keep the database file open between engine.connect() calls. Every
+        # checked out connection is one of its own, so closing one doesn't
+        # roll back the others, and they may be returned from any thread.
+        engine = create_engine(url, echo=echo, poolclass=QueuePool,
+                               connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(url, echo=echo)
 
 metadata = MetaData()
 
@@ -69,7 +77,49 @@ game = Table('game', metadata,
     Column('annotator_id', Integer),
     Column('collection_id', Integer),
     Column('movelist', LargeBinary),
-    Column('comments', UnicodeText)
+    Column('comments', UnicodeText),
+    # See PgnImport.fingerprint
+    Column('fingerprint', BigInteger, index=True, unique=True)
+    )
+
+# NOCASE is a collation of SQLite only
+NOCASE_NAME = String(256).with_variant(String(256, collation='NOCASE'), 'sqlite')
+
+# The tags of the games with the names joined in, for listing and filtering
+# games without joins. Written along with the games by PgnImport and
+# Savers.database, see the headers module.
+game_header = Table('game_header', metadata,
+    Column('game_id', Integer, primary_key=True),
+    Column('white_id', Integer, index=True),
+    Column('black_id', Integer, index=True),
+    # Case insensitive on SQLite, so name prefix filters can use the indexes
+    Column('white', NOCASE_NAME, index=True),
+    Column('black', NOCASE_NAME, index=True),
+    Column('event', String(256)),
+    Column('site', String(256)),
+    Column('annotator', String(256)),
+    Column('date_year', SmallInteger),
+    Column('date_month', SmallInteger),
+    Column('date_day', SmallInteger),
+    Column('round', String(8)),
+    Column('result', SmallInteger, index=True),
+    Column('white_elo', SmallInteger, index=True),
+    Column('black_elo', SmallInteger, index=True),
+    Column('eco', CHAR(3), index=True),
+    Column('fen', String(128)),
+    Column('variant', SmallInteger),
+    )
+
+Index('ix_game_header_date', game_header.c.date_year, game_header.c.date_month,
+      game_header.c.date_day)
+
+# The positions of the imported games up to some ply, keyed by the polyglot
+# hash of the board (as a signed integer), with the move played from them
+position = Table('position', metadata,
+    Column('hash', BigInteger, index=True),
+    Column('game_id', Integer, index=True),
+    Column('ply', SmallInteger),
+    Column('move', Integer)
     )
 
 def ini_collection():
@@ -82,8 +132,26 @@ def ini_collection():
     conn.execute(collection.insert(), new_values)
     conn.close()
 
+def upgrade_schema():
+    """ Adds the tables and columns of newer versions to a database """
+    metadata.create_all(engine)
+    columns = [column["name"] for column in inspect(engine).get_columns("game")]
+    if "fingerprint" not in columns:
+        conn = engine.connect()
+        conn.execute("ALTER TABLE game ADD COLUMN fingerprint BIGINT")
+        conn.close()
+        for index in game.indexes:
+            if index.name == "ix_game_fingerprint":
+                index.create(engine)
+    indexes = [index["name"] for index in inspect(engine).get_indexes("position")]
+    for index in position.indexes:
+        if index.name not in indexes:
+            index.create(engine)
+
 pychess_pdb = os.path.join(addUserDataPrefix("pychess.pdb"))
 set_engine("sqlite:///" + pychess_pdb)
 if not os.path.isfile(pychess_pdb):
     metadata.create_all(engine)
     ini_collection()
+else:
+    upgrade_schema()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+""" Searching the game database by position. The position table is written
+    by PgnImport, see PgnImport.do_import(positions=...). """
+
+from __future__ import absolute_import
+
+from sqlalchemy import select, func, case, and_
+
+from pychess.Utils.const import *
+from pychess.Database import model as dbmodel
+from pychess.Database.model import game, position
+
+def hash_key(hash):
+    """ The polyglot hash as stored in the signed 64 bit hash column """
+    return hash - 0x10000000000000000 if hash & 0x8000000000000000 else hash
+
+def mainline_positions(board, moves, maxPly):
+    """ Returns a (hash, ply, move) tuple for each position of a game up to
+        maxPly, where board is the first position, moves are the main line
+        moves and move is the one played from the position, or None """
+    board = board.clone()
+    positions = []
+    for ply in range(min(len(moves), maxPly) + 1):
+        if ply:
+            board.applyMove(moves[ply-1])
+        move = moves[ply] if ply < len(moves) else None
+        positions.append((hash_key(board.hash), ply, move))
+    return positions
+
+def _rows(s, conn=None):
+    """ The rows of select s as tuples, read with conn or with a connection
+        of its own """
+    if conn is not None:
+        return [tuple(row) for row in conn.execute(s)]
+    conn = dbmodel.engine.connect()
+    try:
+        return [tuple(row) for row in conn.execute(s)]
+    finally:
+        conn.close()
+
+def get_games(board, limit=None, conn=None):
+    """ Returns (game id, ply) pairs of the games reaching the position of
+        board """
+    s = select([position.c.game_id, position.c.ply],
+               position.c.hash == hash_key(board.hash)).order_by(position.c.game_id)
+    if limit is not None:
+        s = s.limit(limit)
+    return _rows(s, conn)
+
+def get_move_stats(board, conn=None):
+    """ Returns a (move, games, white wins, draws, black wins) tuple for
+        each move played from the position of board, most played first """
+    count = func.count(position.c.game_id)
+    s = select([position.c.move, count,
+                func.sum(case([(game.c.result == WHITEWON, 1)], else_=0)),
+                func.sum(case([(game.c.result == DRAW, 1)], else_=0)),
+                func.sum(case([(game.c.result == BLACKWON, 1)], else_=0))],
+               and_(position.c.hash == hash_key(board.hash),
+                    position.c.move != None,
+                    game.c.id == position.c.game_id)) \
+        .group_by(position.c.move).order_by(count.desc())
+    return _rows(s, conn)
+
+def getOpenings(board, conn=None):
+    """ The moves of get_move_stats like book.getOpenings returns them, as
+        (move, weight, games, score) tuples, scored for the side to move """
+    openings = []
+    for move, games, white, draws, black in get_move_stats(board, conn):
+        wins = white if board.color == WHITE else black
+        openings.append((move, games, games, 2 * wins + draws))
+    return openings
@@ -172,8 +172,9 @@ class CECPEngine (ProtocolEngine):
         self.timeout = None
         
         self.returnQueue = Queue()
-        self.engine.connect("line", self.parseLine)
-        self.engine.connect("died", lambda e: self.returnQueue.put("del"))
+        self.engineConnections = [
+            self.engine.connect("lines", self.parseLines),
+            self.engine.connect("died", lambda e: self.returnQueue.put("del"))]
         self.invalid_move = None
         
         self.funcQueue = Queue()
@@ -302,6 +303,9 @@ class CECPEngine (ProtocolEngine):
             self.connected = False
             try:
                 try:
+                    if self._recycle():
+                        self.returnQueue.put("del")
+                        return
                     print("quit", file=self.engine)
                     self.returnQueue.put("del")
                     self.engine.gentleKill()
@@ -316,12 +320,22 @@ class CECPEngine (ProtocolEngine):
             
             finally:
                 # Clear the analyzed data, if any
+                self.analysisThrottle.discard()
                 self.emit("analyze", [])
 
                 if self.analysis_timer is not None:
                     self.analysis_timer.cancel()
                     self.analysis_timer.join()
     
+    def _resetCommands (self):
+        # Without ping we can't tell when the engine is done with the old game
+        if not self.features["ping"]:
+            return None
+        commands = ["exit"] if self.engineIsAnalyzing else []
+        self.lastping += 1
+        commands += ["force", "new", "ping %d" % self.lastping]
+        return commands, "pong %d" % self.lastping
+    
     #===========================================================================
     #    Send the player move updates
     #===========================================================================
@@ -410,6 +424,7 @@ class CECPEngine (ProtocolEngine):
         # Notice: If this method is to be called while playing, the engine will
         # need 'new' and an arrangement similar to that of 'pause' to avoid
         # the current thought move to appear
+        self.analysisThrottle.discard()
         self.boardLock.acquire()
         try:
             if self.mode not in (ANALYZING, INVERSE_ANALYZING):
@@ -668,7 +683,7 @@ class CECPEngine (ProtocolEngine):
             self.analysis_timer.cancel()
             self.analysis_timer.join()
 
-        self.analysis_timer = Timer(conf.get("max_analysis_spin", 3), stop_analyze)
+        self.analysis_timer = Timer(self.getAnalysisTime(), stop_analyze)
         self.analysis_timer.start()
         
     def __printColor (self):
@@ -815,7 +830,7 @@ class CECPEngine (ProtocolEngine):
                 
                 mvstrs = movere.findall(moves)
                 if mvstrs:
-                    self.emit("analyze", [(mvstrs, scoreval, depth.strip())])
+                    self.analysisThrottle.post([(mvstrs, scoreval, depth.strip())])
                 
                 return
         
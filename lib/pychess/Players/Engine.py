@@ -1,17 +1,89 @@
 from __future__ import absolute_import
 
-from gi.repository import GObject
+from gi.repository import GObject, GLib
 
-from threading import Thread
+import time
+from threading import RLock, Thread
 
 from pychess.compat import urlopen, urlencode
-from pychess.System import fident
+from pychess.System import conf, fident
 from pychess.System.Log import log
 from pychess.Utils.Offer import Offer
 from pychess.Utils.const import ARTIFICIAL, CHAT_ACTION
 
 from .Player import Player
 
+class AnalysisThrottle (object):
+    """ Sits between the analysis lines an engine parses and its 'analyze'
+        signal. Engines send a line, or several multipv lines, for every
+        depth and pv change, much faster than the panels can redraw. Posted
+        analyses are coalesced, only the latest one is kept, and published
+        at most conf "analysis_rate" times a second (0 publishes every one).
+        
+        flush() publishes a pending analysis at once, so the final lines of a
+        search are delivered before its bestmove. discard() drops it, and
+        must be called before the engine board changes, as the receivers
+        attach the analysis to the engine board at the time it's published.
+        
+        delivered and dropped count the published and coalesced analyses. """
+    
+    def __init__ (self, engine):
+        self.engine = engine
+        self.lock = RLock()
+        self.pending = None
+        self.lastPublish = 0
+        self.timeoutId = None
+        self.delivered = 0
+        self.dropped = 0
+    
+    def interval (self):
+        rate = conf.get("analysis_rate", 10)
+        return 1. / rate if rate > 0 else 0
+    
+    def post (self, analysis):
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            # The engines update their analysis list in place
+            self.pending = list(analysis)
+            if self.timeoutId is not None:
+                return
+            wait = self.lastPublish + self.interval() - time.time()
+            if wait > 0:
+                self.timeoutId = GLib.timeout_add(int(wait*1000)+1, self.__onTimeout)
+                return
+        self.flush()
+    
+    def __onTimeout (self):
+        with self.lock:
+            self.timeoutId = None
+        self.flush()
+        return False
+    
+    def flush (self):
+        with self.lock:
+            self.__cancel()
+            analysis, self.pending = self.pending, None
+            if analysis is None:
+                return
+            self.lastPublish = time.time()
+            self.delivered += 1
+            # Emitted holding the lock, so discard() waits for the receivers
+            # to be done with the board the analysis belongs to
+            self.engine.emit("analyze", analysis)
+    
+    def discard (self):
+        with self.lock:
+            self.__cancel()
+            if self.pending is not None:
+                self.pending = None
+                self.dropped += 1
+    
+    def __cancel (self):
+        if self.timeoutId is not None:
+            GLib.source_remove(self.timeoutId)
+            self.timeoutId = None
+
 class Engine (Player):
     
     __type__ = ARTIFICIAL
@@ -28,6 +100,8 @@ class Engine (Player):
         Player.__init__(self)
         self.md5 = md5
         
+        self.analysisThrottle = AnalysisThrottle(self)
+        self.analysisTime = None
         self.currentAnalysis = []
         def on_analysis(self_, analysis):
             self.currentAnalysis = analysis
@@ -56,6 +130,16 @@ class Engine (Player):
     def setOptionAnalyzing (self, mode):
         self.mode = mode
     
+    def setOptionAnalysisTime (self, secs):
+        """ Seconds an analyzer searches each position, rather than the
+            max_analysis_spin preference """
+        self.analysisTime = secs
+    
+    def getAnalysisTime (self):
+        if self.analysisTime is not None:
+            return self.analysisTime
+        return conf.get("max_analysis_spin", 3)
+    
     def setOptionInitialBoard (self, model):
         """ If the game starts at a board other than FEN_START, it should be
             sent here. We sends a gamemodel, so the engine can load the entire
@@ -3,6 +3,7 @@ from threading import Condition
 
 from pychess.System.Log import log
 from pychess.Players.Engine import Engine
+from pychess.Players.enginePool import pool
 from pychess.Utils.const import *
 from pychess.Utils.repr import reprColor
 
@@ -31,6 +32,47 @@ class ProtocolEngine (Engine):
         self.connected = True
         self.mode = NORMAL
         
+        # The engine pool key of the process, set when the process can be
+        # returned to the pool at the end
+        self.poolKey = None
+        # The handlers connected to the subprocess signals
+        self.engineConnections = []
+        
         log.debug(reprColor[color], extra={"task":self.defname})
         
         self.movecon = Condition()
+    
+    #===========================================================================
+    #    Parsing
+    #===========================================================================
+    
+    def parseLines (self, engine, lines):
+        """ Handler of the "lines" signal of the engine subprocess, which
+            delivers the lines read in batches. Each line is passed to the
+            parseLine(engine, line) method of the protocol subclass. """
+        for line in lines:
+            self.parseLine(engine, line)
+    
+    #===========================================================================
+    #    Pooling
+    #===========================================================================
+    
+    def _resetCommands (self):
+        """ Returns the commands resetting the engine process for a new
+            game, and the line it answers when they are done, or None if the
+            engine process can't be reset """
+        return None
+    
+    def _recycle (self):
+        """ Returns the engine process to the engine pool, rather than
+            killing it. Returns True if the pool took it. """
+        if self.poolKey is None:
+            return False
+        reset = self._resetCommands()
+        if reset is None:
+            return False
+        for handler_id in self.engineConnections:
+            self.engine.disconnect(handler_id)
+        self.engineConnections = []
+        commands, readyLine = reset
+        return pool.put(self.poolKey, self.engine, commands, readyLine)
@@ -19,7 +19,8 @@ from pychess.Utils.book import getOpenings
 from pychess.Utils.const import *
 from pychess.Utils.lutils import lsearch
 from pychess.Utils.lutils.ldata import MAXPLY
-from pychess.Utils.lutils.lsearch import alphaBeta
+from pychess.Utils.lutils.leval import setPawnHashSize, PAWN_HASH_SHARE
+from pychess.Utils.lutils.lsmp import LazySMP
 from pychess.Utils.lutils.LBoard import LBoard
 from pychess.Utils.lutils.lmove import listToSan, toSAN
 from pychess.System.Log import log
@@ -40,12 +41,37 @@ class PyChess (object):
         self.post = False
         self.debug = True
         self.outOfBook = False
+        self.smp = None # Lazy SMP helper processes, see setCores
 
     def print(self, text):
         print(text)
         sys.stdout.flush()
         log.debug(text, extra={"task": "stdout"})
     
+    def setCores (self, cores):
+        """ Lets cores-1 helper processes search along with the main search """
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
+        if cores > 1:
+            self.smp = LazySMP(cores)
+    
+    def setMemory (self, maxSize):
+        """ Resizes the transposition table and the pawn hash to take maxSize
+            bytes together. The helper processes are restarted to pick up the
+            new tables. """
+        cores = self.smp.cores if self.smp is not None else 1
+        self.setCores(1)
+        pawnSize = maxSize // PAWN_HASH_SHARE
+        lsearch.setHashSize(maxSize - pawnSize)
+        setPawnHashSize(pawnSize)
+        self.setCores(cores)
+    
+    def __searchedNodes (self):
+        if self.smp is not None:
+            return lsearch.nodes + self.smp.nodes
+        return lsearch.nodes
+    
     #===========================================================================
     # Play related
     #===========================================================================
@@ -115,29 +141,37 @@ class PyChess (object):
                 else:
                     self.print("# Searching to depth %d without timelimit" % self.sd)
 
+            if self.smp is not None:
+                self.smp.start(self.board, lsearch.endtime, self.sd)
+            stats = None
             for depth in range(1, self.sd+1):
                 # Heuristic time saving
                 # Don't waste time, if the estimated isn't enough to complete next depth
                 if timed and usetime <= prevtime*4 and usetime > 1:
                     break
                 lsearch.timecheck_counter = lsearch.TIMECHECK_FREQ
-                search_result = alphaBeta(self.board, depth)
+                search_result = lsearch.iterate(self.board, depth, stats)
                 if lsearch.searching:
-                    mvs, self.scr = search_result
+                    mvs, self.scr, stats = search_result
                     if time() > lsearch.endtime:
                         break
                     if self.post:
                         pv = " ".join(listToSan(self.board, mvs))
                         time_cs = int(100 * (time()-starttime))
-                        self.print("%s %s %s %s %s" % (depth, self.scr, time_cs, lsearch.nodes, pv))
+                        self.print("%s %s %s %s %s" % (depth, self.scr, time_cs, self.__searchedNodes(), pv))
+                        self.print("# hashfull %s" % lsearch.table.hashfull())
+                        if self.debug:
+                            self.print("# %s" % lsearch.formatStats(stats))
                 else:
                     # We were interrupted
                     if depth == 1:
-                        mvs, self.scr = search_result
+                        mvs, self.scr, stats = search_result
                     break
                 prevtime = time()-starttime - prevtime
                 
                 self.clock[self.playingAs] -= time() - starttime - self.increment[self.playingAs]
+            if self.smp is not None:
+                self.smp.stop()
             
             if not mvs:
                 if not lsearch.searching:
@@ -175,18 +209,29 @@ class PyChess (object):
         lsearch.endtime = sys.maxsize
         lsearch.searching = True
         
+        if self.smp is not None:
+            self.smp.start(self.board, lsearch.endtime, self.sd)
+        helperNodes = 0
+        stats = None
         for depth in range (1, self.sd):
             if not lsearch.searching:
                 break
             t = time()
             board = self.board.clone()
-            mvs, scr = alphaBeta (board, depth)
+            mvs, scr, stats = lsearch.iterate(board, depth, stats)
             
             pv = " ".join(listToSan(board, mvs))
             time_cs = int(100 * (time() - start))
-            self.print("%s %s %s %s %s" % (depth, scr, time_cs, lsearch.nodes, pv))
+            nodes = self.__searchedNodes()
+            self.print("%s %s %s %s %s" % (depth, scr, time_cs, nodes - helperNodes, pv))
+            self.print("# hashfull %s" % lsearch.table.hashfull())
+            if self.debug:
+                self.print("# %s" % lsearch.formatStats(stats))
             
+            helperNodes = nodes - lsearch.nodes
             lsearch.nodes = 0
+        if self.smp is not None:
+            self.smp.stop()
 
 ################################################################################
 # main                                                                         #
@@ -62,8 +62,8 @@ class PyChessCECP(PyChess):
             "pause": 0, # Unimplemented
             "nps": 0, # Unimplemented
             "debug": 1,
-            "memory": 0, # Unimplemented
-            "smp": 0, # Unimplemented
+            "memory": 1,
+            "smp": 1,
             "egt": "gaviota",
             "option": "skipPruneChance -slider 0 0 100"
         }
@@ -137,7 +137,6 @@ class PyChessCECP(PyChess):
                             self.board.variant = SUICIDECHESS
                         elif lines[1] == "atomic":
                             self.board.variant = ATOMICCHESS
-                            self.board.iniAtomic()
                         elif lines[1] == "3check":
                             self.board.variant = THREECHECKCHESS
                         elif lines[1] == "kingofthehill":
@@ -312,18 +311,23 @@ class PyChessCECP(PyChess):
                 elif lines[0] == "memory":
                     # FIXME: this is supposed to control the *total* memory use.
                     if lsearch.searching:
-                        self.print("Error (already searching):", line)
+                        self.print("Error (already searching): %s" % line)
                     else:
                         limit = int(lines[1])
                         if limit < 1:
-                            self.print("Error (limit too low):", line)
+                            self.print("Error (limit too low): %s" % line)
                         else:
-                            pass
-                            # TODO implement
-                            #lsearch.setHashSize(limit)
+                            self.setMemory(limit * 1024 * 1024)
      
                 elif lines[0] == "cores":
-                    pass # We aren't SMP-capable.
+                    if lsearch.searching:
+                        self.print("Error (already searching): %s" % line)
+                    else:
+                        cores = int(lines[1])
+                        if cores < 1:
+                            self.print("Error (cores must be positive): %s" % line)
+                        else:
+                            self.setCores(cores)
      
                 elif lines[0] == "egtpath":
                     if len(lines) >= 3 and lines[1] == "gaviota":
@@ -365,7 +369,7 @@ class PyChessCECP(PyChess):
                     self.print([toSAN(self.board, move) for move in genCheckEvasions(self.board)])
 
                 elif lines[0] == "benchmark":
-                    benchmark()
+                    benchmark(self.smp)
                 
                 elif lines[0] == "profile":
                     if len(lines) > 1:
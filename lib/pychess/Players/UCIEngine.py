@@ -60,8 +60,9 @@ class UCIEngine (ProtocolEngine):
         self.analysis = [ None ]
         
         self.returnQueue = Queue()
-        self.engine.connect("line", self.parseLine)
-        self.engine.connect("died", self.__die)
+        self.engineConnections = [
+            self.engine.connect("lines", self.parseLines),
+            self.engine.connect("died", self.__die)]
         self.invalid_move = None
         
         self.connect("readyForOptions", self.__onReadyForOptions_before)
@@ -106,13 +107,29 @@ class UCIEngine (ProtocolEngine):
             if self.hasOption("MultiPV") and self.multipvSetting > 1:
                 self.setOption('MultiPV', self.multipvSetting)
             
-        for option, value in self.optionsToBeSent.items():
+        # A process from the engine pool keeps the options of its last user.
+        # Those not set this time go back to their defaults.
+        sentOptions = self.engine.sentOptions
+        options = dict((option, self.options[option]["default"])
+                       for option in sentOptions
+                       if self.options.get(option, {}).get("default") is not None)
+        options.update(self.optionsToBeSent)
+        
+        for option, value in options.items():
             if isinstance(value, bool):
                 value = str(value).lower()
-            print("setoption name %s value %s" % (option, str(value)), file=self.engine)
+            if sentOptions.get(option) == str(value):
+                continue
+            self._sendOption(option, value)
         
         print("isready", file=self.engine)
     
+    def _sendOption (self, option, value):
+        """ Sends an option to the engine process, and records it in the
+            options the process keeps when it goes back to the engine pool """
+        self.engine.sentOptions[option] = str(value)
+        print("setoption name %s value %s" % (option, str(value)), file=self.engine)
+    
     def __onReadyForMoves (self, self_):
         self.returnQueue.put("ready")
         self.readyMoves = True
@@ -142,6 +159,9 @@ class UCIEngine (ProtocolEngine):
             self.connected = False
             try:
                 try:
+                    if self._recycle():
+                        self.returnQueue.put("del")
+                        return
                     print("stop", file=self.engine)
                     print("quit", file=self.engine)
                     self.returnQueue.put("del")
@@ -157,6 +177,7 @@ class UCIEngine (ProtocolEngine):
             
             finally:
                 # Clear the analyzed data, if any
+                self.analysisThrottle.discard()
                 self.emit("analyze", [])
     
     #===========================================================================
@@ -172,6 +193,7 @@ class UCIEngine (ProtocolEngine):
     def _recordMove (self, board1, move, board2):
         if self.gameBoard == board1:
             return
+        self.analysisThrottle.discard()
         if not board2:
             if board1.variant == NORMALCHESS and board1.asFen() == FEN_START:
                 self.uciPosition = "startpos"
@@ -418,6 +440,9 @@ class UCIEngine (ProtocolEngine):
     def _newGame (self):
         print("ucinewgame", file=self.engine)
     
+    def _resetCommands (self):
+        return ["stop", "ucinewgame", "isready"], "readyok"
+    
     def _searchNow (self, ponderhit=False):
         log.debug("_searchNow: self.needBestmove=%s ponderhit=%s self.board=%s" % \
             (self.needBestmove, ponderhit, self.board), extra={"task":self.defname})
@@ -451,7 +476,7 @@ class UCIEngine (ProtocolEngine):
                     commands.append("position %s" % self.uciPosition)
 
                 #commands.append("go infinite")
-                move_time = int(conf.get("max_analysis_spin", 3))*1000
+                move_time = int(self.getAnalysisTime()*1000)
                 commands.append("go movetime %s" % move_time)
 
             if self.hasOption("MultiPV") and self.multipvSetting > 1:
@@ -618,7 +643,7 @@ class UCIEngine (ProtocolEngine):
             if multipv <= len(self.analysis):
                 self.analysis[multipv - 1] = (movstrs, score, depth)
 
-            self.emit("analyze", self.analysis)
+            self.analysisThrottle.post(self.analysis)
             return
         
         #-----------------------------------------------  An Analyzer bestmove
@@ -627,6 +652,7 @@ class UCIEngine (ProtocolEngine):
                 log.debug("__parseLine: processing analyzer bestmove='%s'" % \
                     line.strip(), extra={"task":self.defname})
                 self.needBestmove = False
+                self.analysisThrottle.flush()
                 self.__sendQueuedGo(sendlast=True)
                 return
         
@@ -690,7 +716,7 @@ class UCIEngine (ProtocolEngine):
             with self.moveLock:
                 self.multipvSetting  = n
                 print("stop", file=self.engine)
-                print("setoption name MultiPV value", n, file=self.engine)
+                self._sendOption("MultiPV", n)
                 self._searchNow()
         
         return n
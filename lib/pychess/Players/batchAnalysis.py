@@ -0,0 +1,332 @@
+""" Headless analysis of many games. The positions of the games are analyzed
+    by a number of engine processes, each one run by an AnalysisWorker, and
+    the evaluations, best moves of the mistakes and blunder nags are written
+    back into the games. Finished games and analyzed positions are recorded
+    in a checkpoint file, so an interrupted run resumes where it stopped. """
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Thread, Event
+
+from pychess.compat import Queue, Empty, StringIO
+from pychess.System.Log import log
+from pychess.Utils.const import *
+from pychess.Utils.logic import legalMoveCount
+from pychess.Utils.lutils.ldata import MATE_VALUE
+from pychess.Utils.lutils.lmove import ParsingError
+from pychess.Utils.Move import listToMoves, listToSan
+
+# Seconds to wait for an engine to be ready
+STARTUP_TIMEOUT = 30
+# Seconds to wait for the last analysis of a position after the search time
+SEARCH_MARGIN = 0.2
+
+def judge (before, after, mistake=100, blunder=300):
+    """ Returns the nag of a move, "$4" for a blunder, "$2" for a mistake, or
+        None. before is the score of the position before the move, relative
+        to the mover, and after the score after it, relative to the
+        opponent. """
+    loss = before + after
+    if loss >= blunder:
+        return "$4"
+    if loss >= mistake:
+        return "$2"
+    return None
+
+def formatEval (score, depth, color):
+    """ The pgn [%eval] comment of score, relative to the color to move """
+    if color == BLACK:
+        score = -score
+    return "[%%eval %0.2f/%s]" % (score / 100.0, depth)
+
+def annotate (model, scores, mistake=100, blunder=300):
+    """ Writes the (pv, score, depth) analyses of the main line plies in
+        scores into model. Every analyzed position gets an [%eval] comment,
+        and moves losing at least mistake centipawns get a nag and the line
+        of the engine as a comment. """
+    for ply, (pv, score, depth) in sorted(scores.items()):
+        model.scores[ply] = (pv, score, depth)
+        board = model.getBoardAtPly(ply)
+        board.board.children.insert(0, formatEval(score, depth, board.color))
+
+        if ply - 1 not in scores or ply <= model.lowply:
+            continue
+        before = scores[ply-1]
+        nag = judge(before[1], score, mistake, blunder)
+        if nag is None or nag in board.board.nags:
+            continue
+        board.board.nags.append(nag)
+        prev = model.getBoardAtPly(ply-1)
+        try:
+            moves = listToMoves(prev, before[0][:5], validate=True)
+        except ParsingError as e:
+            log.debug("annotate: Ignored (%s) from analyzer: ParsingError%s" % \
+                (' '.join(before[0]), e))
+            continue
+        if moves:
+            board.board.children.append("Better is %s" % " ".join(listToSan(prev, moves)))
+
+class Checkpoint (object):
+    """ The analyzed positions and finished games of a run, kept in a file of
+        one json record per line. Records are appended as they are made, so
+        a killed run loses at most the record being written. """
+
+    def __init__ (self, path):
+        self.path = path
+        self.done = set()
+        # game key -> {ply: (pv, score, depth)}
+        self.scores = {}
+        if path is not None and os.path.isfile(path):
+            with io.open(path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    # Drop the last line of a killed run, so the records
+                    # appended by this one start on a line of their own
+                    data = data[:data.rfind(b"\n")+1]
+                    f.seek(0)
+                    f.truncate(len(data))
+            for line in data.decode("utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log.warning("Checkpoint: Ignored broken record %r" % line)
+                    continue
+                if record.get("done"):
+                    self.done.add(record["game"])
+                    self.scores.pop(record["game"], None)
+                else:
+                    self.scores.setdefault(record["game"], {})[record["ply"]] = \
+                        (record["pv"], record["score"], record["depth"])
+        self.file = io.open(path, "a", encoding="utf-8") if path is not None else None
+
+    def __write (self, record):
+        if self.file is not None:
+            self.file.write(u"%s\n" % json.dumps(record))
+            self.file.flush()
+
+    def record (self, key, ply, analysis):
+        pv, score, depth = analysis
+        self.scores.setdefault(key, {})[ply] = analysis
+        self.__write({"game": key, "ply": ply, "pv": pv, "score": score, "depth": depth})
+
+    def finish (self, key):
+        self.done.add(key)
+        self.scores.pop(key, None)
+        self.__write({"game": key, "done": True})
+
+    def close (self):
+        if self.file is not None:
+            self.file.close()
+
+class AnalysisWorker (Thread):
+    """ Analyzes the (key, ply, board) jobs of the jobs queue with an analyzer
+        engine of its own, putting (key, ply, analysis) on the results queue.
+        The analysis is None if the engine had none. """
+
+    def __init__ (self, engine, variant, secs, jobs, results):
+        Thread.__init__(self, name="AnalysisWorker")
+        self.daemon = True
+        self.secs = secs
+        self.jobs = jobs
+        self.results = results
+        self.latest = None
+        self.ready = Event()
+
+        from pychess.Players.engineNest import discoverer
+        self.analyzer = discoverer.initAnalyzerEngine(engine, ANALYZING, variant)
+        self.analyzer.setOptionAnalysisTime(secs)
+        self.analyzer.connect("analyze", self.__onAnalyze)
+        self.analyzer.connect_after("readyForMoves", lambda analyzer: self.ready.set())
+        self.analyzer.start()
+
+    def __onAnalyze (self, analyzer, analysis):
+        # Bounds have no score
+        if analysis and analysis[0] is not None and analysis[0][1] is not None:
+            self.latest = (analyzer.board, analysis[0])
+
+    def run (self):
+        if not self.ready.wait(STARTUP_TIMEOUT):
+            log.error("AnalysisWorker: %s didn't start" % self.analyzer)
+            return
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    break
+                if not self.analyzer.connected:
+                    # The engine died, leave the job to the other workers
+                    self.jobs.put(job)
+                    log.error("AnalysisWorker: %s died" % self.analyzer)
+                    break
+                key, ply, board = job
+                self.latest = None
+                self.analyzer.setBoard(board)
+                time.sleep(self.secs + SEARCH_MARGIN)
+                self.analyzer.analysisThrottle.flush()
+                latest = self.latest
+                analysis = latest[1] if latest is not None and latest[0] == board else None
+                self.results.put((key, ply, analysis))
+        finally:
+            self.analyzer.end(KILLED, UNKNOWN_REASON)
+
+class BatchAnalyzer (object):
+    """ Schedules the positions of games over workers analyzer engines, and
+        annotates the games once all their positions are analyzed """
+
+    def __init__ (self, engine, workers=1, secs=1, mistake=100, blunder=300,
+                  checkpoint=None):
+        self.engine = engine
+        self.workerCount = workers
+        self.secs = secs
+        self.mistake = mistake
+        self.blunder = blunder
+        self.checkpoint = Checkpoint(checkpoint)
+
+    def run (self, games, write, progress=None):
+        """ Analyzes the (key, model) games, the key of a game identifying it
+            in the checkpoint, and calls write(model) for the annotated games
+            in their order. progress(key, analyzed, total) is called as the
+            positions of a game are analyzed. """
+        from pychess.Variants import variants
+        jobs = Queue()
+        results = Queue()
+        workers = [AnalysisWorker(self.engine, variants[NORMALCHESS], self.secs, jobs, results)
+                   for i in range(self.workerCount)]
+        for worker in workers:
+            worker.start()
+
+        # key -> [model, scores, positions left], in the order of games
+        inflight = OrderedDict()
+        games = iter(games)
+        exhausted = False
+        try:
+            while True:
+                # Keep enough games loaded for the workers to be busy at the
+                # end of a game
+                while not exhausted and len(inflight) < 2 * self.workerCount:
+                    try:
+                        key, model = next(games)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if key in self.checkpoint.done:
+                        continue
+                    if model.variant.variant != NORMALCHESS:
+                        log.warning("BatchAnalyzer: skipping game %s of variant %s" % \
+                            (key, model.variant.name))
+                        continue
+                    inflight[key] = self.__schedule(key, model, jobs)
+
+                while inflight:
+                    key, entry = next(iter(inflight.items()))
+                    if entry[2] > 0:
+                        break
+                    del inflight[key]
+                    annotate(entry[0], entry[1], self.mistake, self.blunder)
+                    write(entry[0])
+                    self.checkpoint.finish(key)
+
+                if not inflight:
+                    if exhausted:
+                        break
+                    continue
+
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("All the analyzer engines died")
+                try:
+                    key, ply, analysis = results.get(timeout=1)
+                except Empty:
+                    continue
+                entry = inflight[key]
+                entry[2] -= 1
+                if analysis is not None:
+                    entry[1][ply] = analysis
+                    self.checkpoint.record(key, ply, analysis)
+                if progress is not None:
+                    progress(key, len(entry[1]), entry[0].ply - entry[0].lowply + 1)
+        finally:
+            for worker in workers:
+                jobs.put(None)
+            for worker in workers:
+                worker.join(self.secs + STARTUP_TIMEOUT)
+            self.checkpoint.close()
+
+    def __schedule (self, key, model, jobs):
+        """ Queues the positions of model not yet analyzed, and returns its
+            inflight entry """
+        scores = dict(self.checkpoint.scores.get(key, {}))
+        left = 0
+        for board in model.boards:
+            ply = board.ply
+            if ply in scores or ply in model.scores:
+                continue
+            if legalMoveCount(board) == 0:
+                # Mate or stalemate, no need to ask
+                score = -MATE_VALUE if board.board.isChecked() else 0
+                scores[ply] = ([], score, "")
+                continue
+            jobs.put((key, ply, board))
+            left += 1
+        return [model, scores, left]
+
+#===============================================================================
+# Sources and writers
+#===============================================================================
+
+class _TagPlayer (object):
+    """ Stands for a player of a loaded game, for the savers """
+    __type__ = LOCAL
+    def __init__ (self, name):
+        self.name = name
+    def __repr__ (self):
+        return self.name
+
+def _withPlayers (model):
+    model.players = (_TagPlayer(model.tags["White"]), _TagPlayer(model.tags["Black"]))
+    return model
+
+def pgn_games (path):
+    """ Yields the (game number, model) games of a pgn file """
+    from pychess.Savers import pgn
+    from pychess.System.protoopen import protoopen
+    pgnfile = pgn.load(protoopen(path))
+    for gameno in range(len(pgnfile.games)):
+        yield gameno, _withPlayers(pgnfile.loadToModel(gameno))
+
+def database_games (filters=None):
+    """ Yields the (game id, model) games of the database of
+        pychess.Database.model.engine matching the game header filters """
+    from pychess.Database import model as dbmodel
+    from pychess.Database.headers import apply_filters
+    from pychess.Savers import database
+    db = database.load(None)
+    conn = dbmodel.engine.connect()
+    try:
+        db.games = conn.execute(apply_filters(db.select, filters or {})).fetchall()
+    finally:
+        conn.close()
+    for gameno in range(len(db.games)):
+        yield db.games[gameno]["Id"], _withPlayers(db.loadToModel(gameno))
+
+class PgnWriter (object):
+    """ Appends the annotated games to a pgn file """
+
+    def __init__ (self, path):
+        self.path = path
+
+    def __call__ (self, model):
+        from pychess.Savers import pgn
+        text = pgn.save(StringIO(), model, save_eval=True)
+        with io.open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+def database_writer (model):
+    """ Writes the annotated games back into the database they came from """
+    from pychess.Savers import database
+    database.save_movelist(model)
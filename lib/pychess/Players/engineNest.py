@@ -21,6 +21,7 @@ from pychess.Players.Player import PlayerIsDead
 from pychess.Utils.const import *
 from .CECPEngine import CECPEngine
 from .UCIEngine import UCIEngine
+from .enginePool import pool
 from pychess.Variants import variants
 
 attrToProtocol = {"uci": UCIEngine, "xboard": CECPEngine}
@@ -425,9 +426,14 @@ class EngineDiscoverer (GObject.GObject):
             workdir = working_directory
         else:
             workdir = os.path.dirname(engine["command"])
-        warnwords = ("illegal", "error", "exception")      
-        subprocess = SubProcess(path, args, warnwords, SUBPROCESS_SUBPROCESS, workdir)       
+        # A warm process of the engine, left by an earlier game or analyzer
+        poolKey = pool.key(engine)
+        subprocess = pool.take(poolKey)
+        if subprocess is None:
+            warnwords = ("illegal", "error", "exception")      
+            subprocess = SubProcess(path, args, warnwords, SUBPROCESS_SUBPROCESS, workdir)       
         engine_proc = attrToProtocol[protocol](subprocess, color, protover, md5)     
+        engine_proc.poolKey = poolKey
         
         engine_proc.setName(name)
         
@@ -0,0 +1,108 @@
+""" A pool of warm engine processes. Starting an engine loading big networks
+    and hash tables can take seconds, so at the end of a game or an analysis
+    the engine process is reset, with 'ucinewgame' or 'new', and kept here
+    instead of being killed. The next game or analyzer using the same engine
+    with the same configured options takes it, and only redoes the protocol
+    handshake. """
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import time
+from threading import RLock, Timer
+
+from pychess.System import conf
+from pychess.System.Log import log
+
+# Seconds a process being reset may take to answer, before it's considered
+# hung
+READY_TIMEOUT = 10
+
+class EnginePool (object):
+
+    def __init__ (self):
+        self.lock = RLock()
+        # [key, subprocess, time it was put] in the order they were put
+        self.processes = []
+        self.timer = None
+
+    @staticmethod
+    def key (engine):
+        """ The pool key of the processes of an engine of the discoverer """
+        options = []
+        for option in engine.get("options") or ():
+            value = option.get("value")
+            if value is not None and value != option.get("default"):
+                options.append((option["name"], repr(value)))
+        return (engine["md5"], tuple(engine.get("args") or ()), tuple(sorted(options)))
+
+    def __healthy (self, subprocess, since):
+        if subprocess.subprocExitCode[0] is not None or subprocess.channelsClosed:
+            return False
+        # The process hasn't answered the reset commands
+        return not subprocess.discarding or time.time() - since < READY_TIMEOUT
+
+    def take (self, key):
+        """ Returns a healthy pooled process of key, or None """
+        with self.lock:
+            for entry in self.processes:
+                if entry[0] == key and self.__healthy(entry[1], entry[2]):
+                    self.processes.remove(entry)
+                    log.debug("EnginePool.take: reusing pid %s" % entry[1].pid,
+                              extra={"task":entry[1].defname})
+                    return entry[1]
+        return None
+
+    def put (self, key, subprocess, commands, readyLine):
+        """ Resets a process no longer used by sending it commands, and keeps
+            it. The lines the process sends until readyLine are dropped.
+            Returns False if the pool doesn't take the process, which then
+            has to be killed. """
+        size = conf.get("engine_pool_size", 2)
+        if size <= 0 or not self.__healthy(subprocess, time.time()):
+            return False
+
+        subprocess.discardUntil(readyLine)
+        for command in commands:
+            print(command, file=subprocess)
+
+        with self.lock:
+            self.processes.append([key, subprocess, time.time()])
+            while len(self.processes) > size:
+                self.__evict(self.processes[0])
+            self.__schedule()
+        log.debug("EnginePool.put: pooled pid %s" % subprocess.pid,
+                  extra={"task":subprocess.defname})
+        return True
+
+    def __evict (self, entry):
+        self.processes.remove(entry)
+        log.debug("EnginePool: evicting pid %s" % entry[1].pid,
+                  extra={"task":entry[1].defname})
+        entry[1].gentleKill()
+
+    def __schedule (self):
+        if self.timer is None and self.processes:
+            self.timer = Timer(min(READY_TIMEOUT, conf.get("engine_pool_idle", 300)),
+                               self.evictIdle)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def evictIdle (self):
+        """ Kills the processes idle for more than conf "engine_pool_idle"
+            seconds, or not healthy """
+        idle = conf.get("engine_pool_idle", 300)
+        with self.lock:
+            self.timer = None
+            now = time.time()
+            for entry in self.processes[:]:
+                if now - entry[2] > idle or not self.__healthy(entry[1], entry[2]):
+                    self.__evict(entry)
+            self.__schedule()
+
+    def clear (self):
+        with self.lock:
+            for entry in self.processes[:]:
+                self.__evict(entry)
+
+pool = EnginePool()
@@ -0,0 +1,593 @@
+""" Headless engine tournaments. Round robin or gauntlet schedules are played
+    by a number of concurrent games, each with its engines pinned to a set of
+    processors. A game is played directly between the engine players, with
+    clocks of its own instead of a GameModel and TimeModel, and is adjudicated
+    from the scores the engines report while thinking. Finished games are
+    appended to a pgn file, which a stopped tournament resumes from. """
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import io
+import math
+import os
+import re
+import textwrap
+import time
+from threading import Thread, Timer, RLock
+
+from pychess.compat import Queue, Empty
+from pychess.System.Log import log
+from pychess.Utils.const import *
+from pychess.Utils.Board import Board
+from pychess.Utils.Move import Move, toSAN
+from pychess.Utils.logic import getStatus, playerHasMatingMaterial
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils.ldata import MATE_VALUE
+from pychess.Savers.ChessFile import LoadingError
+from pychess.Savers.pgnbase import pgn_load, tagre
+
+# Seconds a move may exceed the clock by, before it's lost on time
+TIME_MARGIN = 0.2
+
+#===============================================================================
+# Schedules
+#===============================================================================
+
+def round_robin (count, rounds=1):
+    """ The (white, black) pairs of a tournament where each of count players
+        meets every other one with both colors, in each round """
+    pairs = []
+    for r in range(rounds):
+        for i in range(count):
+            for j in range(i+1, count):
+                pairs += [(i, j), (j, i)]
+    return pairs
+
+def gauntlet (count, rounds=1):
+    """ The (white, black) pairs of a tournament where player 0 meets each of
+        the other count-1 players with both colors, in each round """
+    pairs = []
+    for r in range(rounds):
+        for j in range(1, count):
+            pairs += [(0, j), (j, 0)]
+    return pairs
+
+class Pairing (object):
+    """ A scheduled game. Game numbers start at 1 and are the Round tag of the
+        game in the pgn file. """
+
+    def __init__ (self, game, white, black, opening):
+        self.game = game
+        self.white = white
+        self.black = black
+        self.opening = opening
+
+    def __repr__ (self):
+        return "Pairing(%s, %s, %s, %s)" % (self.game, self.white, self.black, self.opening)
+
+def schedule (pairs, openings=0):
+    """ Pairings of the color swapped (white, black) pairs. Each two games of
+        a pair are played from the same opening, the openings being used in
+        turn. The opening of the pairings is None without openings. """
+    return [Pairing(i+1, white, black, (i//2) % openings if openings else None)
+            for i, (white, black) in enumerate(pairs)]
+
+#===============================================================================
+# Opening suites
+#===============================================================================
+
+def epd_openings (path):
+    """ The (fen, moves) openings of the positions of an epd file """
+    openings = []
+    with io.open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 4 or line.lstrip().startswith("#"):
+                continue
+            openings.append((" ".join(fields[:4]) + " 0 1", []))
+    return openings
+
+def pgn_openings (path):
+    """ The (fen, moves) openings of the main lines of the games of a pgn
+        file, moves being lmoves """
+    from pychess.System.protoopen import protoopen
+    pgnfile = pgn_load(protoopen(path))
+    openings = []
+    for gameno in range(len(pgnfile.games)):
+        fen = pgnfile._getTag(gameno, "FEN") or FEN_START
+        board = LBoard()
+        try:
+            board.applyFen(fen)
+            node = pgnfile.parse_string(pgnfile.get_movetext(gameno), board, -1)[0]
+        except (LoadingError, SyntaxError) as e:
+            log.warning("pgn_openings: skipping game %s of %s: %s" % (gameno+1, path, e))
+            continue
+        moves = []
+        while node.next is not None:
+            node = node.next
+            moves.append(node.lastMove)
+        openings.append((fen, moves))
+    return openings
+
+def load_openings (path):
+    """ The openings of an epd or pgn file """
+    if path.lower().endswith(".epd"):
+        return epd_openings(path)
+    return pgn_openings(path)
+
+#===============================================================================
+# Adjudication
+#===============================================================================
+
+# The score of an 'info' line of an uci engine
+uciscore = re.compile(r"\bscore\s+(cp|mate)\s+(-?\d+)(\s+(?:lower|upper)bound)?")
+ucidepth = re.compile(r"\bdepth\s+(\d+)")
+# The thinking output of a cecp engine, as CECPEngine parses it
+cecpscore = re.compile(r"^\s*(\d+)[+\-\.]?\s+(-?Mat\s*\d+|[+\-\d\.]+)\s+[\d\.]+\s+[\d\.]+\s+\S")
+
+def parseScore (line):
+    """ Returns the (score, depth) of an engine output line, the score being
+        in centipawns relative to the engine, or None if the line has no
+        score """
+    line = line.strip()
+    if line.startswith("info "):
+        match = uciscore.search(line)
+        if match is None or match.group(3):
+            return None
+        depth = ucidepth.search(line)
+        depth = depth.group(1) if depth else ""
+        if match.group(1) == "mate":
+            return (-MATE_VALUE if int(match.group(2)) <= 0 else MATE_VALUE), depth
+        return int(match.group(2)), depth
+
+    match = cecpscore.match(line)
+    if match is None:
+        return None
+    depth, score = match.groups()
+    if "mat" in score.lower():
+        return (-MATE_VALUE if score.startswith("-") else MATE_VALUE), depth
+    try:
+        return int(score), depth
+    except ValueError:
+        return None
+
+class Adjudicator (object):
+    """ Ends games from the scores of the engines. A game is won when both
+        engines have scored it at least resignScore centipawns for one side
+        for resignMoves moves each, and drawn when both have scored it within
+        drawScore of equality for drawMoves moves each, from move number
+        drawMoveNumber on. Zero moves turn an adjudication off. """
+
+    def __init__ (self, resignMoves=3, resignScore=600, drawMoveNumber=40,
+                  drawMoves=8, drawScore=10):
+        self.resignMoves = resignMoves
+        self.resignScore = resignScore
+        self.drawMoveNumber = drawMoveNumber
+        self.drawMoves = drawMoves
+        self.drawScore = drawScore
+
+    def adjudicate (self, scores, moveNumber):
+        """ Returns the (status, reason) of the game, or None if it goes on.
+            scores are the scores of the moves of the game, relative to white,
+            None where an engine had no score. """
+        if self.resignMoves > 0 and len(scores) >= 2 * self.resignMoves:
+            last = scores[-2*self.resignMoves:]
+            if None not in last:
+                if all(score >= self.resignScore for score in last):
+                    return WHITEWON, WON_ADJUDICATION
+                if all(score <= -self.resignScore for score in last):
+                    return BLACKWON, WON_ADJUDICATION
+
+        if self.drawMoves > 0 and moveNumber >= self.drawMoveNumber and \
+                len(scores) >= 2 * self.drawMoves:
+            last = scores[-2*self.drawMoves:]
+            if None not in last and all(abs(score) <= self.drawScore for score in last):
+                return DRAW, DRAW_ADJUDICATION
+        return None
+
+#===============================================================================
+# Results
+#===============================================================================
+
+def eloDifference (score):
+    """ The Elo difference of a score fraction, or None for 0 and 1 """
+    if not 0 < score < 1:
+        return None
+    return 400 * math.log10(score / (1 - score))
+
+def eloMargin (wins, losses, draws):
+    """ The 95% confidence margin of the Elo difference of a result, or None
+        if it can't be told """
+    games = wins + losses + draws
+    if games == 0:
+        return None
+    score = (wins + draws / 2.0) / games
+    variance = (wins * (1 - score) ** 2 + losses * score ** 2 +
+                draws * (0.5 - score) ** 2) / games
+    deviation = math.sqrt(variance / games)
+    high = eloDifference(score + 1.96 * deviation)
+    low = eloDifference(score - 1.96 * deviation)
+    if high is None or low is None:
+        return None
+    return (high - low) / 2
+
+def los (wins, losses):
+    """ The likelihood of superiority of a result, draws don't count """
+    if wins + losses == 0:
+        return 0.5
+    return 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2.0 * (wins + losses))))
+
+class Standings (object):
+    """ The wins, losses and draws of the players of a tournament """
+
+    def __init__ (self, names):
+        self.names = names
+        self.results = [[0, 0, 0] for name in names]
+
+    def record (self, white, black, status):
+        if status == WHITEWON:
+            self.results[white][0] += 1
+            self.results[black][1] += 1
+        elif status == BLACKWON:
+            self.results[white][1] += 1
+            self.results[black][0] += 1
+        elif status == DRAW:
+            self.results[white][2] += 1
+            self.results[black][2] += 1
+
+    def table (self):
+        """ (name, games, wins, losses, draws, points, elo, margin, los) rows
+            of the players, by points. The Elo difference is against the
+            opponents the player met. """
+        rows = []
+        for name, (wins, losses, draws) in zip(self.names, self.results):
+            games = wins + losses + draws
+            points = wins + draws / 2.0
+            elo = eloDifference(points / games) if games else None
+            rows.append((name, games, wins, losses, draws, points, elo,
+                         eloMargin(wins, losses, draws), los(wins, losses)))
+        rows.sort(key=lambda row: -row[5])
+        return rows
+
+    def __str__ (self):
+        lines = ["%-24s %5s %5s %5s %5s %6s %12s %6s" % \
+            ("Name", "Games", "Wins", "Loss", "Draws", "Points", "Elo", "LOS")]
+        for name, games, wins, losses, draws, points, elo, margin, likelihood in self.table():
+            elo = "%+.0f" % elo if elo is not None else "-"
+            if margin is not None:
+                elo += " +/- %.0f" % margin
+            lines.append("%-24s %5d %5d %5d %5d %6.1f %12s %5.1f%%" % \
+                (name[:24], games, wins, losses, draws, points, elo, likelihood * 100))
+        return "\n".join(lines)
+
+#===============================================================================
+# Pgn output
+#===============================================================================
+
+terminations = {
+    WON_ADJUDICATION: "adjudication",
+    DRAW_ADJUDICATION: "adjudication",
+    WON_CALLFLAG: "time forfeit",
+    DRAW_CALLFLAG: "time forfeit",
+    WON_DISCONNECTION: "abandoned",
+}
+
+def formatTimeControl (secs, incr):
+    return "%g+%g" % (secs, incr)
+
+def gameText (tags, boards, moves, comments, status, reason):
+    """ The pgn text of a game, comments holding the comment of each move or
+        None """
+    result = reprResult[status]
+    text = []
+    for key, value in tags:
+        text.append('[%s "%s"]' % (key, value))
+    if boards[0].asFen() != FEN_START:
+        text += ['[SetUp "1"]', '[FEN "%s"]' % boards[0].asFen()]
+    if reason in terminations:
+        text.append('[Termination "%s"]' % terminations[reason])
+    text.append('[PlyCount "%d"]' % len(moves))
+    text.append("")
+
+    movetext = []
+    commented = True
+    for board, move, comment in zip(boards, moves, comments):
+        if board.color == WHITE:
+            movetext.append("%d." % (board.ply // 2 + 1))
+        elif commented:
+            movetext.append("%d..." % (board.ply // 2 + 1))
+        movetext.append(toSAN(board, move))
+        commented = comment is not None
+        if commented:
+            movetext.append("{%s}" % comment)
+    movetext.append(result)
+    text.append(textwrap.fill(" ".join(movetext), 80,
+                              break_long_words=False, break_on_hyphens=False))
+    return "\n".join(text) + "\n\n"
+
+def formatComment (score, depth, secs):
+    """ The comment of a move, with the pgn [%eval] of its score relative to
+        white and the [%emt] of the secs it took """
+    emt = "[%%emt %d:%02d:%06.3f]" % (secs // 3600, secs // 60 % 60, secs % 60)
+    if score is None:
+        return emt
+    return "[%%eval %0.2f/%s] %s" % (score / 100.0, depth, emt)
+
+def readFinished (path):
+    """ Returns {game number: (white name, black name, status)} of the finished
+        games of a tournament pgn file. An unfinished game at the end of the
+        file, the last write of a stopped tournament, is cut off. """
+    finished = {}
+    if not os.path.isfile(path):
+        return finished
+    with open(path, "rb") as f:
+        pgnfile = pgn_load(f)
+    games = pgnfile.games
+    cut = None
+    for gameno in range(len(games)):
+        tags, movetext = games[gameno]
+        tags = dict(tagre.findall(tags))
+        result = tags.get("Result")
+        words = movetext.split()
+        if result not in reprResult[DRAW:BLACKWON+1] or not words or words[-1] != result:
+            if gameno == len(games) - 1:
+                cut = int(games.offsets[gameno])
+            continue
+        try:
+            game = int(tags.get("Round"))
+        except (TypeError, ValueError):
+            continue
+        finished[game] = (tags.get("White"), tags.get("Black"),
+                          reprResult.index(result))
+    if hasattr(games.data, "close"):
+        games.data.close()
+    if cut is not None:
+        log.warning("readFinished: cutting the unfinished last game of %s" % path)
+        with open(path, "r+b") as f:
+            f.truncate(cut)
+    return finished
+
+#===============================================================================
+# Cpu pinning
+#===============================================================================
+
+def cpuSets (concurrency, cpus=None):
+    """ Splits the cpus, by default those this process may run on, into a
+        set for each of the concurrency games. The sets are None if there
+        are fewer cpus than games. """
+    if cpus is None:
+        if not hasattr(os, "sched_getaffinity"):
+            return [None] * concurrency
+        cpus = os.sched_getaffinity(0)
+    cpus = sorted(cpus)
+    share = len(cpus) // concurrency
+    if share == 0:
+        return [None] * concurrency
+    return [set(cpus[i*share:(i+1)*share]) for i in range(concurrency)]
+
+def pinProcess (pid, cpus):
+    """ Pins the threads of process pid to the cpus, where supported """
+    if cpus is None or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        threads = [int(tid) for tid in os.listdir("/proc/%d/task" % pid)]
+    except OSError:
+        threads = [pid]
+    for tid in threads:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError as e:
+            log.warning("pinProcess: can't pin %s to %s: %s" % (tid, cpus, e))
+
+#===============================================================================
+# Games
+#===============================================================================
+
+class TournamentGame (object):
+    """ A game between two engines of the discoverer. It stands in for the
+        GameModel the engines are given their initial board from. """
+
+    def __init__ (self, engines, opening, secs, incr, adjudicator, cpus=None):
+        self.engines = engines
+        self.secs = secs
+        self.incr = incr
+        self.adjudicator = adjudicator
+        self.cpus = cpus
+
+        fen, lmoves = opening if opening is not None else (FEN_START, [])
+        self.boards = [Board(setup=fen)]
+        self.moves = []
+        for lmove in lmoves:
+            move = Move(lmove)
+            self.boards.append(self.boards[-1].move(move))
+            self.moves.append(move)
+        self.bookPlies = len(self.moves)
+        self.comments = [None] * self.bookPlies
+        # The scores of the moves played by the engines, relative to white
+        self.scores = []
+
+        self.clocks = [float(secs), float(secs)]
+        self.flagged = [False, False]
+        # The last (score, depth) of the engines while thinking
+        self.latest = [None, None]
+
+    @property
+    def ply (self):
+        return self.boards[-1].ply
+
+    @property
+    def lowply (self):
+        return self.boards[0].ply
+
+    def __onLines (self, subprocess, lines, color):
+        for line in lines:
+            score = parseScore(line)
+            if score is not None:
+                self.latest[color] = score
+
+    def __onFlag (self, color):
+        self.flagged[color] = True
+        self.players[color].kill(WON_CALLFLAG)
+
+    def play (self):
+        """ Plays the game, and returns its (status, reason). The status is
+            KILLED if an engine didn't start. """
+        from pychess.Players.engineNest import discoverer
+        from pychess.Players.Player import PlayerIsDead
+        from pychess.Variants import variants
+
+        self.players = [discoverer.initPlayerEngine(engine, color, 20, variants[NORMALCHESS],
+                                                    self.secs, self.incr, forcePonderOff=True)
+                        for color, engine in enumerate(self.engines)]
+        connections = [player.engine.connect("lines", self.__onLines, color)
+                       for color, player in enumerate(self.players)]
+        status, reason = KILLED, UNKNOWN_REASON
+        try:
+            if self.moves or self.boards[0].asFen() != FEN_START:
+                for player in self.players:
+                    player.setOptionInitialBoard(self)
+            for player in self.players:
+                player.start()
+                pinProcess(player.engine.pid, self.cpus)
+            status, reason = self.__run()
+        except PlayerIsDead as e:
+            log.error("TournamentGame.play: an engine didn't start: %s" % e)
+        finally:
+            for player, connection in zip(self.players, connections):
+                player.engine.disconnect(connection)
+                player.end(status, reason)
+        return status, reason
+
+    def __run (self):
+        from pychess.Players.Player import PlayerIsDead, InvalidMove
+        while True:
+            status, reason = getStatus(self.boards[-1])
+            if status in (DRAW, WHITEWON, BLACKWON):
+                return status, reason
+
+            color = self.boards[-1].color
+            player = self.players[color]
+            player.updateTime(self.clocks[color], self.clocks[1-color])
+            self.latest[color] = None
+            watchdog = Timer(max(self.clocks[color], 0) + TIME_MARGIN, self.__onFlag, (color,))
+            watchdog.daemon = True
+            start = time.time()
+            watchdog.start()
+            try:
+                if len(self.boards) > 1:
+                    move = player.makeMove(self.boards[-1], self.moves[-1], self.boards[-2])
+                else:
+                    move = player.makeMove(self.boards[-1], None, None)
+            except PlayerIsDead:
+                if self.flagged[color]:
+                    return self.__flagStatus(color)
+                log.error("TournamentGame: %s died" % player)
+                return (BLACKWON if color == WHITE else WHITEWON), WON_DISCONNECTION
+            except InvalidMove:
+                return (BLACKWON if color == WHITE else WHITEWON), WON_ADJUDICATION
+            finally:
+                watchdog.cancel()
+            elapsed = time.time() - start
+            if self.flagged[color] or elapsed > self.clocks[color] + TIME_MARGIN:
+                return self.__flagStatus(color)
+            self.clocks[color] += self.incr - elapsed
+
+            latest = self.latest[color]
+            score, depth = latest if latest is not None else (None, "")
+            if score is not None and color == BLACK:
+                score = -score
+            self.comments.append(formatComment(score, depth, elapsed))
+            self.scores.append(score)
+            self.boards.append(self.boards[-1].move(move))
+            self.moves.append(move)
+
+            adjudication = self.adjudicator.adjudicate(self.scores, self.ply // 2 + 1)
+            if adjudication is not None:
+                return adjudication
+
+    def __flagStatus (self, color):
+        if not playerHasMatingMaterial(self.boards[-1], 1-color):
+            return DRAW, DRAW_CALLFLAG
+        return (BLACKWON if color == WHITE else WHITEWON), WON_CALLFLAG
+
+#===============================================================================
+# Tournaments
+#===============================================================================
+
+class Tournament (object):
+    """ Plays the pairings between engines of the discoverer with concurrency
+        games at a time """
+
+    def __init__ (self, engines, pairings, openings=None, secs=60, incr=0,
+                  concurrency=1, adjudicator=None, pin=True, event="PyChess tournament"):
+        from pychess.Players.engineNest import discoverer
+        self.engines = engines
+        self.names = [discoverer.getName(engine) for engine in engines]
+        self.pairings = pairings
+        self.openings = openings or []
+        self.secs = secs
+        self.incr = incr
+        self.concurrency = concurrency
+        self.adjudicator = adjudicator or Adjudicator()
+        self.cpus = cpuSets(concurrency) if pin else [None] * concurrency
+        self.event = event
+        self.standings = Standings(self.names)
+        self.lock = RLock()
+
+    def run (self, path, progress=None):
+        """ Plays the pairings not yet finished in the pgn file path, and
+            appends the games to it. progress(pairing, status, reason) is
+            called as the games end. Returns the standings. """
+        finished = readFinished(path)
+        pairings = Queue()
+        for pairing in self.pairings:
+            names = (self.names[pairing.white], self.names[pairing.black])
+            if pairing.game in finished and finished[pairing.game][:2] == names:
+                self.standings.record(pairing.white, pairing.black, finished[pairing.game][2])
+            else:
+                pairings.put(pairing)
+
+        workers = [Thread(target=self.__work, args=(pairings, path, cpus, progress),
+                          name="TournamentWorker")
+                   for cpus in self.cpus]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        # Joining with a timeout keeps the main thread interruptible
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(1)
+        return self.standings
+
+    def __work (self, pairings, path, cpus, progress):
+        while True:
+            try:
+                pairing = pairings.get_nowait()
+            except Empty:
+                return
+            opening = self.openings[pairing.opening] if pairing.opening is not None else None
+            game = TournamentGame((self.engines[pairing.white], self.engines[pairing.black]),
+                                  opening, self.secs, self.incr, self.adjudicator, cpus)
+            status, reason = game.play()
+            if status not in (DRAW, WHITEWON, BLACKWON):
+                log.error("Tournament: game %s was aborted" % pairing.game)
+            else:
+                self.__save(pairing, game, status, reason, path)
+            if progress is not None:
+                progress(pairing, status, reason)
+
+    def __save (self, pairing, game, status, reason, path):
+        tags = [("Event", self.event),
+                ("Site", "?"),
+                ("Date", time.strftime("%Y.%m.%d")),
+                ("Round", pairing.game),
+                ("White", self.names[pairing.white]),
+                ("Black", self.names[pairing.black]),
+                ("Result", reprResult[status]),
+                ("TimeControl", formatTimeControl(self.secs, self.incr))]
+        text = gameText(tags, game.boards, game.moves, game.comments, status, reason)
+        with self.lock:
+            with io.open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+            self.standings.record(pairing.white, pairing.black, status)
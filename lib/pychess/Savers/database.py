@@ -13,7 +13,9 @@ from pychess.Utils.const import *
 from pychess.Utils.lutils.LBoard import LBoard
 from pychess.Database import model as dbmodel
 from pychess.Database.dbwalk import walk, COMMENT, VARI_START, VARI_END, NAG
-from pychess.Database.model import metadata, event, site, player, pl1, pl2, game, annotator
+from pychess.Database.gameformat import encode, replay, elements, is_binary
+from pychess.Database.model import metadata, event, site, player, game, annotator, game_header
+from pychess.Database.headers import header_row, rebuild_headers
 from pychess.Variants.fischerandom import FischerandomBoard
 
 __label__ = _("PyChess database")
@@ -92,43 +94,100 @@ def save (file, model, position=None):
             'variant': variant,
             'annotator_id': annotator_id,
             'collection_id': collection_id, 
-            'movelist': movelist.tostring(),
-            'comments': "|".join(comments),
+            'movelist': encode(movelist, comments, model.boards[0].board),
+            'comments': None,
             }
 
+        names = {'white': white, 'black': black, 'event': game_event,
+                 'site': game_site, 'annotator': game_annotator}
+
         if hasattr(model, "game_id") and model.game_id is not None:
             result = conn.execute(game.update().where(game.c.id==model.game_id).values(new_values))
+            header = header_row(model.game_id, new_values, names)
+            conn.execute(game_header.delete().where(game_header.c.game_id==model.game_id))
+            conn.execute(game_header.insert().values(header))
+            update_counts(conn, model.game_id, False)
         else:
             result = conn.execute(game.insert().values(new_values))
             model.game_id = result.inserted_primary_key[0]
+            conn.execute(game_header.insert().values(header_row(model.game_id, new_values, names)))
+            update_counts(conn, model.game_id, True)
         trans.commit()
     except:
         trans.rollback()
+        counts.clear()
         raise
 
 
+def save_movelist (model):
+    """ Writes the moves, comments and nags of a game loaded from the
+        database back into its row, leaving its headers as they are """
+    movelist = array("H")
+    comments = []
+    walk(model.boards[0].board, movelist, comments)
+    conn = dbmodel.engine.connect()
+    try:
+        conn.execute(game.update().where(game.c.id==model.game_id).values(
+            movelist=encode(movelist, comments, model.boards[0].board), comments=None))
+    finally:
+        conn.close()
+
+
+# The number of games matching the filters asked for, kept up to date by save()
+counts = {}
+
+def _count_key(where):
+    if where is None:
+        return None
+    compiled = where.compile()
+    return str(compiled), tuple(sorted(compiled.params.items()))
+
+def _count_select(where):
+    s = select([func.count(game_header.c.game_id)])
+    return s if where is None else s.where(where)
+
+def get_count(conn, where=None):
+    """ Returns the number of games matching the where clause of a game list
+        query, see headers.plan """
+    key = _count_key(where)
+    if key not in counts:
+        counts[key] = [where, conn.execute(_count_select(where)).scalar()]
+    return counts[key][1]
+
+def update_counts(conn, game_id, new):
+    """ Updates the cached counts for a new or changed game """
+    for key, entry in list(counts.items()):
+        where = entry[0]
+        if where is None:
+            if new:
+                entry[1] += 1
+        elif new:
+            entry[1] += conn.execute(_count_select(and_(where, game_header.c.game_id==game_id))).scalar()
+        else:
+            # Whether the game matched before is unknown
+            del counts[key]
+
+
 def load(file):
     conn = dbmodel.engine.connect()
     
-    s = select([func.count(game.c.id)])
-    count = conn.execute(s).scalar()
+    count = get_count(conn)
+    if conn.execute(select([func.count(game.c.id)])).scalar() != count:
+        rebuild_headers(conn)
+        counts.clear()
+        count = get_count(conn)
     print("Database contains %s games" % count)
     s = select([player.c.name])
     result = conn.execute(s)
     players = result.fetchall()
     print("Database contains %s players" % len(players))
     
-    s = select([game.c.id.label("Id"), pl1.c.name.label('White'), pl2.c.name.label('Black'), game.c.result.label('Result'),
-                event.c.name.label('Event'), site.c.name.label('Site'), game.c.round.label('Round'), 
-                game.c.date_year.label('Year'), game.c.date_month.label('Month'), game.c.date_day.label('Day'),
-                game.c.white_elo.label('WhiteElo'), game.c.black_elo.label('BlackElo'), game.c.eco.label('ECO'),
-                game.c.fen.label('Board'), game.c.fen.label('FEN'), game.c.variant.label('Variant'), annotator.c.name.label('Annotator')],
-                from_obj=[
-                    game.outerjoin(pl1, game.c.white_id==pl1.c.id)\
-                        .outerjoin(pl2, game.c.black_id==pl2.c.id)\
-                        .outerjoin(event, game.c.event_id==event.c.id)\
-                        .outerjoin(site, game.c.site_id==site.c.id)\
-                        .outerjoin(annotator, game.c.annotator_id==annotator.c.id)])
+    h = game_header.c
+    s = select([h.game_id.label("Id"), h.white.label('White'), h.black.label('Black'), h.result.label('Result'),
+                h.event.label('Event'), h.site.label('Site'), h.round.label('Round'), 
+                h.date_year.label('Year'), h.date_month.label('Month'), h.date_day.label('Day'),
+                h.white_elo.label('WhiteElo'), h.black_elo.label('BlackElo'), h.eco.label('ECO'),
+                h.fen.label('Board'), h.fen.label('FEN'), h.variant.label('Variant'), h.annotator.label('Annotator')])
 
     result = conn.execute(s)
     colnames = result.keys()
@@ -143,16 +202,41 @@ class Database(PGNFile):
         self.select = select
         self.count = count
         self.players = players
-        self.comments = []
+        self.game_id = None
+        self.comments = None
 
     def get_movetext(self, gameno):
-        s = select([game.c.movelist, game.c.comments], game.c.id==self.games[gameno][0])
+        """ Returns the movelist of a game, see gameformat. The comments of
+            the movelists from before it are only read from the database
+            when parse_string gets to the first one. """
+        self.game_id = self.games[gameno][0]
+        self.comments = None
+        s = select([game.c.movelist], game.c.id==self.game_id)
         conn = dbmodel.engine.connect()
-        result = conn.execute(s).first()
-        self.comments = result[1].split("|")
-        arr = array("H")
-        arr.fromstring(result[0])
-        return arr
+        try:
+            return conn.execute(s).scalar()
+        finally:
+            conn.close()
+
+    def get_comment(self, index):
+        if self.comments is None:
+            s = select([game.c.comments], game.c.id==self.game_id)
+            conn = dbmodel.engine.connect()
+            try:
+                self.comments = conn.execute(s).scalar().split("|")
+            finally:
+                conn.close()
+        return self.comments[index]
+
+    def get_position(self, gameno, position=-1):
+        """ Returns an lboard of the main line of a game at ply position, or
+            at the end of the game if position is -1. The moves are replayed
+            on one board and the variations and comments aren't looked at. """
+        variant = FISCHERRANDOMCHESS if self.games[gameno]["Variant"] else NORMALCHESS
+        board = LBoard(variant)
+        board.applyFen(self.games[gameno]["FEN"] or FEN_START)
+        replay(self.get_movetext(gameno), board, position)
+        return board
 
     def loadToModel (self, gameno, position=-1, model=None):
         self.comment_idx = 0
@@ -178,73 +262,76 @@ class Database(PGNFile):
             return ""
 
     def parse_string(self, movetext, board, position, variation=False):
-        boards = []
-
-        last_board = board
-        if variation:
-            # this board used only to hold initial variation comments
-            boards.append(LBoard(board.variant))
+        """ Builds the tree of lboards of a movelist, from the elements
+            dbwalk.walk() made of it. The variations are parsed in the same
+            pass, keeping the lines they branch off from on a stack. """
+        if is_binary(movetext):
+            self.comments = []
+            movetext = elements(movetext, board, self.comments)
         else:
-            # initial game board
-            boards.append(board)
+            arr = array("H")
+            arr.fromstring(movetext)
+            movetext = arr
+
+        boards = [LBoard(board.variant) if variation else board]
+        # The first board of the line being parsed, which holds its initial
+        # comments in the main line, or the board the variation starts from
+        start = board
+        last_board = board
+        # The boards, start and last board of each outer line
+        stack = []
 
-        error = None
-        parenthesis = 0
-        v_array = array("H")
         for elem in movetext:
-            if parenthesis > 0:
-                v_array.append(elem)
-
-            if elem == VARI_END:
-                parenthesis -= 1
-                if parenthesis == 0:
-                    v_last_board.children.append(self.parse_string(v_array[:-1], last_board.prev, position, variation=True))
-                    v_array = array("H")
-                    continue
+            if elem < COMMENT:
+                # a move
+                if not stack and not variation:
+                    if position != -1 and last_board.plyCount >= position:
+                        break
+
+                new_board = last_board.clone()
+                new_board.applyMove(elem)
+                new_board.prev = last_board
+
+                # the first move of a variation hangs off its own first board
+                if last_board is start:
+                    boards[0].next = new_board
+                else:
+                    last_board.next = new_board
 
-            elif elem == VARI_START:
-                parenthesis += 1
-                if parenthesis == 1:
-                    v_last_board = last_board
-
-            if parenthesis == 0:
-                if elem < COMMENT:
-                    # a move
-                    if not variation:
-                        if position != -1 and last_board.ply >= position:
-                            break
-
-                    new_board = last_board.clone()
-                    new_board.applyMove(elem)
-
-                    new_board.prev = last_board
-                    
-                    # set last_board next, except starting a new variation
-                    if variation and last_board==board:
-                        boards[0].next = new_board
-                    else:
-                        last_board.next = new_board
-
-                    boards.append(new_board)
-                    last_board = new_board
-
-                elif elem == COMMENT:
-                    comment = self.comments[self.comment_idx]
-                    self.comment_idx += 1
-                    if variation and last_board==board:
-                        # initial variation comment
-                        boards[0].children.append(comment)
-                    else:
-                        last_board.children.append(comment)
-
-                elif elem > NAG:
-                    # NAG
-                    last_board.nags.append("$%s" % (elem-NAG))
+                boards.append(new_board)
+                last_board = new_board
 
+            elif elem == COMMENT:
+                comment = self.get_comment(self.comment_idx)
+                self.comment_idx += 1
+                if last_board is start:
+                    # initial game or variation comment
+                    boards[0].children.append(comment)
                 else:
-                    print("Unknown element in movelist array:", elem)
+                    last_board.children.append(comment)
 
-            if error:
-                raise error
+            elif elem == VARI_START:
+                # the variation replaces the last move
+                stack.append((boards, start, last_board))
+                start = last_board.prev
+                boards = [LBoard(board.variant)]
+                last_board.children.append(boards)
+                last_board = start
+
+            elif elem == VARI_END:
+                if stack:
+                    boards, start, last_board = stack.pop()
+
+            elif elem > NAG:
+                # NAG
+                last_board.nags.append("$%s" % (elem-NAG))
+
+            else:
+                print("Unknown element in movelist array:", elem)
+
+        # Unclosed variations are left out
+        while stack:
+            boards, start, last_board = stack.pop()
+            last_board.children.pop()
 
         return boards
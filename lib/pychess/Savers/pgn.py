@@ -75,7 +75,7 @@ def parseTimeControlTag (tag):
         secs, gain = match.groups()
         return int(secs), int(gain) if gain is not None else 0
     
-def save (file, model, position=None):
+def save (file, model, position=None, save_eval=None):
 
     status = "%s" % reprResult[model.status]
 
@@ -117,7 +117,8 @@ def save (file, model, position=None):
     print("", file=file)
 
     save_emt = conf.get("saveEmt", False)
-    save_eval = conf.get("saveEval", False)
+    if save_eval is None:
+        save_eval = conf.get("saveEval", False)
 
     result = []
     walk(model.boards[0].board, result, model, save_emt, save_eval)
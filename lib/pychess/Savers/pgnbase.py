@@ -2,11 +2,19 @@
 
 from __future__ import print_function
 
+import mmap
+import os
 import re
+from array import array
+from io import UnsupportedOperation
+from stat import S_ISREG
+from struct import Struct, error as StructError
 
+from pychess.compat import basestring
+from pychess.System.protoopen import PGN_ENCODING, CompressedFile
 from pychess.Utils.const import *
 from pychess.Utils.lutils.LBoard import LBoard
-from pychess.Utils.lutils.lmove import parseSAN, ParsingError
+from pychess.Utils.lutils.lmove import parseSAN, parseTrustedSAN, ParsingError
 from pychess.Savers.ChessFile import ChessFile, LoadingError
 
 
@@ -34,21 +42,52 @@ pattern = re.compile(r"""
     """, re.VERBOSE | re.DOTALL)
 
 
+class MoveNode(object):
+    """ A node of the move tree parse_string builds in trusted mode. It has
+        the attributes of the lboard nodes dbwalk.walk uses, but no board. """
+    __slots__ = ("prev", "next", "lastMove", "plyCount", "nags", "children")
+
+    def __init__ (self, prev, lastMove, plyCount):
+        self.prev = prev
+        self.next = None
+        self.lastMove = lastMove
+        self.plyCount = plyCount
+        self.nags = []
+        self.children = []
+
+
 class PgnBase(ChessFile):
 
     def __init__ (self, games):
         ChessFile.__init__(self, games)
         self.tagcache = {}
 
-    def parse_string(self, string, board, position, variation=False):
+    def _moveError(self, ply, notation, reason=None):
+        if ply % 2 == 0:
+            moveno = "%d." % (ply//2+1)
+        else: moveno = "%d..." % (ply//2+1)
+        if reason is None:
+            errstr1 = _( "Error parsing move %(moveno)s %(mstr)s") % {"moveno": moveno, "mstr": notation}
+            return LoadingError (errstr1, "")
+        errstr1 = _("The game can't be read to end, because of an error parsing move %(moveno)s '%(notation)s'.") % {
+                    'moveno': moveno, 'notation': notation}
+        errstr2 = _("The move failed because %s.") % reason
+        return LoadingError (errstr1, errstr2)
+
+    def parse_string(self, string, board, position, variation=False, trusted=False):
         """Recursive parses a movelist part of one game.
         
            Arguments:
            srting - str (movelist)
            board - lboard (initial position)
            position - int (maximum ply to parse)
-           variation- boolean (True if the string is a variation)"""
+           variation- boolean (True if the string is a variation)
+           trusted - boolean (True if the movelist is known to be legal, see
+                     parse_trusted)"""
         
+        if trusted:
+            return self.parse_trusted(string, board, position)
+
         boards = []
         boards_append = boards.append
         
@@ -93,22 +132,10 @@ class PgnBase(ChessFile):
                         # TODO: save the rest as comment
                         # last_board.children.append(string[m.start():])
                         notation, reason, boardfen = e.args
-                        ply = last_board.plyCount
-                        if ply % 2 == 0:
-                            moveno = "%d." % (ply//2+1)
-                        else: moveno = "%d..." % (ply//2+1)
-                        errstr1 = _("The game can't be read to end, because of an error parsing move %(moveno)s '%(notation)s'.") % {
-                                    'moveno': moveno, 'notation': notation}
-                        errstr2 = _("The move failed because %s.") % reason
-                        self.error = LoadingError (errstr1, errstr2)
+                        self.error = self._moveError(last_board.plyCount, notation, reason)
                         break
                     except:
-                        ply = last_board.plyCount
-                        if ply % 2 == 0:
-                            moveno = "%d." % (ply//2+1)
-                        else: moveno = "%d..." % (ply//2+1)
-                        errstr1 = _( "Error parsing move %(moveno)s %(mstr)s") % {"moveno": moveno, "mstr": mstr}
-                        self.error = LoadingError (errstr1, "")
+                        self.error = self._moveError(last_board.plyCount, mstr)
                         break
                     
                     new_board = last_board.clone()
@@ -156,6 +183,121 @@ class PgnBase(ChessFile):
 
         return boards #, status
 
+    def parse_trusted(self, string, board, position):
+        """Parses a movelist like parse_string, for movelists known to be
+           legal, like engine generated ones. The moves are resolved by
+           parseTrustedSAN and played on board itself, which isn't cloned,
+           and MoveNodes are returned in place of the boards. The variations
+           are parsed in the same pass, not recursively, and board is left
+           at the last position of the main line."""
+        
+        last = MoveNode(None, None, board.plyCount)
+        nodes = [last]
+        # The node, nodes and number of moves played of each outer line
+        # of the variation being parsed
+        stack = []
+        moves = 0
+        # The depth of parenthesis left to skip after a result or an error in
+        # a variation, and the error
+        skip = 0
+        verror = None
+        
+        for m in re.finditer(pattern, string):
+            group, text = m.lastindex, m.group(m.lastindex)
+            if skip:
+                if group == VARIATION_START:
+                    skip += 1
+                elif group == VARIATION_END:
+                    skip -= 1
+                if skip or group != VARIATION_END:
+                    continue
+
+            if group == FULL_MOVE:
+                if not stack:
+                    if position != -1 and board.plyCount >= position:
+                        break
+
+                mstr = m.group(MOVE)
+                try:
+                    lmove = parseTrustedSAN(board, mstr)
+                except ParsingError as e:
+                    notation, reason, boardfen = e.args
+                    error = self._moveError(board.plyCount, notation, reason)
+                except:
+                    error = self._moveError(board.plyCount, mstr)
+                else:
+                    error = None
+                if error is not None:
+                    if not stack:
+                        self.error = error
+                        break
+                    # Like a result, but the error only counts if the
+                    # variation gets closed
+                    verror = error
+                    skip = 1
+                    continue
+                
+                board.applyMove(lmove)
+                moves += 1
+                node = MoveNode(last, lmove, board.plyCount)
+                if m.group(MOVE_COMMENT):
+                    node.nags.append(symbol2nag(m.group(MOVE_COMMENT)))
+                last.next = node
+                nodes.append(node)
+                last = node
+
+            elif group == VARIATION_START:
+                if last.prev is None:
+                    # No move to replace
+                    skip = 1
+                    continue
+                # The variation replaces the last move
+                stack.append((last, nodes, moves))
+                board.popMove()
+                nodes = [MoveNode(None, None, board.plyCount)]
+                last.children.append(nodes)
+                last = nodes[0]
+                moves = 0
+
+            elif group == VARIATION_END:
+                if not stack:
+                    break
+                for i in range(moves):
+                    board.popMove()
+                last, nodes, moves = stack.pop()
+                board.applyMove(last.lastMove)
+                if verror is not None:
+                    self.error = verror
+                    verror = None
+
+            elif group == COMMENT_REST:
+                last.children.append(text[1:])
+
+            elif group == COMMENT_BRACE:
+                comm = text.replace('{\r\n', '{').replace('\r\n}', '}')
+                comm = comm[1:-1].splitlines()
+                last.children.append(' '.join([line.strip() for line in comm]))
+
+            elif group == COMMENT_NAG:
+                last.nags.append(text)
+
+            elif group == RESULT:
+                if not stack:
+                    break
+                skip = 1
+
+            else:
+                print("Unknown:",text)
+
+        # Unclosed variations are left out
+        while stack:
+            for i in range(moves):
+                board.popMove()
+            last, nodes, moves = stack.pop()
+            last.children.pop()
+            board.applyMove(last.lastMove)
+        return nodes
+
     def _getTag (self, gameno, tagkey):
         if gameno in self.tagcache:
             if tagkey in self.tagcache[gameno]:
@@ -240,11 +382,12 @@ class PgnBase(ChessFile):
 
 tagre = re.compile(r"\[([a-zA-Z]+)[ \t]+['\"](.*?)['\"]\]")
 
-def pgn_load(file, klass=PgnBase):
+def _readGames (lines):
+    """ Splits the lines of pgn text into [tags, movetext] pairs """
     files = []
     inTags = False
 
-    for line in file:
+    for line in lines:
         line = line.lstrip()
         if not line: continue
         elif line.startswith("%"): continue
@@ -257,6 +400,8 @@ def pgn_load(file, klass=PgnBase):
                 files[-1][0] += line
             else:
                 if not inTags:
+                    if not files:
+                        files.append(["",""])
                     files[-1][1] += line
                 else:
                     print("Warning: ignored invalid tag pair %s" % line)
@@ -268,7 +413,185 @@ def pgn_load(file, klass=PgnBase):
                 files.append(["",""])
             files[-1][1] += line
                 
-    return klass(files)
+    return files
+
+################################################################################
+# Game index                                                                   #
+################################################################################
+
+# A line holding a tag pair, as tagre matches it
+tagLineRe = re.compile(br"^[ \t\f\v\r]*\[[a-zA-Z]+[ \t]+['\"].*?['\"]\]", re.M)
+# A line that ends the tag section of a game
+moveLineRe = re.compile(br"^[ \t\f\v\r]*[^ \t\f\v\r\n%\[]", re.M)
+# A line that makes a game of its own, before the first tag
+anyLineRe = re.compile(br"^[ \t\f\v\r]*[^ \t\f\v\r\n%]", re.M)
+
+# The typecode of the offset arrays and .pidx files. Python 2 has no "Q",
+# and "L" is 32 bit on some platforms, while doubles hold every offset
+# below 2**53 exactly.
+OFFSET_TYPECODE = "d"
+
+def scanGames (data):
+    """ Returns an array of the offsets in the pgn bytes data where the games
+        start. A game starts at the first tag of a tag section, so the offsets
+        split the data like pgn_load splits the lines. """
+    return scanChunks([data])[0]
+
+def scanChunks (chunks):
+    """ Returns the scanGames offsets of the data made of the bytes chunks,
+        each ending at a line end, and the length of the data """
+    offsets = array(OFFSET_TYPECODE)
+    base = 0
+    # Whether a tag line was found, and whether a line ending the tag
+    # section, or any line before the first tag, came after the last one
+    tagged = False
+    pending = False
+    for data in chunks:
+        pos = 0
+        for match in tagLineRe.finditer(data):
+            if not tagged:
+                if pending or anyLineRe.search(data, 0, match.start()):
+                    offsets.append(0)
+                offsets.append(base + match.start())
+                tagged = True
+            elif pending or moveLineRe.search(data, pos, match.start()):
+                offsets.append(base + match.start())
+            pending = False
+            pos = match.end()
+        if not pending:
+            lineRe = moveLineRe if tagged else anyLineRe
+            pending = lineRe.search(data, pos) is not None
+        base += len(data)
+    if not tagged and pending:
+        offsets.append(0)
+    return offsets, base
+
+STREAM_CHUNK = 1024 * 1024
+
+def _readChunks (file, progress=None):
+    """ Yields the bytes of file in chunks ending at line ends, calling
+        progress with the part of the file read after each """
+    rest = b""
+    while True:
+        chunk = file.read(STREAM_CHUNK)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        end = chunk.rfind(b"\n") + 1
+        rest = chunk[end:]
+        if end:
+            yield chunk[:end]
+        if progress is not None:
+            progress(file.progress())
+    if rest:
+        yield rest
+
+class StreamData (object):
+    """ The bytes of a seekable binary file, like a CompressedFile, read when
+        they're sliced. It stands in for the mmap of a file on disk. """
+
+    def __init__ (self, file, size):
+        self.file = file
+        self.size = size
+
+    def __len__ (self):
+        return self.size
+
+    def __getitem__ (self, key):
+        if self.file.tell() != key.start:
+            self.file.seek(key.start)
+        return self.file.read(key.stop - key.start)
+
+# Indexes of files at least this large are saved next to them, as
+# <file>.pidx, and used again while the size and mtime of the file match
+INDEX_SAVE_SIZE = 1024 * 1024
+indexHeader = Struct("=4s Q d Q") # magic, size, mtime, number of games
+INDEX_MAGIC = b"PIX2"
+
+def _loadIndex (path, stat):
+    try:
+        with open(path + ".pidx", "rb") as f:
+            magic, size, mtime, count = indexHeader.unpack(f.read(indexHeader.size))
+            if magic != INDEX_MAGIC or size != stat.st_size or mtime != stat.st_mtime:
+                return None
+            offsets = array(OFFSET_TYPECODE)
+            offsets.fromfile(f, count)
+            return offsets
+    except (IOError, OSError, EOFError, StructError):
+        return None
+
+def _saveIndex (path, stat, offsets):
+    try:
+        with open(path + ".pidx", "wb") as f:
+            f.write(indexHeader.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime, len(offsets)))
+            offsets.tofile(f)
+    except (IOError, OSError):
+        # The index is only a cache. The pgn may be in a read only directory.
+        pass
+
+class PgnGames (object):
+    """ The games of a pgn file as a sequence of (tags, movetext) pairs. Only
+        the offsets of the games are kept; the text of a game is read and
+        split when it's asked for. """
+
+    def __init__ (self, data, offsets, encoding):
+        self.data = data
+        self.offsets = offsets
+        self.encoding = encoding
+
+    def __len__ (self):
+        return len(self.offsets)
+
+    def __getitem__ (self, no):
+        if no < 0:
+            no += len(self.offsets)
+        if not 0 <= no < len(self.offsets):
+            raise IndexError("game %s out of range" % no)
+        end = int(self.offsets[no+1]) if no+1 < len(self.offsets) else len(self.data)
+        text = self.data[int(self.offsets[no]):end].decode(self.encoding, "replace")
+        games = _readGames(text.replace("\r\n", "\n").splitlines(True))
+        return tuple(games[0]) if games else ("", "")
+
+def _mapFile (file):
+    """ Returns an mmap of file, if it's a regular file on disk """
+    try:
+        stat = os.fstat(file.fileno())
+    except (AttributeError, IOError, OSError, UnsupportedOperation):
+        return None, None
+    if not S_ISREG(stat.st_mode):
+        return None, None
+    if stat.st_size == 0:
+        return b"", stat
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), stat
+
+def pgn_load(file, klass=PgnBase, progress=None):
+    """ Returns a klass of the games in the pgn file object. Files on disk are
+        mapped into memory and indexed with one scan. Compressed files are
+        scanned while they are decompressed, in chunks, and read again when
+        a game is asked for, calling progress with the part of the compressed
+        file read during the scan. Other files are read. """
+    encoding = getattr(file, "encoding", None) or PGN_ENCODING
+    data, stat = _mapFile(file)
+    offsets = None
+    if data is None and isinstance(file, CompressedFile):
+        offsets, size = scanChunks(_readChunks(file, progress))
+        data = StreamData(file, size)
+    elif data is None:
+        data = file.read()
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+            encoding = "utf-8"
+
+    path = getattr(file, "name", None)
+    if stat is not None and isinstance(path, basestring):
+        offsets = _loadIndex(path, stat)
+    if offsets is None:
+        offsets = scanGames(data)
+        if stat is not None and isinstance(path, basestring) and \
+                stat.st_size >= INDEX_SAVE_SIZE:
+            _saveIndex(path, stat, offsets)
+
+    return klass(PgnGames(data, offsets, encoding))
 
 
 nag2symbolDict = {
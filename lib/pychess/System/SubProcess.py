@@ -5,10 +5,12 @@ import os
 import sys
 import signal
 import errno
+import logging
+import subprocess
 import time
 import traceback
 import threading
-from threading import currentThread, Thread
+from threading import Thread
 
 from gi.repository import GObject
 from gi.repository import GLib
@@ -32,16 +34,71 @@ def searchPath (file, access=os.R_OK, altpath=None):
 
 subprocesses = []
 def finishAllSubprocesses ():
-    for subprocess in subprocesses:
-        if subprocess.subprocExitCode[0] == None:
-            subprocess.gentleKill(0,0.3)
-    for subprocess in subprocesses:
-        subprocess.subprocFinishedEvent.wait()
+    for proc in subprocesses:
+        if proc.subprocExitCode[0] == None:
+            proc.gentleKill(0,0.3)
+    for proc in subprocesses:
+        proc.subprocFinishedEvent.wait()
+
+# How the reader threads hand their line batches and the exit of a process
+# over. The GUI parses engine output in the main loop, while the headless
+# utilities can use direct_dispatch and parse it on the reader threads, so
+# no main loop has to run for the engines to be heard.
+def idle_dispatch (func, *args):
+    GLib.idle_add(func, *args)
+
+def direct_dispatch (func, *args):
+    func(*args)
+
+dispatch = idle_dispatch
+
+CHUNK_SIZE = 65536
+
+class LineReader (object):
+    """ Reads a pipe of a process in chunks on a thread of its own, and
+        calls callback with the list of lines read from each chunk. Lines
+        keep their newline, and a last unterminated line is passed on at the
+        end of the stream, before eofCallback is called. """
+    
+    def __init__ (self, pipe, callback, eofCallback=None, name=None):
+        self.pipe = pipe
+        self.callback = callback
+        self.eofCallback = eofCallback
+        self.thread = Thread(target=self.__run, name=name)
+        self.thread.daemon = True
+    
+    def start (self):
+        self.thread.start()
+    
+    def __run (self):
+        fd = self.pipe.fileno()
+        rest = b""
+        while True:
+            try:
+                chunk = os.read(fd, CHUNK_SIZE)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                chunk = b""
+            if not chunk:
+                break
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            if lines:
+                self.callback([line.decode("utf-8", "replace") + "\n"
+                               for line in lines])
+        if rest:
+            self.callback([rest.decode("utf-8", "replace")])
+        self.pipe.close()
+        if self.eofCallback is not None:
+            self.eofCallback()
 
 class SubProcess (GObject.GObject):
+    """ A process whose stdout and stderr lines are emitted in batches by the
+        "lines" signal, through dispatch """
     
     __gsignals__ = {
-        "line": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        "lines": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
         "died": (GObject.SignalFlags.RUN_FIRST, None, ())
     }
 
@@ -52,7 +109,6 @@ class SubProcess (GObject.GObject):
         self.args = args
         self.warnwords = warnwords
         self.env = env or os.environ
-        self.buffer = ""
         
         self.defname = os.path.split(path)[1]
         self.defname = self.defname[:1].upper() + self.defname[1:].lower()
@@ -64,112 +120,114 @@ class SubProcess (GObject.GObject):
         argv = [str(u) for u in [self.path]+self.args]
         log.debug("SubProcess.__init__: spawning...",  extra={"task":self.defname})
         
-        def do_spawn_async(event):
-            flags = GLib.SPAWN_DO_NOT_REAP_CHILD|GLib.SPAWN_SEARCH_PATH
-            if sys.platform == "win32":
-                flags |= GLib.SPAWN_WIN32_HIDDEN_CONSOLE
-            self.pid, stdin, stdout, stderr = GObject.spawn_async(argv,
-                    working_directory=chdir, child_setup=self.__setup,
-                    standard_input=True, standard_output=True, standard_error=True,
-                    flags=flags)        
-            
-            log.debug("SubProcess.__init__: _initChannel...",  extra={"task":self.defname})
-            self.__channelTags = []
-            self.inChannel = self._initChannel(stdin, None, None, False)
-            readFlags = GObject.IO_IN|GObject.IO_HUP#|GObject.IO_ERR
-            self.outChannel = self._initChannel(stdout, readFlags, self.__io_cb, False)
-            self.errChannel = self._initChannel(stderr, readFlags, self.__io_cb, True)
-            
-            log.debug("SubProcess.__init__: channelsClosed...",  extra={"task":self.defname})
-            self.channelsClosed = False
-            self.channelsClosedLock = threading.Lock()
-            log.debug("SubProcess.__init__: child_watch_add...",  extra={"task":self.defname})
-            
-            # On Python3 pygobject versions before 3.10.0 spawn_async returns pid as 0
-            # see https://bugs.debian.org/cgi-bin/bugreport.cgi?bug=712537
-            if self.pid != 0:
-                GObject.child_watch_add(self.pid, self.__child_watch_callback, None)
-            
-            if event is not None:
-                event.set()
-        
-        thread = currentThread()
-        if thread.name == "MainThread":
-            do_spawn_async(None)
+        if sys.platform == "win32":
+            # To prevent engines opening console window
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            preexec_fn = None
         else:
-            event = threading.Event()
-            GLib.idle_add(do_spawn_async, event)
-            event.wait()
+            startupinfo = None
+            preexec_fn = self.__setup
         
-        log.debug("SubProcess.__init__: subprocExitCode...",  extra={"task":self.defname})
         self.subprocExitCode = (None, None)
         self.subprocFinishedEvent = threading.Event()
+        self.channelsClosed = False
+        self.channelsClosedLock = threading.Lock()
+        # The stdout and stderr readers deliver one batch at a time
+        self.deliverLock = threading.Lock()
+        self.discardMarker = None
+        # The options set in the engine process, kept for the protocol
+        # engines reusing it from the engine pool
+        self.sentOptions = {}
+        
+        self.subprocess = subprocess.Popen(argv, shell=False,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, preexec_fn=preexec_fn, cwd=chdir,
+                startupinfo=startupinfo)
+        self.pid = self.subprocess.pid
+        log.debug("SubProcess.__init__: pid=%s" % self.pid, extra={"task":self.defname})
+        
+        LineReader(self.subprocess.stdout, self.__onLines, self.__onExit,
+                   name=self.defname[0]).start()
+        LineReader(self.subprocess.stderr, self.__onErrorLines,
+                   name=self.defname[0] + " stderr").start()
+        
         subprocesses.append(self)
         log.debug("SubProcess.__init__: finished",  extra={"task":self.defname})
     
-    def _initChannel (self, filedesc, callbackflag, callback, isstderr):        
-        channel = GLib.IOChannel(filedesc)
-        channel.set_encoding(None)
-        if sys.platform != "win32":
-            channel.set_flags(GObject.IO_FLAG_NONBLOCK)
-        if callback:
-            tag = channel.add_watch(callbackflag, callback, isstderr)
-            self.__channelTags.append(tag)
-        return channel
-    
-    def _closeChannels (self):
-        self.channelsClosedLock.acquire()
-        try:
-            if self.channelsClosed == True:
-                return
-            self.channelsClosed = True
-        finally:
-            self.channelsClosedLock.release()
-
-        for tag in self.__channelTags:
-            GObject.source_remove(tag)
-        for channel in (self.inChannel, self.outChannel, self.errChannel):
-            try:
-                channel.close()
-            except GObject.GError as error:
-                pass
-    
     def __setup (self):
         os.nice(15)
     
-    def __child_watch_callback (self, pid, code, data):
-        log.debug("SubProcess.__child_watch_callback: %s" % repr(code), 
+    def __onLines (self, lines):
+        # Some engines send author names in different encodinds (f.e. spike)
+        lines = [line for line in lines if line.strip() and not line.startswith("id author")]
+        if self.warnwords:
+            warned = [line for line in lines
+                      if any(word in line for word in self.warnwords)]
+            for line in warned:
+                log.warning(line, extra={"task":self.defname})
+            if warned:
+                lines = [line for line in lines if line not in warned]
+        if log.isEnabledFor(logging.DEBUG):
+            for line in lines:
+                log.debug(line.rstrip(), extra={"task":self.defname})
+        if lines:
+            dispatch(self.__deliver, lines)
+    
+    def __onErrorLines (self, lines):
+        lines = [line for line in lines if line.strip()]
+        for line in lines:
+            log.error(line, extra={"task":self.defname})
+        if lines:
+            dispatch(self.__deliver, lines)
+    
+    def __deliver (self, lines):
+        with self.deliverLock:
+            if self.discardMarker is not None:
+                stripped = [line.strip() for line in lines]
+                if self.discardMarker not in stripped:
+                    return
+                lines = lines[stripped.index(self.discardMarker)+1:]
+                self.discardMarker = None
+                if not lines:
+                    return
+            self.emit("lines", lines)
+    
+    def discardUntil (self, line):
+        """ Drops the lines read up to and including line, the answer to the
+            commands resetting a process for its next user """
+        with self.deliverLock:
+            self.discardMarker = line
+    
+    @property
+    def discarding (self):
+        return self.discardMarker is not None
+    
+    def __onExit (self):
+        code = self.subprocess.wait()
+        log.debug("SubProcess.__onExit: %s" % repr(code), 
                   extra={"task":self.defname})
         # Kill the engine on any signal but 'Resource temporarily unavailable'
-        self.subprocExitCode = (code, os.strerror(code))
+        if code < 0:
+            self.subprocExitCode = (code, "Killed by signal %d" % -code)
+        else:
+            self.subprocExitCode = (code, os.strerror(code))
         if code != errno.EWOULDBLOCK:
-            if isinstance(code, str):
-                log.error(code, extra={"task":self.defname})
-            else: log.error(os.strerror(code), extra={"task":self.defname})
-            self.emit("died")
+            log.error(self.subprocExitCode[1], extra={"task":self.defname})
+            dispatch(self.emit, "died")
             self.gentleKill()
     
-    def __io_cb (self, channel, condition, isstderr):
-        line = ""
-        if condition is GObject.IO_IN:
-            line = channel.readline()
-        elif condition is GObject.IO_IN|GObject.IO_HUP:
-            return False
-        # Some engines send author names in different encodinds (f.e. spike)
-        if line.startswith("id author") or not line:
-            return True
-        if isstderr:
-            log.error(line, extra={"task":self.defname})
-        else:
-            for word in self.warnwords:
-                if word in line:
-                    log.warning(line, extra={"task":self.defname})
-                    return False
-            else:
-                log.debug(line.rstrip(), extra={"task":self.defname})
-        
-        self.emit("line", line)
-        return True
+    def _closeChannels (self):
+        """ Closes stdin. The readers close stdout and stderr when the
+            process has exited. """
+        with self.channelsClosedLock:
+            if self.channelsClosed == True:
+                return
+            self.channelsClosed = True
+        try:
+            self.subprocess.stdin.close()
+        except (OSError, ValueError):
+            pass
             
     def write (self, data):
         if self.channelsClosed:
@@ -177,12 +235,12 @@ class SubProcess (GObject.GObject):
             return
         if data.rstrip():
             log.info(data, extra={"task":self.defname})
-        self.inChannel.write(data)
-        if data.endswith("\n"):
-            try:
-                self.inChannel.flush()
-            except GObject.GError as e:
-                log.error(str(e)+". Last line wasn't sent.", extra={"task":self.defname})
+        try:
+            self.subprocess.stdin.write(data.encode("utf-8"))
+            if data.endswith("\n"):
+                self.subprocess.stdin.flush()
+        except (OSError, ValueError) as e:
+            log.error(str(e)+". Last line wasn't sent.", extra={"task":self.defname})
 
     def sendSignal (self, sign):
         try:
@@ -235,8 +293,6 @@ class SubProcess (GObject.GObject):
             self.sendSignal(signal.SIGABRT)
         else:
             self.sendSignal(signal.SIGKILL)
-        if self.pid != 0:
-            GLib.spawn_close_pid(self.pid)
     
     def sigterm (self):
         self.sendSignal(signal.SIGTERM)
@@ -244,144 +300,16 @@ class SubProcess (GObject.GObject):
     def sigint (self):
         self.sendSignal(signal.SIGINT)
 
-################################################################################
-import subprocess
-
-if sys.platform == "win32":
-  class SubProcess(GObject.GObject):
-    __gsignals__ = {
-        "line": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
-        "died": (GObject.SignalFlags.RUN_FIRST, None, ())
-    }
-
-    def __init__(self, path, args=[], warnwords=[], env=None, chdir="."):
-        GObject.GObject.__init__(self)
-
-        self.defname = os.path.split(path)[1]
-        self.defname = self.defname[:1].upper() + self.defname[1:].lower()
-        t = time.time()
-        self.defname = (self.defname,
-                        time.strftime("%H:%m:%%.3f",time.localtime(t)) % (t%60))
-        log.debug(path, extra={"task":self.defname})
-
-        argv = [str(u) for u in [path]+args]
-        log.debug("SubProcess.__init__: popen ...",  extra={"task":self.defname})
-
-        def start_subprocess(event):
-            if sys.platform == "win32":
-                # To prevent engines opening console window
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                preexec_fn = None
-            else:
-                startupinfo = None
-                preexec_fn = self.__setup
-                
-            self.subprocess = subprocess.Popen(
-                argv, shell=False,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                preexec_fn=preexec_fn,
-                cwd=chdir,
-                universal_newlines=True,
-                startupinfo=startupinfo)
-            self.pid = self.subprocess.pid
-            log.debug("SubProcess.__init__: pid=%s" % self.pid,  extra={"task":self.defname})
-            
-            self.stop_reading = threading.Event()
-            t = Thread(target=self.__stdout_reader, name=self.defname[0])
-            t.start()
-            
-            if event is not None:
-                event.set()
-
-        if currentThread().name == "MainThread":
-            start_subprocess(None)
-        else:
-            event = threading.Event()
-            GLib.idle_add(start_subprocess, event)
-            event.wait()
-
-        self.subprocExitCode = (None, None)
-        self.subprocFinishedEvent = threading.Event()
-        subprocesses.append(self)
-
-    def __setup (self):
-        os.nice(15)
-
-    def __stdout_reader(self):
-        while True:
-            if self.stop_reading.is_set():
-                break
-            else:
-                if self.subprocess.poll() is not None:
-                    GLib.idle_add(self.emit, "died")
-                    break
-                elif self.subprocess.stdout.closed:
-                    GLib.idle_add(self.emit, "died")
-                    self.gentleKill()
-                    break
-                else:
-                    line = self.subprocess.stdout.readline()
-                    if line:
-                        GLib.idle_add(self.emit, "line", line)
-
-    def gentleKill (self, first=1, second=1):
-        self.sigterm()
-        self.stop_reading.set()
-        self.subprocFinishedEvent.set()
-
-    def sendSignal (self, sign):
-        try:
-            if sys.platform != "win32":
-                os.kill(self.pid, signal.SIGCONT)
-            os.kill(self.pid, sign)
-        except OSError as e:
-            if e.errno in (errno.ESRCH, errno.EACCES, errno.EINVAL):
-                #No such process, Permission denied, Invalid argument
-                pass
-            else:
-                raise OSError(e.errno, os.strerror(e.errno))
-
-    def pause (self):
-        if sys.platform != "win32":
-            self.sendSignal(signal.SIGSTOP)
-    
-    def resume (self):
-        if sys.platform != "win32":
-            self.sendSignal(signal.SIGCONT)
-    
-    def sigkill (self):
-        if sys.platform == "win32":
-            self.sendSignal(signal.SIGABRT)
-        else:
-            self.sendSignal(signal.SIGKILL)
-    
-    def sigterm (self):
-        self.sendSignal(signal.SIGTERM)
-    
-    def sigint (self):
-        self.sendSignal(signal.SIGINT)
-        
-    def write(self, data):
-        if self.subprocess.poll() is not None:
-            GLib.idle_add(self.emit, "died")
-        elif self.subprocess.stdin.closed:
-            GLib.idle_add(self.emit, "died")
-            self.gentleKill()
-        else:
-            self.subprocess.stdin.write(data)
-            self.subprocess.stdin.flush()
-
 ################################################################################
 
 if __name__ == "__main__":
     loop = GObject.MainLoop()
     paths = ("igang.dk", "google.com", "google.dk", "myspace.com", "yahoo.com")
     maxlen = max(len(p) for p in paths)
-    def callback (subp, line, path):
-        print("\t", path.ljust(maxlen), line.rstrip("\n"))
+    def callback (subp, lines, path):
+        for line in lines:
+            print("\t", path.ljust(maxlen), line.rstrip("\n"))
     for path in paths:
         subp = SubProcess("/bin/ping", [path])
-        subp.connect("line", callback, path)
+        subp.connect("lines", callback, path)
     loop.run()
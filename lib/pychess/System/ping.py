@@ -44,10 +44,14 @@ class Pinger (GObject.GObject):
         else:
             args = ["-i10", self.host]
         self.subproc = SubProcess(searchPath("ping"), args, env={"LANG":"en"})
-        self.conid1 = self.subproc.connect("line", self.__handleLines)
+        self.conid1 = self.subproc.connect("lines", self.__handleLines)
         self.conid2 = self.subproc.connect("died", self.__handleDead)
 
-    def __handleLines (self, subprocess, line):
+    def __handleLines (self, subprocess, lines):
+        for line in lines:
+            self.__handleLine(line)
+    
+    def __handleLine (self, line):
         match = self.expression.search(line)
         if match:
             time, unit = match.groups()
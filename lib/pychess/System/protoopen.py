@@ -1,10 +1,22 @@
+import bz2
+import gzip
+import io
 import os
 import sys
+import zipfile
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 from pychess.compat import open, urlopen, unquote
 
 PGN_ENCODING = "latin_1"
 
+# The endings of the compressed files protoopen decompresses while reading
+COMPRESSED_ENDINGS = ("gz", "bz2", "xz", "zip")
+
 def splitUri (uri):
     uri = unquote(uri) # escape special chars
     uri = uri.strip('\r\n\x00') # remove \r\n and NULL
@@ -13,9 +25,177 @@ def splitUri (uri):
     else:
         return uri.split("://")
 
-def protoopen (uri):
-    """ Function for opening many things """
+def uriEnding (uri):
+    """ Returns the ending telling the format of uri, leaving out the ending
+        of a compression, so "games.pgn.gz" and "games.zip" are "pgn". Only
+        local files are decompressed by protoopen, so other compressed uris
+        keep the ending of the compression. """
+    ending = uri[uri.rfind(".")+1:]
+    if ending.lower() not in COMPRESSED_ENDINGS or not os.path.isfile(uri):
+        return ending
+    if ending.lower() == "zip":
+        return "pgn"
+    uri = uri[:uri.rfind(".")]
+    return uri[uri.rfind(".")+1:]
+
+READ_CHUNK = 65536
+
+class _BZ2Reader (object):
+    """ Decompresses the bzip2 data of a binary file while it's read. The
+        BZ2File of Python 2 only takes the name of a file. """
+
+    def __init__ (self, raw):
+        self.raw = raw
+        self.decompressor = bz2.BZ2Decompressor()
+        self.buffer = b""
+
+    def read (self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.raw.read(READ_CHUNK)
+            if not chunk:
+                break
+            try:
+                self.buffer += self.decompressor.decompress(chunk)
+            except EOFError:
+                # The end of the bzip2 stream
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def seekable (self):
+        return False
+
+    def close (self):
+        pass
+
+class CompressedFile (object):
+    """ A binary file decompressing a gzip, bzip2, xz or zip file while it's
+        read. Seeking forward decompresses the data skipped, seeking backward
+        starts over. The progress is told by the compressed bytes read. """
+
+    def __init__ (self, path, member=None):
+        self.name = path
+        self.raw = open(path, "rb")
+        self.ending = path[path.rfind(".")+1:].lower()
+        self.member = member
+        # The span of the compressed data in the file
+        self.start = 0
+        self.size = os.fstat(self.raw.fileno()).st_size
+        try:
+            self.stream = self.__openStream()
+        except (zipfile.BadZipfile, KeyError) as e:
+            self.raw.close()
+            raise IOError(str(e))
+        except:
+            self.raw.close()
+            raise
+        # The members of zip files can't seek before Python 3.7, nor can
+        # _BZ2Reader. Their position is kept here, see seek().
+        self.pos = None if self.stream.seekable() else 0
+
+    def __openStream (self):
+        ending = self.ending
+        if ending == "gz":
+            return gzip.GzipFile(fileobj=self.raw)
+        elif ending == "bz2":
+            if sys.version_info < (3,):
+                return _BZ2Reader(self.raw)
+            return bz2.BZ2File(self.raw)
+        elif ending == "xz":
+            if lzma is None:
+                raise IOError("Reading %s needs the lzma module" % self.name)
+            return lzma.LZMAFile(self.raw)
+        elif ending == "zip":
+            zf = zipfile.ZipFile(self.raw)
+            if self.member is None:
+                names = zf.namelist()
+                pgns = [name for name in names if name.lower().endswith(".pgn")]
+                if not pgns and not names:
+                    raise IOError("%s is an empty zip file" % self.name)
+                self.member = (pgns or names)[0]
+            stream = zf.open(self.member)
+            self.start = self.raw.tell()
+            self.size = zf.getinfo(self.member).compress_size
+            return stream
+        else:
+            raise IOError("%s isn't a compressed file pychess can read" % self.name)
+
+    def read (self, size=-1):
+        data = self.stream.read(size)
+        if self.pos is not None:
+            self.pos += len(data)
+        return data
+
+    # Python 2's TextIOWrapper reads through read1
+    read1 = read
+
+    def seek (self, offset, whence=0):
+        if self.pos is None:
+            return self.stream.seek(offset, whence)
+        if whence == 1:
+            offset += self.pos
+        elif whence != 0:
+            raise IOError("%s can only seek from the start" % self.name)
+        if offset < self.pos:
+            self.stream.close()
+            self.raw.seek(0)
+            self.stream = self.__openStream()
+            self.pos = 0
+        while self.pos < offset:
+            if not self.read(min(READ_CHUNK, offset - self.pos)):
+                break
+        return self.pos
+
+    def tell (self):
+        if self.pos is None:
+            return self.stream.tell()
+        return self.pos
+
+    def seekable (self):
+        return True
+
+    def readable (self):
+        return True
+
+    def writable (self):
+        return False
+
+    @property
+    def closed (self):
+        return self.raw.closed
+
+    def flush (self):
+        pass
+
+    def progress (self):
+        """ The part of the compressed file read, from 0 to 1 """
+        if not self.size:
+            return 1.0
+        return min(1.0, float(self.raw.tell() - self.start) / self.size)
+
+    def close (self):
+        self.stream.close()
+        self.raw.close()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+def protoopen (uri, member=None):
+    """ Function for opening many things. Compressed files are decompressed
+        while they are read, see CompressedFile, the member of a zip file
+        being the first .pgn file in it if not given. The pgn loader reads
+        them as binary files, other formats get a text file. """
    
+    if uri[uri.rfind(".")+1:].lower() in COMPRESSED_ENDINGS and os.path.isfile(uri):
+        if uriEnding(uri) == "pgn":
+            return CompressedFile(uri, member)
+        return io.TextIOWrapper(CompressedFile(uri, member), encoding=PGN_ENCODING)
+
     try:
         return open(uri, "rU", encoding=PGN_ENCODING)
     except (IOError, OSError):
@@ -1,6 +1,6 @@
 from __future__ import print_function
 from pychess.Utils.lutils.LBoard import LBoard
-from pychess.Utils.lutils.leval import clearPawnTable
+from pychess.Utils.lutils.leval import clearPawnTable, pawnTableStats
 from pychess.Utils.lutils.lmove import listToSan
 from pychess.Utils.lutils import lsearch
 from pychess.Utils.const import *
@@ -27,29 +27,47 @@ benchmarkPositions = [
   "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26"
 ]
     
-def benchmark ():
-    """ Times a search of a static list of positions. """
+def benchmark (smp=None, clearPawns=False):
+    """ Times a search of a static list of positions. If smp is a LazySMP, its
+        helper processes search along. The pawn hash is kept between the
+        positions, unless clearPawns is set. """
     
+    clearPawnTable()
     suite_time = time()
     suite_nodes = lsearch.nodes
+    helper_nodes = 0
     lsearch.endtime = sys.maxsize
     lsearch.searching = True
     for i, fen in enumerate(benchmarkPositions):
         lsearch.table.clear()
-        clearPawnTable()
+        if clearPawns:
+            clearPawnTable()
         board = LBoard(NORMALCHESS)
         board.applyFen(fen)
         pos_start_time = time()
         pos_start_nodes = lsearch.nodes
+        if smp is not None:
+            smp.start(board, lsearch.endtime, 5)
+        stats = None
         for depth in range (1, 6):
-            mvs, scr = lsearch.alphaBeta (board, depth)
+            mvs, scr, stats = lsearch.iterate (board, depth, stats)
             pos_time = time() - pos_start_time
             pos_nodes = lsearch.nodes - pos_start_nodes
+            if smp is not None:
+                pos_nodes += smp.nodes
             pv = " ".join(listToSan(board, mvs))
             time_cs = int(100 * pos_time)
             print(depth, scr, time_cs, pos_nodes, pv)
+            print("#", lsearch.formatStats(stats))
+        if smp is not None:
+            smp.stop()
+            helper_nodes += smp.nodes
         print("Searched position", i, "at", int(pos_nodes / pos_time), "n/s")
     suite_time = time() - suite_time
-    suite_nodes = lsearch.nodes - suite_nodes
+    suite_nodes = lsearch.nodes - suite_nodes + helper_nodes
     print("Total:", suite_nodes, "nodes in", suite_time, "s: ", suite_nodes / suite_time, "n/s")
+    stats = pawnTableStats()
+    probes = max(1, stats["hits"] + stats["misses"])
+    print("Pawn hash:", stats["hits"], "hits,", stats["misses"], "misses,",
+          stats["collisions"], "collisions,", "%.1f%% hit rate" % (100. * stats["hits"] / probes))
     lsearch.nodes = 0
@@ -16,20 +16,52 @@ from .PolyglotHash import *
 # number is not specified
 STRICT_FEN = False
 
+################################################################################
+# Undo stack                                                                   #
+################################################################################
+
+# Every applied move pushes one record on LBoard.hist, holding the state
+# popMove needs to restore. These are the indexes into that tuple.
+HIST_MOVE = 0       # The move that was applied to get the position
+HIST_TPIECE = 1     # The piece the move captured, == EMPTY for normal moves
+HIST_ENPASSANT = 2
+HIST_CASTLING = 3
+HIST_HASH = 4
+HIST_PAWNHASH = 5
+HIST_FIFTY = 6
+HIST_CHECKED = 7
+HIST_OPCHECKED = 8
+# capture_promoting in drop variants, is_first_move in cambodian and the
+# exploded pieces in atomic. None otherwise.
+HIST_VARIANT = 9
+# The record of the previous ply, or None. The records form a linked chain, so
+# a board and all its clones share their common history.
+HIST_PREV = 10
+
 ################################################################################
 # LBoard                                                                       #
 ################################################################################
 
-class LBoard:
-    ini_kings = (E1, E8)
-    ini_rooks = ((A1, H1), (A8, H8))
+# Castling cords of normal chess. Variants needing other ones set their own.
+INI_KINGS = (E1, E8)
+INI_ROOKS = ((A1, H1), (A8, H8))
+
+# Final positions of castled kings and rooks
+FIN_KINGS = ((C1,G1),(C8,G8))
+FIN_ROOKS = ((D1,F1),(D8,F8))
 
-    # Final positions of castled kings and rooks
-    fin_kings = ((C1,G1),(C8,G8))
-    fin_rooks = ((D1,F1),(D8,F8))
+NO_HOLDING = ({PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0},
+              {PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0})
 
-    holding = ({PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0},
-               {PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0})
+class LBoard(object):
+    # Games are stored as one LBoard per ply, so keep the instances small
+    __slots__ = ("variant", "nags", "children", "next", "prev", "pieceBoard",
+                 "fen_was_applied", "blocker", "friends", "kings", "boards",
+                 "enpassant", "color", "castling", "hasCastled", "fifty",
+                 "plyCount", "checked", "opchecked", "arBoard", "hash",
+                 "pawnhash", "hist", "pieceCount", "ini_kings", "ini_rooks",
+                 "fin_kings", "fin_rooks", "ini_queens", "holding", "promoted",
+                 "capture_promoting", "is_first_move", "_shared")
 
     def __init__ (self, variant=NORMALCHESS):
         self.variant = variant
@@ -51,25 +83,78 @@ class LBoard:
         # when we add a variation to last played board from hint panel
         self.fen_was_applied = False
         
+        self.ini_kings = INI_KINGS
+        self.ini_rooks = INI_ROOKS
+        self.fin_kings = FIN_KINGS
+        self.fin_rooks = FIN_ROOKS
+        self.holding = NO_HOLDING
+        
+        # True while the piece arrays are shared with a clone, see unshare()
+        self._shared = False
+        
     @property
     def lastMove (self):
-        return self.hist_move[-1] if self.fen_was_applied and len(self.hist_move) > 0 else None
+        return self.hist[HIST_MOVE] if self.fen_was_applied and self.hist is not None else None
+
+    def _histRecords (self):
+        """ The undo records, oldest first """
+        records = []
+        hist = self.hist
+        while hist is not None:
+            records.append(hist)
+            hist = hist[HIST_PREV]
+        records.reverse()
+        return records
+
+    def __getstate__ (self):
+        # Pickling the chain of undo records would recurse once per ply, so
+        # it's flattened into a list of records without their links
+        state = dict((slot, getattr(self, slot)) for slot in self.__slots__
+                     if hasattr(self, slot))
+        state["hist"] = [record[:HIST_PREV] for record in self._histRecords()]
+        return state
+
+    def __setstate__ (self, state):
+        hist = None
+        for record in state.pop("hist"):
+            hist = record + (hist,)
+        self.hist = hist
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        # The arrays are no longer shared with the boards of the pickler
+        self._shared = False
+
+    # Read only views of the undo stack, one entry per ply
+    hist_move = property(lambda self: [h[HIST_MOVE] for h in self._histRecords()])
+    hist_tpiece = property(lambda self: [h[HIST_TPIECE] for h in self._histRecords()])
+    hist_enpassant = property(lambda self: [h[HIST_ENPASSANT] for h in self._histRecords()])
+    hist_castling = property(lambda self: [h[HIST_CASTLING] for h in self._histRecords()])
+    hist_hash = property(lambda self: [h[HIST_HASH] for h in self._histRecords()])
+    hist_fifty = property(lambda self: [h[HIST_FIFTY] for h in self._histRecords()])
+    hist_checked = property(lambda self: [h[HIST_CHECKED] for h in self._histRecords()])
+    hist_opchecked = property(lambda self: [h[HIST_OPCHECKED] for h in self._histRecords()])
+    # Variant specific ones
+    hist_capture_promoting = property(lambda self: [h[HIST_VARIANT] for h in self._histRecords()])
+    hist_is_first_move = property(lambda self: [
+        {KING: h[HIST_VARIANT][0][:], QUEEN: h[HIST_VARIANT][1][:]} for h in self._histRecords()])
+    hist_exploding_around = property(lambda self: [
+        h[HIST_VARIANT] for h in self._histRecords() if h[HIST_VARIANT] is not None])
 
     def repetitionCount (self, drawThreshold=3):
         rc = 1
-        for ply in range(4, 1+min(len(self.hist_hash), self.fifty), 2):
-            if self.hist_hash[-ply] == self.hash:
+        ply = 0
+        hist = self.hist
+        while hist is not None and ply < self.fifty:
+            ply += 1
+            if ply >= 4 and not ply & 1 and hist[HIST_HASH] == self.hash:
                 rc += 1
                 if rc >= drawThreshold: break
+            hist = hist[HIST_PREV]
         return rc
 
-    def iniAtomic(self):
-        self.hist_exploding_around = []
-        
     def iniHouse(self):
-        self.promoted = [0]*64
+        self.promoted = bytearray(64)
         self.capture_promoting = False
-        self.hist_capture_promoting = []
         self.holding = ({PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0},
                         {PAWN:0, KNIGHT:0, BISHOP:0, ROOK:0, QUEEN:0, KING:0})
 
@@ -77,7 +162,6 @@ class LBoard:
         self.ini_kings = (D1, E8)
         self.ini_queens = (E1, D8)
         self.is_first_move = {KING: [True, True], QUEEN: [True, True]}
-        self.hist_is_first_move = []
         
     def applyFen (self, fenstr):
         """ Applies the fenstring to the board.
@@ -105,20 +189,14 @@ class LBoard:
         self.checked = None
         self.opchecked = None
         
-        self.arBoard = [0]*64
+        self.arBoard = bytearray(64)
         
         self.hash = 0
         self.pawnhash = 0
         
-        #  Data from the position's history:
-        self.hist_move = []      # The move that was applied to get the position
-        self.hist_tpiece = []    # The piece the move captured, == EMPTY for normal moves
-        self.hist_enpassant = []
-        self.hist_castling = []
-        self.hist_hash = []
-        self.hist_fifty = []
-        self.hist_checked = []
-        self.hist_opchecked = []
+        #  Data from the position's history. One record per applied move,
+        #  see the HIST_* indexes.
+        self.hist = None
 
         # piece counts
         self.pieceCount = [[0]*7, [0]*7]
@@ -136,9 +214,6 @@ class LBoard:
         elif self.variant in DROP_VARIANTS:
             self.iniHouse()
 
-        elif self.variant == ATOMICCHESS:
-            self.iniAtomic()
-
         elif self.variant == CAMBODIANCHESS:
             self.iniCambodian()
             
@@ -375,10 +450,11 @@ class LBoard:
         return board_clone.opIsChecked()
         
     def _addPiece (self, cord, piece, color):
-        _setBit = setBit
-        self.boards[color][piece] = _setBit(self.boards[color][piece], cord)
-        self.friends[color] = _setBit(self.friends[color], cord)
-        self.blocker = _setBit(self.blocker, cord)
+        # inlined setBit()
+        bit = bitPosArray[cord]
+        self.boards[color][piece] |= bit
+        self.friends[color] |= bit
+        self.blocker |= bit
         
         if piece == PAWN:
             self.pawnhash ^= pieceHashes[color][PAWN][cord]
@@ -388,10 +464,11 @@ class LBoard:
         self.arBoard[cord] = piece
     
     def _removePiece (self, cord, piece, color):
-        _clearBit = clearBit
-        self.boards[color][piece] = _clearBit(self.boards[color][piece], cord)
-        self.friends[color] = _clearBit(self.friends[color], cord)
-        self.blocker = _clearBit(self.blocker, cord)
+        # inlined clearBit()
+        bit = notBitPosArray[cord]
+        self.boards[color][piece] &= bit
+        self.friends[color] &= bit
+        self.blocker &= bit
         
         if piece == PAWN:
             self.pawnhash ^= pieceHashes[color][PAWN][cord]
@@ -399,6 +476,25 @@ class LBoard:
         self.hash ^= pieceHashes[color][piece][cord]
         self.arBoard[cord] = EMPTY
     
+    # popMove restores the hashes from the undo stack, so these two don't
+    # bother updating them
+    
+    def _putPiece (self, cord, piece, color):
+        bit = bitPosArray[cord]
+        self.boards[color][piece] |= bit
+        self.friends[color] |= bit
+        self.blocker |= bit
+        if piece == KING:
+            self.kings[color] = cord
+        self.arBoard[cord] = piece
+    
+    def _takePiece (self, cord, piece, color):
+        bit = notBitPosArray[cord]
+        self.boards[color][piece] &= bit
+        self.friends[color] &= bit
+        self.blocker &= bit
+        self.arBoard[cord] = EMPTY
+    
     def setColor (self, color):
         if color == self.color: return
         self.color = color
@@ -440,6 +536,9 @@ class LBoard:
         self.enpassant = epcord
     #@profile
     def applyMove (self, move):
+        if self._shared:
+            self.unshare()
+        
         flag = move >> 12
 
         fcord = (move >> 6) & 63
@@ -451,29 +550,36 @@ class LBoard:
         color = self.color
         opcolor = 1-self.color
         castling = self.castling
+        variant = self.variant
         
-        self.hist_move.append(move)
-        self.hist_enpassant.append(self.enpassant)
-        self.hist_castling.append(self.castling)
-        self.hist_hash.append(self.hash)
-        self.hist_fifty.append(self.fifty)
-        self.hist_checked.append(self.checked)
-        self.hist_opchecked.append(self.opchecked)
-        if self.variant in DROP_VARIANTS:
-            self.hist_capture_promoting.append(self.capture_promoting)
-        if self.variant == CAMBODIANCHESS:
-            self.hist_is_first_move.append({KING: self.is_first_move[KING][:], \
-                                            QUEEN: self.is_first_move[QUEEN][:]})
+        # Remember the state popMove will need to restore
+        histEnpassant = self.enpassant
+        histCastling = castling
+        histHash = self.hash
+        histPawnhash = self.pawnhash
+        histFifty = self.fifty
+        histChecked = self.checked
+        histOpchecked = self.opchecked
+        if variant in DROP_VARIANTS:
+            variantHist = self.capture_promoting
+        elif variant == CAMBODIANCHESS:
+            variantHist = (self.is_first_move[KING][:],
+                           self.is_first_move[QUEEN][:])
+        else:
+            variantHist = None
             
         self.opchecked = None
         self.checked = None
 
         if flag == NULL_MOVE:
+            self.hist = (move, EMPTY, histEnpassant, histCastling, histHash,
+                         histPawnhash, histFifty, histChecked, histOpchecked,
+                         variantHist, self.hist)
             self.setColor(opcolor)
             self.plyCount += 1
             return move
 
-        if self.variant == CAMBODIANCHESS:
+        if variant == CAMBODIANCHESS:
             if fpiece == KING and self.is_first_move[KING][color]:
                 self.is_first_move[KING][color] = False
             elif fpiece == QUEEN and self.is_first_move[QUEEN][color]:
@@ -485,7 +591,7 @@ class LBoard:
             fpiece = KING
             tpiece = EMPTY # In FRC, there may be a rook there, but the king doesn't capture it.
             fcord = self.ini_kings[color]
-            if FILE(fcord) == 3 and self.variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS):
+            if FILE(fcord) == 3 and variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS):
                 side = 0 if side == 1 else 1
             tcord = self.fin_kings[color][side]
             rookf = self.ini_rooks[color][side]
@@ -495,16 +601,16 @@ class LBoard:
         if tpiece != EMPTY and fcord != tcord:
             self._removePiece(tcord, tpiece, opcolor)
             self.pieceCount[opcolor][tpiece] -= 1
-            if self.variant in DROP_VARIANTS:
+            if variant in DROP_VARIANTS:
                 if self.promoted[tcord]:
-                    if self.variant == CRAZYHOUSECHESS:
+                    if variant == CRAZYHOUSECHESS:
                         self.holding[color][PAWN] += 1
                     self.capture_promoting = True
                 else:
-                    if self.variant == CRAZYHOUSECHESS:
+                    if variant == CRAZYHOUSECHESS:
                         self.holding[color][tpiece] += 1
                     self.capture_promoting = False
-            elif self.variant == ATOMICCHESS:
+            elif variant == ATOMICCHESS:
                 from pychess.Variants.atomic import piecesAround
                 apieces = [(fcord, fpiece, color),]
                 for acord, apiece, acolor in piecesAround(self, tcord):
@@ -517,13 +623,11 @@ class LBoard:
                             castling &= ~CAS_FLAGS[opcolor][0]
                         elif acord == self.ini_rooks[opcolor][1]:
                             castling &= ~CAS_FLAGS[opcolor][1]
-                self.hist_exploding_around.append(apieces)
+                variantHist = apieces
             
-        self.hist_tpiece.append(tpiece)
-        
         # Remove moving piece(s), then add them at their destination.
         if flag == DROP:
-            if self.variant in DROP_VARIANTS:
+            if variant in DROP_VARIANTS:
                 assert self.holding[color][fpiece] > 0
             self.holding[color][fpiece] -= 1
             self.pieceCount[color][fpiece] += 1
@@ -539,9 +643,9 @@ class LBoard:
             takenPawnC = tcord + (color == WHITE and -8 or 8)
             self._removePiece (takenPawnC, PAWN, opcolor)
             self.pieceCount[opcolor][PAWN] -= 1
-            if self.variant == CRAZYHOUSECHESS:
+            if variant == CRAZYHOUSECHESS:
                 self.holding[color][PAWN] += 1
-            elif self.variant == ATOMICCHESS:
+            elif variant == ATOMICCHESS:
                 from pychess.Variants.atomic import piecesAround
                 apieces = [(fcord, fpiece, color),]
                 for acord, apiece, acolor in piecesAround(self, tcord):
@@ -549,14 +653,14 @@ class LBoard:
                         self._removePiece(acord, apiece, acolor)
                         self.pieceCount[acolor][apiece] -= 1
                         apieces.append((acord, apiece, acolor))
-                self.hist_exploding_around.append(apieces)
+                variantHist = apieces
         elif flag in PROMOTIONS:
             # Pretend the pawn changes into a piece before reaching its destination.
             fpiece = flag - 2
             self.pieceCount[color][fpiece] += 1
             self.pieceCount[color][PAWN] -=1
 
-        if self.variant in DROP_VARIANTS:
+        if variant in DROP_VARIANTS:
             if tpiece == EMPTY:
                 self.capture_promoting = False
             
@@ -569,14 +673,15 @@ class LBoard:
                 elif tpiece != EMPTY:
                     self.promoted[tcord] = 0
 
-        if self.variant == ATOMICCHESS and (tpiece != EMPTY or flag == ENPASSANT):
+        if variant == ATOMICCHESS and (tpiece != EMPTY or flag == ENPASSANT):
             self.pieceCount[color][fpiece] -= 1
         else:
             self._addPiece(tcord, fpiece, color)
 
         if fpiece == PAWN and abs(fcord-tcord) == 16:
             self.setEnpassant ((fcord + tcord) // 2)
-        else: self.setEnpassant (None)
+        elif self.enpassant != None:
+            self.setEnpassant (None)
         
         if tpiece == EMPTY and fpiece != PAWN:
             self.fifty += 1
@@ -584,133 +689,141 @@ class LBoard:
             self.fifty = 0
         
         # Clear castle flags
-        king = self.ini_kings[color]
-        wildcastle = FILE(king) == 3 and self.variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS)
-        if fpiece == KING:
-            castling &= ~CAS_FLAGS[color][0]
-            castling &= ~CAS_FLAGS[color][1]
-        elif fpiece == ROOK:
-            if fcord == self.ini_rooks[color][0]:
-                side = 1 if wildcastle else 0
-                castling &= ~CAS_FLAGS[color][side]
-            elif fcord == self.ini_rooks[color][1]:
-                side = 0 if wildcastle else 1
-                castling &= ~CAS_FLAGS[color][side]
-        if tpiece == ROOK:
-            if tcord == self.ini_rooks[opcolor][0]:
-                side = 1 if wildcastle else 0
-                castling &= ~CAS_FLAGS[opcolor][side]
-            elif tcord == self.ini_rooks[opcolor][1]:
-                side = 0 if wildcastle else 1
-                castling &= ~CAS_FLAGS[opcolor][side]
-        self.setCastling(castling)
+        if castling:
+            king = self.ini_kings[color]
+            wildcastle = FILE(king) == 3 and variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS)
+            if fpiece == KING:
+                castling &= ~CAS_FLAGS[color][0]
+                castling &= ~CAS_FLAGS[color][1]
+            elif fpiece == ROOK:
+                if fcord == self.ini_rooks[color][0]:
+                    side = 1 if wildcastle else 0
+                    castling &= ~CAS_FLAGS[color][side]
+                elif fcord == self.ini_rooks[color][1]:
+                    side = 0 if wildcastle else 1
+                    castling &= ~CAS_FLAGS[color][side]
+            if tpiece == ROOK:
+                if tcord == self.ini_rooks[opcolor][0]:
+                    side = 1 if wildcastle else 0
+                    castling &= ~CAS_FLAGS[opcolor][side]
+                elif tcord == self.ini_rooks[opcolor][1]:
+                    side = 0 if wildcastle else 1
+                    castling &= ~CAS_FLAGS[opcolor][side]
+            if castling != self.castling:
+                self.setCastling(castling)
 
-        self.setColor(opcolor)
+        # inlined setColor()
+        self.color = opcolor
+        self.hash ^= colorHash
         self.plyCount += 1
+        
+        self.hist = (move, tpiece, histEnpassant, histCastling, histHash,
+                     histPawnhash, histFifty, histChecked, histOpchecked,
+                     variantHist, self.hist)
 
     def popMove (self):
         # Note that we remove the last made move, which was not made by boards
         # current color, but by its opponent
+        if self._shared:
+            self.unshare()
+        
         color = 1 - self.color
         opcolor = self.color
+        variant = self.variant
         
-        move = self.hist_move.pop()
-        cpiece = self.hist_tpiece.pop()
+        move, cpiece, enpassant, castling, hash, pawnhash, fifty, checked, \
+            opchecked, variantHist, self.hist = self.hist
             
         flag = move >> 12
         
-        if flag == NULL_MOVE:
-            self.setColor(color)
-            return
+        if flag != NULL_MOVE:
+            fcord = (move >> 6) & 63
+            tcord = move & 63
+            tpiece = self.arBoard[tcord]
             
-        fcord = (move >> 6) & 63
-        tcord = move & 63
-        tpiece = self.arBoard[tcord]
-        
-        # Castling moves can be represented strangely, so normalize them.
-        if flag in (KING_CASTLE, QUEEN_CASTLE):
-            side = flag - QUEEN_CASTLE
-            tpiece = KING
-            fcord = self.ini_kings[color]
-            if FILE(fcord) == 3 and self.variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS):
-                side = 0 if side == 1 else 1
-            tcord = self.fin_kings[color][side]
-            rookf = self.ini_rooks[color][side]
-            rookt = self.fin_rooks[color][side]
-            self._removePiece (tcord, tpiece, color)
-            self._removePiece (rookt, ROOK, color)
-            self._addPiece (rookf, ROOK, color)
-            self.hasCastled[color] = False
-        else:
-            self._removePiece (tcord, tpiece, color)
-        
-        # Put back captured piece
-        if cpiece != EMPTY and fcord != tcord:
-            self._addPiece (tcord, cpiece, opcolor)
-            self.pieceCount[opcolor][cpiece] += 1
-            if self.variant == CRAZYHOUSECHESS:
-                if self.capture_promoting:
+            # Castling moves can be represented strangely, so normalize them.
+            if flag in (KING_CASTLE, QUEEN_CASTLE):
+                side = flag - QUEEN_CASTLE
+                tpiece = KING
+                fcord = self.ini_kings[color]
+                if FILE(fcord) == 3 and variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS):
+                    side = 0 if side == 1 else 1
+                tcord = self.fin_kings[color][side]
+                rookf = self.ini_rooks[color][side]
+                rookt = self.fin_rooks[color][side]
+                self._takePiece (tcord, tpiece, color)
+                self._takePiece (rookt, ROOK, color)
+                self._putPiece (rookf, ROOK, color)
+                self.hasCastled[color] = False
+            else:
+                self._takePiece (tcord, tpiece, color)
+            
+            # Put back captured piece
+            if cpiece != EMPTY and fcord != tcord:
+                self._putPiece (tcord, cpiece, opcolor)
+                self.pieceCount[opcolor][cpiece] += 1
+                if variant == CRAZYHOUSECHESS:
+                    if self.capture_promoting:
+                        assert self.holding[color][PAWN] > 0
+                        self.holding[color][PAWN] -= 1
+                    else:
+                        assert self.holding[color][cpiece] > 0
+                        self.holding[color][cpiece] -= 1
+                elif variant == ATOMICCHESS:
+                    for acord, apiece, acolor in variantHist:
+                        self._putPiece (acord, apiece, acolor)
+                        self.pieceCount[acolor][apiece] += 1
+                        
+            # Put back piece captured by enpassant
+            if flag == ENPASSANT:
+                epcord = color == WHITE and tcord - 8 or tcord + 8
+                self._putPiece (epcord, PAWN, opcolor)
+                self.pieceCount[opcolor][PAWN] += 1
+                if variant == CRAZYHOUSECHESS:
                     assert self.holding[color][PAWN] > 0
                     self.holding[color][PAWN] -= 1
-                else:
-                    assert self.holding[color][cpiece] > 0
-                    self.holding[color][cpiece] -= 1
-            elif self.variant == ATOMICCHESS:
-                apieces = self.hist_exploding_around.pop()
-                for acord, apiece, acolor in apieces:
-                    self._addPiece (acord, apiece, acolor)
-                    self.pieceCount[acolor][apiece] += 1
-                    
+                elif variant == ATOMICCHESS:
+                    for acord, apiece, acolor in variantHist:
+                        self._putPiece (acord, apiece, acolor)
+                        self.pieceCount[acolor][apiece] += 1
                 
-        # Put back piece captured by enpassant
-        if flag == ENPASSANT:
-            epcord = color == WHITE and tcord - 8 or tcord + 8
-            self._addPiece (epcord, PAWN, opcolor)
-            self.pieceCount[opcolor][PAWN] += 1
-            if self.variant == CRAZYHOUSECHESS:
-                assert self.holding[color][PAWN] > 0
-                self.holding[color][PAWN] -= 1
-            elif self.variant == ATOMICCHESS:
-                apieces = self.hist_exploding_around.pop()
-                for acord, apiece, acolor in apieces:
-                    self._addPiece (acord, apiece, acolor)
-                    self.pieceCount[acolor][apiece] += 1
+            # Un-promote pawn
+            if flag in PROMOTIONS:
+                tpiece = PAWN
+                self.pieceCount[color][flag-2] -= 1
+                self.pieceCount[color][PAWN] +=1
             
-        # Un-promote pawn
-        if flag in PROMOTIONS:
-            tpiece = PAWN
-            self.pieceCount[color][flag-2] -= 1
-            self.pieceCount[color][PAWN] +=1
-
-        # Put back moved piece
-        if flag == DROP:
-            self.holding[color][tpiece] += 1
-            self.pieceCount[color][tpiece] -= 1
-        else:
-            if not (self.variant == ATOMICCHESS and (cpiece != EMPTY or flag == ENPASSANT)):
-                self._addPiece (fcord, tpiece, color)
-
-        if self.variant in DROP_VARIANTS:
-            if flag != DROP:
-                if self.promoted[tcord] and (not flag in PROMOTIONS):
-                    self.promoted[fcord] = 1
-                if self.capture_promoting:
-                    self.promoted[tcord] = 1
-                else:
-                    self.promoted[tcord] = 0
-            self.capture_promoting = self.hist_capture_promoting.pop()
+            # Put back moved piece
+            if flag == DROP:
+                self.holding[color][tpiece] += 1
+                self.pieceCount[color][tpiece] -= 1
+            else:
+                if not (variant == ATOMICCHESS and (cpiece != EMPTY or flag == ENPASSANT)):
+                    self._putPiece (fcord, tpiece, color)
+            
+            if variant in DROP_VARIANTS:
+                if flag != DROP:
+                    if self.promoted[tcord] and (not flag in PROMOTIONS):
+                        self.promoted[fcord] = 1
+                    if self.capture_promoting:
+                        self.promoted[tcord] = 1
+                    else:
+                        self.promoted[tcord] = 0
         
-        if self.variant == CAMBODIANCHESS:
-            self.is_first_move = self.hist_is_first_move.pop()
+        if variant in DROP_VARIANTS:
+            self.capture_promoting = variantHist
+        elif variant == CAMBODIANCHESS:
+            self.is_first_move = {KING: variantHist[0][:],
+                                  QUEEN: variantHist[1][:]}
             
-        self.setColor(color)
-        
-        self.checked = self.hist_checked.pop()
-        self.opchecked = self.hist_opchecked.pop()
-        self.enpassant = self.hist_enpassant.pop()
-        self.castling = self.hist_castling.pop()
-        self.hash = self.hist_hash.pop()
-        self.fifty = self.hist_fifty.pop()
+        self.color = color
+        self.checked = checked
+        self.opchecked = opchecked
+        self.enpassant = enpassant
+        self.castling = castling
+        self.hash = hash
+        self.pawnhash = pawnhash
+        self.fifty = fifty
         self.plyCount -= 1
     
     def __hash__ (self):
@@ -869,18 +982,21 @@ class LBoard:
         return "".join(fenstr)
     
     def clone (self):
+        """ Returns a copy of the board. The piece arrays are shared with the
+            copy until one of the boards applies or pops a move, see
+            unshare(). """
         copy = LBoard(self.variant)
         copy.blocker = self.blocker
         
-        copy.friends = self.friends[:]
-        copy.kings = self.kings[:]
-        copy.boards = [self.boards[WHITE][:], self.boards[BLACK][:]]
-        copy.arBoard = self.arBoard[:]
-        copy.pieceCount = [self.pieceCount[WHITE][:], self.pieceCount[BLACK][:]]
+        copy.friends = self.friends
+        copy.kings = self.kings
+        copy.boards = self.boards
+        copy.arBoard = self.arBoard
+        copy.pieceCount = self.pieceCount
+        copy.hasCastled = self.hasCastled
         
         copy.color = self.color
         copy.plyCount = self.plyCount
-        copy.hasCastled = self.hasCastled[:]
 
         copy.enpassant = self.enpassant
         copy.castling = self.castling
@@ -890,35 +1006,43 @@ class LBoard:
         copy.checked = self.checked
         copy.opchecked = self.opchecked
         
-        copy.hist_move = self.hist_move[:]
-        copy.hist_tpiece = self.hist_tpiece[:]
-        copy.hist_enpassant = self.hist_enpassant[:]
-        copy.hist_castling = self.hist_castling[:]
-        copy.hist_hash = self.hist_hash[:]
-        copy.hist_fifty = self.hist_fifty[:]
-        copy.hist_checked = self.hist_checked[:]
-        copy.hist_opchecked = self.hist_opchecked[:]
+        # The records are immutable, so the history is shared as well
+        copy.hist = self.hist
         
-        if self.variant == FISCHERRANDOMCHESS:
-            copy.ini_kings = self.ini_kings[:]
-            copy.ini_rooks = (self.ini_rooks[0][:], self.ini_rooks[1][:])
-        elif self.variant in (WILDCASTLECHESS, WILDCASTLESHUFFLECHESS):
-            copy.ini_kings = self.ini_kings[:]
-            copy.fin_kings = (self.fin_kings[0][:], self.fin_kings[1][:])
-            copy.fin_rooks = (self.fin_rooks[0][:], self.fin_rooks[1][:])
-        elif self.variant in DROP_VARIANTS:
-            copy.promoted = self.promoted[:]
-            copy.holding = (self.holding[0].copy(), self.holding[1].copy())
+        # Castling cords are never changed after applyFen
+        copy.ini_kings = self.ini_kings
+        copy.ini_rooks = self.ini_rooks
+        copy.fin_kings = self.fin_kings
+        copy.fin_rooks = self.fin_rooks
+        
+        if self.variant in DROP_VARIANTS:
+            copy.promoted = self.promoted
+            copy.holding = self.holding
             copy.capture_promoting = self.capture_promoting
-            copy.hist_capture_promoting = self.hist_capture_promoting[:]
-        elif self.variant == ATOMICCHESS:
-            copy.hist_exploding_around = [a[:] for a in self.hist_exploding_around]
         elif self.variant == CAMBODIANCHESS:
-            copy.ini_kings = self.ini_kings
             copy.ini_queens = self.ini_queens
-            copy.is_first_move = {KING: self.is_first_move[KING][:], \
-                                  QUEEN: self.is_first_move[QUEEN][:]}
-            copy.hist_is_first_move = self.hist_is_first_move[:]
+            copy.is_first_move = self.is_first_move
         
         copy.fen_was_applied = self.fen_was_applied
+        self._shared = copy._shared = True
         return copy
+    
+    def unshare (self):
+        """ Gives the board its own copy of the piece arrays it shares with
+            its clones. Has to be called before changing the arrays directly,
+            applyMove() and popMove() do it themselves. """
+        self.friends = self.friends[:]
+        self.kings = self.kings[:]
+        self.boards = [self.boards[WHITE][:], self.boards[BLACK][:]]
+        self.arBoard = self.arBoard[:]
+        self.pieceCount = [self.pieceCount[WHITE][:], self.pieceCount[BLACK][:]]
+        self.hasCastled = self.hasCastled[:]
+        
+        if self.variant in DROP_VARIANTS:
+            self.promoted = self.promoted[:]
+            self.holding = (self.holding[0].copy(), self.holding[1].copy())
+        elif self.variant == CAMBODIANCHESS:
+            self.is_first_move = {KING: self.is_first_move[KING][:],
+                                  QUEEN: self.is_first_move[QUEEN][:]}
+        
+        self._shared = False
@@ -1,23 +1,44 @@
-from ctypes import create_string_buffer, memset
-from struct import Struct, pack_into, unpack_from
+import os
+import tempfile
+from ctypes import c_char, create_string_buffer
+from mmap import mmap
+from multiprocessing.sharedctypes import RawArray
+from struct import Struct
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:
+    # Python < 3.8, named tables are kept in a file in the temp directory
+    SharedMemory = None
 
 from pychess.Utils.const import hashfALPHA, hashfBETA, hashfEXACT, hashfBAD
 from pychess.Utils.lutils.ldata import MATE_VALUE, MAXPLY
 
-# Store hash entries in buckets of 4. An entry consists of:
-# key         32 bits derived from the board hash
-# search_id   counter used to determine entry's age
-# hashf       bound type (one of the hashf* constants)
-# depth       search depth
-# score       search score
-# move        best move (or cutoff move)
-entryType = Struct('=I B B H h H')
+# Store hash entries in buckets of 4. An entry consists of three 32 bit words:
+# check       32 bits derived from the board hash, xor'ed with the other two
+# info        search_id | hashf << 8 | depth << 16
+#                 search_id is a counter used to determine entry's age
+#                 hashf is the bound type (one of the hashf* constants)
+# result      score & 0xffff | move << 16
+#                 move is the best move (or cutoff move)
+# Tables can be shared between processes, which write entries without any
+# locking. Xor'ing the key with the data makes entries torn by two processes
+# writing at the same time fail the key check, so they are never used.
+entryType = Struct('=I I I')
+
+# Entries sampled by hashfull()
+HASHFULL_SAMPLE = 1000
 
 class TranspositionTable:
-    def __init__ (self, maxSize):
+    def __init__ (self, maxSize, data=None):
+        """ The entries are kept in data, if given, which lets several
+            processes use the same table. It has to be a writable buffer of
+            at least maxSize bytes. """
         assert maxSize > 0
-        self.buckets = maxSize // (4 * entryType.size)
-        self.data = create_string_buffer(self.buckets * 4 * entryType.size)
+        if data is None:
+            data = self._allocate(maxSize // (4 * entryType.size) * 4 * entryType.size)
+        self.data = data
+        self.buckets = len(data) // (4 * entryType.size)
         self.search_id = 0
         
         self.killer1 = [-1]*80
@@ -26,8 +47,20 @@ class TranspositionTable:
         
         self.butterfly = [0]*(64*64)
     
+    def _allocate (self, size):
+        return create_string_buffer(size)
+    
+    def resize (self, maxSize):
+        """ Gives the table a new size. The stored entries are lost. """
+        assert maxSize > 0
+        self.data = None
+        self.data = self._allocate(maxSize // (4 * entryType.size) * 4 * entryType.size)
+        self.buckets = len(self.data) // (4 * entryType.size)
+        self.clear()
+    
     def clear (self):
-        memset(self.data, 0, self.buckets * 4 * entryType.size)
+        size = self.buckets * 4 * entryType.size
+        self.data[:size] = b"\0" * size
         self.killer1 = [-1]*80
         self.killer2 = [-1]*80
         self.hashmove = [-1]*80
@@ -37,12 +70,25 @@ class TranspositionTable:
         self.search_id = (self.search_id + 1) & 0xff
         #TODO: consider clearing butterfly table
     
+    def hashfull (self):
+        """ Returns how many of a thousand entries are in use """
+        entries = min(HASHFULL_SAMPLE, self.buckets * 4)
+        used = 0
+        for i in range(entries):
+            if entryType.unpack_from(self.data, i * entryType.size) != (0, 0, 0):
+                used += 1
+        return used * 1000 // entries
+    
     def probe (self, board, depth, alpha, beta):
         baseIndex = (board.hash % self.buckets) * 4
         key = (board.hash // self.buckets) & 0xffffffff
         for i in range(baseIndex, baseIndex + 4):
-            tkey, search_id, hashf, tdepth, score, move = entryType.unpack_from(self.data, i * entryType.size)
-            if tkey == key:
+            check, info, result = entryType.unpack_from(self.data, i * entryType.size)
+            if check ^ info ^ result == key:
+                hashf = (info >> 8) & 0xff
+                tdepth = info >> 16
+                score = (result & 0x7fff) - (result & 0x8000)
+                move = result >> 16
                 # Mate score bounds are guaranteed to be accurate at any depth.
                 if tdepth < depth and abs(score) < MATE_VALUE-MAXPLY:
                     return move, score, hashfBAD
@@ -60,19 +106,21 @@ class TranspositionTable:
         staleIndex = baseIndex
         staleRelevance = 0xffff
         for i in range(baseIndex, baseIndex + 4):
-            tkey, search_id, thashf, tdepth, tscore, tmove = entryType.unpack_from(self.data, i * entryType.size)
-            if tkey == 0 or tkey == key:
+            check, info, result = entryType.unpack_from(self.data, i * entryType.size)
+            if check ^ info ^ result == key or not (check or info or result):
                 staleIndex = i
                 break
-            relevance = (0x8000 if search_id != self.search_id and thashf == hashfEXACT else 0) + \
+            search_id = info & 0xff
+            relevance = (0x8000 if search_id != self.search_id and (info >> 8) & 0xff == hashfEXACT else 0) + \
                         (0x4000 if ((self.search_id - search_id) & 0xff) > 1 else 0) + \
-                        tdepth
+                        (info >> 16)
             if relevance < staleRelevance:
                 staleIndex = i
                 staleRelevance = relevance
-        entryType.pack_into(self.data, staleIndex * entryType.size, key, self.search_id, hashf, depth, score, move)
+        info = self.search_id | hashf << 8 | depth << 16
+        result = score & 0xffff | move << 16
+        entryType.pack_into(self.data, staleIndex * entryType.size, key ^ info ^ result, info, result)
 
-    
     def addKiller (self, ply, move):
         if self.killer1[ply] == -1:
             self.killer1[ply] = move
@@ -102,3 +150,68 @@ class TranspositionTable:
     
     def getButterfly (self, move):
         return self.butterfly[move & 0xfff]
+
+
+class SharedTranspositionTable (TranspositionTable):
+    """ A table other processes can use as well. Without a name it lives in
+        memory inherited by the child processes started afterwards. With a
+        name it lives in the shared memory segment of that name, which is
+        created unless another process already did, in which case it keeps
+        the size that process gave it. """
+    
+    def __init__ (self, maxSize, name=None):
+        self.name = name
+        self.segment = None
+        self.owner = False
+        TranspositionTable.__init__(self, maxSize)
+    
+    def _allocate (self, size):
+        self.close()
+        if self.name is None:
+            return RawArray(c_char, size)
+        
+        if SharedMemory is not None:
+            try:
+                self.segment = SharedMemory(self.name, create=True, size=size)
+                self.owner = True
+            except FileExistsError:
+                self.segment = _attach(self.name)
+            return self.segment.buf
+        
+        path = os.path.join(tempfile.gettempdir(), self.name)
+        self.owner = not os.path.exists(path)
+        with open(path, "a+b") as f:
+            if self.owner:
+                f.truncate(size)
+            self.segment = mmap(f.fileno(), 0)
+        return self.segment
+    
+    def close (self):
+        """ Unmaps a named table. Its creator removes the segment as well,
+            processes still using it keep their mapping. """
+        if self.segment is None:
+            return
+        self.data = None
+        self.segment.close()
+        if self.owner:
+            if SharedMemory is not None:
+                self.segment.unlink()
+            else:
+                os.remove(os.path.join(tempfile.gettempdir(), self.name))
+        self.segment = None
+        self.owner = False
+
+def _attach (name):
+    # Up to Python 3.12, every process attaching to a segment removes it on
+    # exit. Only its creator should.
+    try:
+        return SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name)
+    finally:
+        resource_tracker.register = register
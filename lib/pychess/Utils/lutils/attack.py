@@ -19,7 +19,6 @@ def isAttacked (board, cord, color, ischecked=False):
     if pboards[KNIGHT] & _moveArray[KNIGHT][cord]:
         return True
     
-    rayto = fromToRay[cord]
     blocker = board.blocker
     
     # Bishops & Queens
@@ -30,33 +29,17 @@ def isAttacked (board, cord, color, ischecked=False):
         if pboards[QUEEN] & _moveArray[ASEAN_QUEEN][cord]:
             return True
     else:
-        bitboard = (pboards[BISHOP] | pboards[QUEEN]) & _moveArray[BISHOP][cord]
-        if bitboard:
-            others = ~bitboard & blocker
-            # inlined iterBits()
-            while bitboard:
-                bit = bitboard & -bitboard
-                ray = rayto[lsb[bit]]
-                # If there is a path and no other piece stand in our way
-                if ray and not ray & others:
-                    return True
-                bitboard -= bit
+        if (pboards[BISHOP] | pboards[QUEEN]) & \
+                bishopAttacks[cord][blocker & bishopMask[cord]]:
+            return True
 
     # Rooks & Queens
     if board.variant in ASEAN_VARIANTS:
-        bitboard = pboards[ROOK] & _moveArray[ROOK][cord]
+        bitboard = pboards[ROOK]
     else:
-        bitboard = (pboards[ROOK] | pboards[QUEEN]) & _moveArray[ROOK][cord]
-    if bitboard:
-        others = ~bitboard & blocker
-        # inlined iterBits()
-        while bitboard:
-            bit = bitboard & -bitboard
-            ray = rayto[lsb[bit]]
-            # If there is a path and no other piece stand in our way
-            if ray and not ray & others:
-                return True
-            bitboard -= bit
+        bitboard = pboards[ROOK] | pboards[QUEEN]
+    if bitboard & rookAttacks[cord][blocker & rookMask[cord]]:
+        return True
             
     # Pawns
     # Would a pawn of the opposite color, standing at out kings cord, be able
@@ -89,7 +72,6 @@ def getAttacks (board, cord, color):
     # Pawns
     bits |= pieces[PAWN] & _moveArray[color == WHITE and BPAWN or PAWN][cord]
     
-    rayto = fromToRay[cord]
     blocker = board.blocker
     
     # Bishops and Queens
@@ -99,29 +81,15 @@ def getAttacks (board, cord, color):
 
         bits |= pieces[QUEEN] & _moveArray[ASEAN_QUEEN][cord]
     else:
-        bitboard = (pieces[BISHOP] | pieces[QUEEN]) & _moveArray[BISHOP][cord]
-        # inlined iterBits()
-        while bitboard:
-            bit = bitboard & -bitboard
-            c = lsb[bit]
-            ray = rayto[c]
-            if ray and not clearBit(ray & blocker, c):
-                bits |= bitPosArray[c]
-            bitboard -= bit
+        bits |= (pieces[BISHOP] | pieces[QUEEN]) & \
+                bishopAttacks[cord][blocker & bishopMask[cord]]
     
     # Rooks and queens
     if board.variant in ASEAN_VARIANTS:
-        bitboard = pieces[ROOK] & _moveArray[ROOK][cord]
+        bitboard = pieces[ROOK]
     else:
-        bitboard = (pieces[ROOK] | pieces[QUEEN]) & _moveArray[ROOK][cord]
-    # inlined iterBits()
-    while bitboard:
-        bit = bitboard & -bitboard
-        c = lsb[bit]
-        ray = rayto[c]
-        if ray and not clearBit(ray & blocker, c):
-            bits |= bitPosArray[c]
-        bitboard -= bit
+        bitboard = pieces[ROOK] | pieces[QUEEN]
+    bits |= bitboard & rookAttacks[cord][blocker & rookMask[cord]]
     
     return bits
 
@@ -306,6 +274,7 @@ def defends (board, fcord, tcord):
     
     # Work on a board copy, as we are going to change some stuff
     board = board.clone()
+    board.unshare()
     
     if board.friends[WHITE] & bitPosArray[fcord]:
         color = WHITE
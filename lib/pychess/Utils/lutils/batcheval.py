@@ -0,0 +1,238 @@
+from __future__ import absolute_import
+
+################################################################################
+# Evaluation of many positions at once, using NumPy. The functions compute    #
+# the same scores as their leval counterparts, for all the packed positions   #
+# in one go. Only variants scored with the normal piece values are supported. #
+################################################################################
+
+import numpy as np
+
+from pychess.Utils.const import *
+from .ldata import *
+from .leval import tropisms
+
+# Variants having their own material values or evaluation
+UNSUPPORTED_VARIANTS = (CRAZYHOUSECHESS, LOSERSCHESS, SUICIDECHESS,
+                        ATOMICCHESS) + tuple(ASEAN_VARIANTS) + tuple(DROP_VARIANTS)
+
+u64 = np.uint64
+BITPOS = np.array(bitPosArray, dtype=u64)
+
+class PackedBoards (object):
+    """ The state of a list of LBoards the evaluation terms need, as arrays
+        with one row per position """
+
+    def __init__ (self, boards):
+        for board in boards:
+            if board.variant in UNSUPPORTED_VARIANTS:
+                raise ValueError("Batch evaluation doesn't support variant %s" % board.variant)
+        self.boards = np.array([board.boards for board in boards], dtype=u64).reshape(-1, 2, 7)
+        self.pieceCount = np.array([board.pieceCount for board in boards], dtype=np.int64).reshape(-1, 2, 7)
+        self.kings = np.array([board.kings for board in boards], dtype=np.int64).reshape(-1, 2)
+        self.color = np.array([board.color for board in boards], dtype=np.int64)
+
+    def __len__ (self):
+        return len(self.color)
+
+def packBoards (boards):
+    return PackedBoards(boards)
+
+def _bits (bitboards):
+    """ Unpacks bitboards of shape (...) into 0/1 arrays of shape (..., 64),
+        indexed by cord """
+    bitboards = np.ascontiguousarray(bitboards, dtype=">u8")
+    return np.unpackbits(bitboards.view(np.uint8).reshape(bitboards.shape + (8,)), axis=-1)
+
+def _fromBits (bits):
+    """ The inverse of _bits, for boolean arrays """
+    return np.bitwise_or.reduce(np.where(bits, BITPOS, u64(0)), axis=-1)
+
+if hasattr(np, "bitwise_count"):
+    def _popcount (bitboards):
+        return np.bitwise_count(bitboards).astype(np.int64)
+else:
+    def _popcount (x):
+        x = x - ((x >> u64(1)) & u64(0x5555555555555555))
+        x = (x & u64(0x3333333333333333)) + ((x >> u64(2)) & u64(0x3333333333333333))
+        x = (x + (x >> u64(4))) & u64(0x0f0f0f0f0f0f0f0f)
+        return ((x * u64(0x0101010101010101)) >> u64(56)).astype(np.int64)
+
+################################################################################
+# evalMaterial                                                                 #
+################################################################################
+
+MATERIAL_VALUES = np.array([PIECE_VALUES[piece] if PAWN <= piece < KING else 0
+                            for piece in range(7)], dtype=np.int64)
+
+def evalMaterial (packed, colors):
+    """ Returns the scores and phases of leval.evalMaterial """
+    rows = np.arange(len(packed))
+    material = (packed.pieceCount * MATERIAL_VALUES).sum(axis=2)
+    phase = np.maximum(1, 8 - material.sum(axis=1) // 1150)
+
+    leading = np.where(material[:,WHITE] > material[:,BLACK], WHITE, BLACK)
+    pawns = packed.pieceCount[rows, leading, PAWN]
+    matDiff = material[rows, leading] - material[rows, 1-leading]
+    matTotal = material.sum(axis=1)
+    val = np.minimum(2400, matDiff) + \
+          (matDiff * (12000-matTotal) * pawns) // (6400 * (pawns+1))
+    val = np.where(leading == colors, val, -val)
+    val[material[:,WHITE] == material[:,BLACK]] = 0
+    return val, phase
+
+################################################################################
+# evalKingTropism                                                              #
+################################################################################
+
+# TROPISMS[piece-KNIGHT][kcord][pcord]
+TROPISMS = np.array([np.array(tropisms[piece]).T for piece in range(KNIGHT, KING)],
+                    dtype=np.int64)
+
+def evalKingTropism (packed, colors):
+    """ Returns the scores of leval.evalKingTropism """
+    rows = np.arange(len(packed))
+    pieces = packed.boards[rows, colors, KNIGHT:KING]
+    opking = packed.kings[rows, 1-colors]
+    # (positions, piece, cord) times (positions, piece, cord)
+    return (_bits(pieces) * TROPISMS[:, opking].transpose(1, 0, 2)).sum(axis=(1, 2))
+
+################################################################################
+# cacheablePawnInfo                                                            #
+################################################################################
+
+def _pawnTables (color):
+    """ The per cord data cacheablePawnInfo uses for pawns of color """
+    opcolor = 1-color
+    step = 8 if color == WHITE else -8
+    ptype = PAWN if color == WHITE else BPAWN
+    opptype = BPAWN if color == WHITE else PAWN
+
+    def table (values, dtype=u64):
+        return np.array(values, dtype=dtype)
+
+    def valid (cord):
+        return 0 <= cord < 64
+
+    t = {}
+    t["square"] = table([pawnScoreBoard[color][cord] * 2 for cord in range(64)], np.int64)
+    t["passedMask"] = table(passedPawnMask[color])
+    if color == WHITE:
+        t["ray"] = table([fromToRay[cord][cord|56] for cord in range(64)])
+    else:
+        t["ray"] = table([fromToRay[cord][cord&7] for cord in range(64)])
+    t["passedScore"] = table([passedScores[color][cord>>3] for cord in range(64)], np.int64)
+    t["base"] = table(moveArray[ptype])
+    t["rank7"] = table([bool(bitPosArray[cord] & brank7[opcolor]) for cord in range(64)], bool)
+
+    # The squares in front of the pawn looked at by the backward pawn test.
+    # Only the first one is used unless the pawn is on its start rank.
+    for n in range(1, 4):
+        square = [cord + n*step for cord in range(64)]
+        t["front%d" % n] = table([bitPosArray[i] if valid(i) else 0 for i in square])
+        t["frontMask%d" % n] = table([
+            passedPawnMask[opcolor][i] & (~fileBits[cord&7] if n == 1 else ~fileBits[1])
+            & 0xffffffffffffffff if valid(i) else 0 for cord, i in enumerate(square)])
+        t["frontOwn%d" % n] = table([moveArray[opptype][i] if valid(i) else 0 for i in square])
+        t["frontOp%d" % n] = table([moveArray[ptype][i] if valid(i) else 0 for i in square])
+    return t
+
+PAWN_TABLES = (_pawnTables(WHITE), _pawnTables(BLACK))
+FILE_BITS = np.array(fileBits, dtype=u64)
+ISOLANI_MASK = np.array(isolaniMask, dtype=u64)
+ISOLANI_NORMAL = np.array(isolani_normal, dtype=np.int64)
+ISOLANI_WEAKER = np.array(isolani_weaker, dtype=np.int64)
+
+def _isBackward (t, n, pawns, oppawns, allpawns):
+    """ The n'th step of the backward pawn test, for every cord """
+    pawns = pawns[:, None]
+    front = t["frontMask%d" % n] & pawns == 0
+    if n == 1:
+        front &= t["front1"] & allpawns[:, None] == 0
+    n1 = _popcount(pawns & t["frontOwn%d" % n])
+    n2 = _popcount(oppawns[:, None] & t["frontOp%d" % n])
+    return front & (n1 < n2)
+
+def cacheablePawnInfo (packed, phases):
+    """ Returns the scores, passed pawns and weak pawns of
+        leval.cacheablePawnInfo, bypassing the pawn hash table """
+    score = np.zeros(len(packed), dtype=np.int64)
+    passed = np.zeros(len(packed), dtype=u64)
+    weaked = np.zeros(len(packed), dtype=u64)
+    allpawns = packed.boards[:, WHITE, PAWN] | packed.boards[:, BLACK, PAWN]
+
+    for color in WHITE, BLACK:
+        t = PAWN_TABLES[color]
+        pawns = packed.boards[:, color, PAWN]
+        oppawns = packed.boards[:, 1-color, PAWN]
+        isPawn = _bits(pawns).astype(bool)
+        s = np.zeros(len(packed), dtype=np.int64)
+
+        s += np.where(isPawn, t["square"], 0).sum(axis=1)
+
+        # Passed pawns
+        isPassed = isPawn & (oppawns[:, None] & t["passedMask"] == 0) & \
+                            (pawns[:, None] & t["ray"] == 0)
+        passed |= _fromBits(isPassed)
+        s += np.where(isPassed, (t["passedScore"] * phases[:, None]) // 12, 0).sum(axis=1)
+
+        # Backward pawns
+        backward = _isBackward(t, 1, pawns, oppawns, allpawns)
+        for n in (2, 3):
+            backward |= t["rank7"] & _isBackward(t, n, pawns, oppawns, allpawns)
+        backward &= isPawn
+        weaked |= _fromBits(backward)
+        s -= backward.sum(axis=1) * (8+phases)
+
+        # Pawn base under attack
+        base = isPawn & (t["base"] & oppawns[:, None] != 0) & \
+                        (t["base"] & pawns[:, None] != 0)
+        s -= base.sum(axis=1) * 18
+
+        # Doubled and isolated pawns
+        nfile = isPawn.reshape(-1, 8, 8).sum(axis=1)
+        s -= (nfile > 1).sum(axis=1) * (8+phases)
+        isolated = (nfile > 0) & (pawns[:, None] & ISOLANI_MASK == 0)
+        halfOpen = oppawns[:, None] & FILE_BITS == 0
+        s += np.where(isolated, np.where(halfOpen, ISOLANI_WEAKER, ISOLANI_NORMAL) * nfile, 0).sum(axis=1)
+        weaked |= np.bitwise_or.reduce(np.where(isolated, pawns[:, None] & FILE_BITS, u64(0)), axis=1)
+
+        # Penalize having eight pawns
+        s -= (packed.pieceCount[:, color, PAWN] == 8) * 10
+
+        # Detect stonewall formation in our pawns
+        s += (pawns & u64(stonewall[color]) == u64(stonewall[color])) * 10
+
+        # Penalize Locked pawns
+        s -= _popcount((pawns >> u64(8)) & oppawns & u64(lbox)) * 10
+
+        score += s if color == WHITE else -s
+
+    return score, passed, weaked
+
+################################################################################
+# evaluateTerms                                                                #
+################################################################################
+
+def evaluateTerms (boards, colors=None):
+    """ Evaluates a list of LBoards, from the point of view of colors, or the
+        side to move of each board if not given. Returns a dict of arrays
+        holding the terms as leval.evaluateComplete adds them up:
+        material, phase, kingTropism (ours minus theirs) and pawnStructure
+        (cacheablePawnInfo's score). The pawn square table is part of the
+        pawn structure term, like in leval. """
+    packed = packBoards(boards)
+    if colors is None:
+        colors = packed.color
+    else:
+        colors = np.asarray(colors, dtype=np.int64)
+
+    material, phase = evalMaterial(packed, colors)
+    kingTropism = evalKingTropism(packed, colors) - evalKingTropism(packed, 1-colors)
+    pawnScore, passed, weaked = cacheablePawnInfo(packed, phase)
+    return {
+        "material": material,
+        "phase": phase,
+        "kingTropism": kingTropism,
+        "pawnStructure": np.where(colors == WHITE, pawnScore, -pawnScore),
+        }
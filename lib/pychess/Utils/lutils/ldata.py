@@ -604,3 +604,102 @@ for r in reversed(range(A1,H1)):
     for cord in iterBits(ray135[r]):
         attack135[cord] = dict((map << 8 & MAXBITBOARD, ray << 8 & MAXBITBOARD)
                                for map,ray in attack135[cord+8].items())
+
+################################################################################
+#  Slider attack tables keyed by the relevant blocker bits.                    #
+#  rookAttacks[cord][blocker & rookMask[cord]] returns the attack bitboard of  #
+#  a rook on cord in a single lookup (bishops likewise). It works the same     #
+#  way as magic bitboards, but lets the dictionary do the perfect hashing      #
+#  instead of a magic multiplication, which is slower in Python.               #
+#  The masks skip the board edges and the own cord, as a piece on those cords  #
+#  can never block the ray any further.                                        #
+################################################################################
+
+# Set to False to make the move generator use the rotated bitboard tables above
+SLIDER_TABLES = True
+
+def _sliderMask (cord, rayIndexes):
+    mask = 0
+    for ray in rayIndexes:
+        bits = rays[cord][ray]
+        # The last cord of each ray is on the edge of the board
+        if bits:
+            if ray in (0, 1, 4, 5):
+                bits = clearBit(bits, firstBit(bits))
+            else:
+                bits = clearBit(bits, lastBit(bits))
+        mask |= bits
+    return mask
+
+class _RotatedAttacks:
+    """ Gives the rotated bitboard tables the same interface as the occupancy
+        keyed tables, so they can be used as a fallback. """
+    
+    def __init__ (self, cord, attackA, rayA, attackB, rayB):
+        self.own = bitPosArray[cord]
+        self.attackA = attackA
+        self.rayA = rayA
+        self.attackB = attackB
+        self.rayB = rayB
+    
+    def __getitem__ (self, blocker):
+        blocker |= self.own
+        return self.attackA[self.rayA & blocker] | \
+               self.attackB[self.rayB & blocker]
+
+_sliderTables = {}
+
+def _buildSliderTables (cord, mask, attackA, rayA, attackB, rayB):
+    table = {}
+    own = bitPosArray[cord]
+    attackA = attackA[cord]
+    rayA = rayA[cord]
+    attackB = attackB[cord]
+    rayB = rayB[cord]
+    # Enumerate all subsets of the mask (Carry-Rippler trick)
+    sub = 0
+    while True:
+        blocker = sub | own
+        table[sub] = attackA[rayA & blocker] | attackB[rayB & blocker]
+        sub = (sub - mask) & mask
+        if not sub:
+            break
+    return table
+
+def setSliderTables (enabled):
+    """ Switches between the occupancy keyed slider tables and the rotated
+        bitboard tables. The lists are updated in place, so modules having
+        imported them will see the change. """
+    
+    if enabled:
+        if not _sliderTables:
+            masks = [_sliderMask(cord, (4, 5, 6, 7)) for cord in range(64)]
+            _sliderTables["rookMask"] = masks
+            _sliderTables["rookAttacks"] = [
+                _buildSliderTables(cord, masks[cord], attack00, ray00,
+                                   attack90, ray90) for cord in range(64)]
+            masks = [_sliderMask(cord, (0, 1, 2, 3)) for cord in range(64)]
+            _sliderTables["bishopMask"] = masks
+            _sliderTables["bishopAttacks"] = [
+                _buildSliderTables(cord, masks[cord], attack45, ray45,
+                                   attack135, ray135) for cord in range(64)]
+        rookMask[:] = _sliderTables["rookMask"]
+        rookAttacks[:] = _sliderTables["rookAttacks"]
+        bishopMask[:] = _sliderTables["bishopMask"]
+        bishopAttacks[:] = _sliderTables["bishopAttacks"]
+    else:
+        rookMask[:] = [MAXBITBOARD]*64
+        rookAttacks[:] = [_RotatedAttacks(cord, attack00[cord], ray00[cord],
+                                          attack90[cord], ray90[cord])
+                          for cord in range(64)]
+        bishopMask[:] = [MAXBITBOARD]*64
+        bishopAttacks[:] = [_RotatedAttacks(cord, attack45[cord], ray45[cord],
+                                            attack135[cord], ray135[cord])
+                            for cord in range(64)]
+
+rookMask = [0]*64
+rookAttacks = [None]*64
+bishopMask = [0]*64
+bishopAttacks = [None]*64
+
+setSliderTables(SLIDER_TABLES)
@@ -168,30 +168,83 @@ def evalKingTropism (board, color, phase):
 # evalPawnStructure                                                            #
 ################################################################################
 
-# For pawn hash, don't use buckets. Store:
-# key         high 16 bits of pawn hash key
+# The pawn hash is kept in buckets of 4 entries. An entry consists of:
+# key         high 32 bits of pawn hash key, xor'ed with the phase key
 # score       score from white's point of view
+# age         pawnAge when the entry was recorded
+# weight      number of pawns + 1, or 0 for empty entries
 # passed      bitboard of passed pawns
 # weaked      bitboard of weak pawns
-pawnEntryType = Struct('=H h Q Q')
-PAWN_HASH_SIZE  = 16384
+pawnEntryType = Struct('=I h B B Q Q')
+pawnBucketType = Struct('=' + 'I h B B Q Q' * 4)
+PAWN_HASH_SIZE  = 16384 # Default number of entries
+PAWN_HASH_SHARE = 32    # The engine memory limit gives 1/32 to the pawn hash
 PAWN_PHASE_KEY  = (0x343d, 0x055d, 0x3d3c, 0x1a1c, 0x28aa, 0x19ee, 0x1538, 0x2a99)
-pawntable = create_string_buffer(PAWN_HASH_SIZE * pawnEntryType.size)
+pawnBuckets = PAWN_HASH_SIZE // 4
+pawntable = create_string_buffer(pawnBuckets * pawnBucketType.size)
+pawnAge = 0
+
+# Indexes into pawnStats
+PAWN_HITS, PAWN_MISSES, PAWN_COLLISIONS = range(3)
+pawnStats = [0, 0, 0]
+
+def setPawnHashSize (maxSize):
+    """ Resizes the pawn hash table to maxSize bytes, dropping its entries """
+    global pawnBuckets, pawntable
+    pawnBuckets = max(1, maxSize // pawnBucketType.size)
+    pawntable = create_string_buffer(pawnBuckets * pawnBucketType.size)
     
 def clearPawnTable():
-        memset(pawntable, 0, PAWN_HASH_SIZE * pawnEntryType.size)
+    memset(pawntable, 0, pawnBuckets * pawnBucketType.size)
+    pawnStats[:] = [0, 0, 0]
+
+def newPawnSearch():
+    """ Makes the entries recorded so far older than the coming ones """
+    global pawnAge
+    pawnAge = (pawnAge + 1) & 0xff
+
+def pawnTableStats():
+    """ Returns the hits, misses and collisions of the pawn hash since it was
+        last cleared. A collision is a live entry of another pawn structure
+        being replaced. """
+    return {"entries": pawnBuckets * 4,
+            "hits": pawnStats[PAWN_HITS],
+            "misses": pawnStats[PAWN_MISSES],
+            "collisions": pawnStats[PAWN_COLLISIONS]}
 
 def probePawns (board, phase):
-    index = (board.pawnhash % PAWN_HASH_SIZE) ^ PAWN_PHASE_KEY[phase-1]
-    key, score, passed, weaked = pawnEntryType.unpack_from(pawntable, index * pawnEntryType.size)
-    if key == (board.pawnhash >> 14) & 0xffff:
-        return score, passed, weaked
+    key = (board.pawnhash >> 32) ^ PAWN_PHASE_KEY[phase-1]
+    bucket = pawnBucketType.unpack_from(pawntable, (board.pawnhash % pawnBuckets) * pawnBucketType.size)
+    for i in (0, 6, 12, 18):
+        if bucket[i] == key and bucket[i+3]:
+            pawnStats[PAWN_HITS] += 1
+            return bucket[i+1], bucket[i+4], bucket[i+5]
+    pawnStats[PAWN_MISSES] += 1
     return None
 
 def recordPawns (board, phase, score, passed, weaked):
-    index = (board.pawnhash % PAWN_HASH_SIZE) ^ PAWN_PHASE_KEY[phase-1]
-    key = (board.pawnhash >> 14) & 0xffff
-    pawnEntryType.pack_into(pawntable, index * pawnEntryType.size, key, score, passed, weaked)
+    key = (board.pawnhash >> 32) ^ PAWN_PHASE_KEY[phase-1]
+    offset = (board.pawnhash % pawnBuckets) * pawnBucketType.size
+    bucket = pawnBucketType.unpack_from(pawntable, offset)
+    weight = board.pieceCount[WHITE][PAWN] + board.pieceCount[BLACK][PAWN] + 1
+    # Pawn entries have no search depth, so the number of pawns, which is
+    # what the entry saves us evaluating, takes its place. Overwrite an
+    # empty slot, this structure's last entry, or else the entry that is
+    # older and has the fewest pawns.
+    staleIndex = 0
+    staleRelevance = 0xffff
+    for i in (0, 6, 12, 18):
+        if not bucket[i+3] or bucket[i] == key:
+            staleIndex = i
+            break
+        relevance = (0x100 if bucket[i+2] == pawnAge else 0) + bucket[i+3]
+        if relevance < staleRelevance:
+            staleIndex = i
+            staleRelevance = relevance
+    else:
+        pawnStats[PAWN_COLLISIONS] += 1
+    pawnEntryType.pack_into(pawntable, offset + staleIndex // 6 * pawnEntryType.size,
+                            key, score, pawnAge, weight, passed, weaked)
 
 def cacheablePawnInfo (board, phase):
     entry = probePawns (board, phase)
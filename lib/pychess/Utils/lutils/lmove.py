@@ -3,7 +3,8 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 from .ldata import *
-from .bitboard import firstBit
+from .bitboard import firstBit, iterBits
+from .attack import pinnedOnKing
 from .validator import validateMove
 
 from pychess.compat import unichr, unicode
@@ -391,6 +392,57 @@ def parseSAN (board, san):
     errstring = "no %s is able to move to %s" % (reprPiece[piece], reprCord[tcord])
     raise ParsingError(san, errstring, board.asFen())
 
+################################################################################
+# parseTrustedSAN                                                              #
+################################################################################
+
+# Variants where pieces don't move, or moves aren't checked, like in normal chess
+UNTRUSTED_SAN_VARIANTS = (SUICIDECHESS, ATOMICCHESS) + tuple(ASEAN_VARIANTS)
+
+def parseTrustedSAN (board, san):
+    """ Parse the SAN of a move from a trusted source, like an engine
+        generated pgn. The pieces able to make a piece move are looked up
+        in the attack tables of its end cord, and only if more than one of
+        them is left after the disambiguation, the pins are checked. Any
+        other notation is left to parseSAN. """
+    
+    c = san[0]
+    if c in "NBRQ" and board.variant not in UNTRUSTED_SAN_VARIANTS:
+        notat = san.rstrip("+#")
+        tcord = cordDic.get(notat[-2:])
+        if tcord is not None:
+            color = board.color
+            piece = chrU2Sign[c]
+            if piece == KNIGHT:
+                fcords = moveArray[KNIGHT][tcord]
+            else:
+                blocker = board.blocker
+                fcords = 0
+                if piece != ROOK:
+                    fcords |= bishopAttacks[tcord][blocker & bishopMask[tcord]]
+                if piece != BISHOP:
+                    fcords |= rookAttacks[tcord][blocker & rookMask[tcord]]
+            fcords &= board.boards[color][piece]
+            
+            for char in notat[1:-2]:
+                if char in "abcdefgh":
+                    fcords &= fileBits[ord(char) - ord("a")]
+                elif char in "12345678":
+                    fcords &= rankBits[int(char) - 1]
+                elif char != "x":
+                    fcords = 0
+            
+            if fcords and not fcords & (fcords - 1):
+                return newMove(firstBit(fcords), tcord)
+            
+            kcord = board.kings[color]
+            for fcord in iterBits(fcords):
+                if not pinnedOnKing(board, fcord, color) or \
+                        directions[kcord][fcord] == directions[kcord][tcord]:
+                    return newMove(fcord, tcord)
+    
+    return parseSAN(board, san)
+
 ################################################################################
 # toLan                                                                        #
 ################################################################################
@@ -97,11 +97,7 @@ def genPieceMoves(board, piece, tcord):
         else:
             blocker = board.blocker
             for fcord in iterBits(bishops):
-                try:
-                    attackBoard = attack45 [fcord][ray45 [fcord] & blocker] | \
-                                  attack135[fcord][ray135[fcord] & blocker]
-                except KeyError:
-                    attackBoard = 0
+                attackBoard = bishopAttacks[fcord][blocker & bishopMask[fcord]]
                 if tcord in iterBits(attackBoard & notfriends):
                     moves.add(newMove(fcord, tcord))
             return moves
@@ -110,11 +106,7 @@ def genPieceMoves(board, piece, tcord):
         blocker = board.blocker
         rooks = board.boards[board.color][ROOK]
         for fcord in iterBits(rooks):
-            try:
-                attackBoard = attack00[fcord][ray00[fcord] & blocker] | \
-                              attack90[fcord][ray90[fcord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = rookAttacks[fcord][blocker & rookMask[fcord]]
             if tcord in iterBits(attackBoard & notfriends):
                 moves.add(newMove(fcord, tcord))
         return moves
@@ -139,19 +131,11 @@ def genPieceMoves(board, piece, tcord):
         else:
             blocker = board.blocker
             for fcord in iterBits(queens):
-                try:
-                    attackBoard = attack45 [fcord][ray45 [fcord] & blocker] | \
-                                  attack135[fcord][ray135[fcord] & blocker]
-                except KeyError:
-                    attackBoard = 0
+                attackBoard = bishopAttacks[fcord][blocker & bishopMask[fcord]]
                 if tcord in iterBits(attackBoard & notfriends):
                     moves.add(newMove(fcord, tcord))
                 
-                try:
-                    attackBoard = attack00[fcord][ray00[fcord] & blocker] | \
-                                  attack90[fcord][ray90[fcord] & blocker]
-                except KeyError:
-                    attackBoard = 0
+                attackBoard = rookAttacks[fcord][blocker & rookMask[fcord]]
                 if tcord in iterBits(attackBoard & notfriends):
                     moves.add(newMove(fcord, tcord))
             return moves
@@ -165,6 +149,61 @@ def genPieceMoves(board, piece, tcord):
                     moves.add(newMove(fcord, tcord))
             return moves
 
+def isPseudoLegal (board, move):
+    """ Tells whether genAllMoves would generate move, e.g. a hash move or a
+        killer from another position. Only the variants where the pieces move
+        like in normal chess are supported, i.e. not the drop, asean,
+        losers, suicide and atomic variants. """
+    flag = move >> 12
+    if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+        return move in genCastles(board)
+    
+    fcord = (move >> 6) & 63
+    tcord = move & 63
+    color = board.color
+    friends = board.friends[color]
+    if not friends & bitPosArray[fcord] or friends & bitPosArray[tcord]:
+        return False
+    
+    piece = board.arBoard[fcord]
+    if piece == PAWN:
+        enemies = board.friends[1-color]
+        if color == WHITE:
+            attacks = moveArray[PAWN][fcord]
+            step = 8
+            lastRank = tcord >= 56
+            secondRank = 1
+        else:
+            attacks = moveArray[BPAWN][fcord]
+            step = -8
+            lastRank = tcord < 8
+            secondRank = 6
+        if flag == ENPASSANT:
+            return tcord == board.enpassant and attacks & bitPosArray[tcord] != 0
+        if lastRank != (flag in (KNIGHT_PROMOTION, BISHOP_PROMOTION,
+                                 ROOK_PROMOTION, QUEEN_PROMOTION)):
+            return False
+        if attacks & bitPosArray[tcord]:
+            return enemies & bitPosArray[tcord] != 0
+        if tcord == fcord + step:
+            return not board.blocker & bitPosArray[tcord]
+        if tcord == fcord + 2*step and fcord >> 3 == secondRank:
+            return not board.blocker & (bitPosArray[tcord] | bitPosArray[fcord+step])
+        return False
+    
+    if flag != NORMAL_MOVE:
+        return False
+    if piece == KNIGHT or piece == KING:
+        return moveArray[piece][fcord] & bitPosArray[tcord] != 0
+    blocker = board.blocker
+    if piece == ROOK or piece == QUEEN:
+        if rookAttacks[fcord][blocker & rookMask[fcord]] & bitPosArray[tcord]:
+            return True
+    if piece == BISHOP or piece == QUEEN:
+        if bishopAttacks[fcord][blocker & bishopMask[fcord]] & bitPosArray[tcord]:
+            return True
+    return False
+
 def genAllMoves (board, drops=True):
     from pychess.Variants import variants
 
@@ -216,11 +255,7 @@ def genAllMoves (board, drops=True):
     if board.variant in ASEAN_VARIANTS:
         # Rooks 
         for cord in iterBits(rooks):
-            try:
-                attackBoard = attack00[cord][ray00[cord] & blocker] | \
-                              attack90[cord][ray90[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = rookAttacks[cord][blocker & rookMask[cord]]
             for c in iterBits(attackBoard & notfriends):
                 yield newMove(cord, c)
 
@@ -239,21 +274,13 @@ def genAllMoves (board, drops=True):
     else:
         # Rooks and Queens
         for cord in iterBits(rooks | queens):
-            try:
-                attackBoard = attack00[cord][ray00[cord] & blocker] | \
-                              attack90[cord][ray90[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = rookAttacks[cord][blocker & rookMask[cord]]
             for c in iterBits(attackBoard & notfriends):
                 yield newMove(cord, c)
     
         # Bishops and Queens
         for cord in iterBits(bishops | queens):
-            try:
-                attackBoard = attack45 [cord][ray45 [cord] & blocker] | \
-                              attack135[cord][ray135[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = bishopAttacks[cord][blocker & bishopMask[cord]]
             for c in iterBits(attackBoard & notfriends):
                 yield newMove(cord, c)
     
@@ -439,20 +466,12 @@ def genCaptures (board):
     # Rooks and Queens
     if board.variant in ASEAN_VARIANTS:
         for cord in iterBits(rooks):
-            try:
-                attackBoard = attack00[cord][ray00[cord] & blocker] | \
-                              attack90[cord][ray90[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = rookAttacks[cord][blocker & rookMask[cord]]
             for c in iterBits(attackBoard & enemies):
                 yield newMove(cord, c)
     else:
         for cord in iterBits(rooks|queens):
-            try:
-                attackBoard = attack00[cord][ray00[cord] & blocker] | \
-                              attack90[cord][ray90[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = rookAttacks[cord][blocker & rookMask[cord]]
             for c in iterBits(attackBoard & enemies):
                 yield newMove(cord, c)
     
@@ -468,11 +487,7 @@ def genCaptures (board):
                 yield newMove(cord, c)
     else:
         for cord in iterBits(bishops|queens):
-            try:
-                attackBoard = attack45 [cord][ray45 [cord] & blocker] | \
-                              attack135[cord][ray135[cord] & blocker]
-            except KeyError:
-                attackBoard = 0
+            attackBoard = bishopAttacks[cord][blocker & bishopMask[cord]]
             for c in iterBits(attackBoard & enemies):
                 yield newMove(cord, c)
     
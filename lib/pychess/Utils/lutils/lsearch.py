@@ -1,16 +1,17 @@
 from __future__ import absolute_import
+from collections import namedtuple
 from time import time
 from random import random
-from heapq import heappush, heappop
 
-from .lmovegen import genAllMoves, genCheckEvasions, genCaptures
+from .lmovegen import genAllMoves, genCheckEvasions, genCaptures, newMove
 from .egtb_gaviota import egtb_gaviota
 from pychess.Utils.const import *
-from .leval import evaluateComplete
-from .lsort import getCaptureValue, getMoveValue
+from .leval import evaluateComplete, newPawnSearch
+from .lsort import getMoveValue, pickCaptures, pickMoves
 from .lmove import toSAN
 from .ldata import MATE_VALUE, VALUE_AT_PLY
 from .TranspositionTable import TranspositionTable
+from .LBoard import HIST_MOVE
 from pychess.Variants.atomic import kingExplode
 from pychess.Variants.kingofthehill import testKingInCenter
 from pychess.Variants.threecheck import checkCount
@@ -18,13 +19,92 @@ from . import ldraw
 
 TIMECHECK_FREQ = 500
 
+# Scores beyond this are mates, like VALUE_AT_PLY takes them
+MATE_BOUND = 32512
+
+# Iterations after the first few search a window of this size around the score
+# of the iteration before
+ASPIRATION_WINDOW = 50
+ASPIRATION_DEPTH = 3
+
+# The null move is skipped where zugzwang is common or passing changes the
+# game too much, and where the engine keeps state null moves don't handle
+NO_NULL_MOVE_VARIANTS = (LOSERSCHESS, SUICIDECHESS, ATOMICCHESS) + \
+                        tuple(ASEAN_VARIANTS) + tuple(DROP_VARIANTS)
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEPTH = 3
+
+# Quiet moves after the first LMR_FULL_MOVES are searched one ply less deep,
+# unless they turn out better than alpha. Not in the variants where most
+# moves are forced or tactical.
+NO_LMR_VARIANTS = (LOSERSCHESS, SUICIDECHESS, ATOMICCHESS)
+LMR_FULL_MOVES = 3
+LMR_DEPTH = 3
+
 table = TranspositionTable(32 * 1024 * 1024)
 skipPruneChance = 0
 searching = False
 nodes = 0
+qnodes = 0
+tthits = 0
+cutoffs = 0
+firstCutoffs = 0
 endtime = 0
 timecheck_counter = TIMECHECK_FREQ
 egtb = None
+# Lazy SMP helper processes set this to a function telling whether the main
+# search has finished, see lsmp.py
+stopped = None
+
+def setHashSize (maxSize):
+    """ Resizes the transposition table to maxSize bytes, dropping its entries """
+    table.resize(maxSize)
+
+# The statistics of one iteration. nodes include the qnodes of the quiescent
+# search, and ebf is the effective branching factor: the nodes of the
+# iteration divided by those of the one before.
+SearchStats = namedtuple('SearchStats', 'depth score nodes qnodes tthits cutoffs firstCutoffs ebf')
+
+def iterate (board, depth, last=None):
+    """ Searches board to depth, as one iteration of iterative deepening.
+        last is the SearchStats of the iteration before, if any; its score
+        sets the aspiration window. Returns the moves and score alphaBeta
+        found and the SearchStats of the iteration. """
+    startNodes, startQnodes, startHits, startCutoffs, startFirst = \
+        nodes, qnodes, tthits, cutoffs, firstCutoffs
+    
+    alpha, beta = -MATE_VALUE, MATE_VALUE
+    if last is not None and depth > ASPIRATION_DEPTH and \
+            abs(last.score) < MATE_BOUND:
+        alpha = last.score - ASPIRATION_WINDOW
+        beta = last.score + ASPIRATION_WINDOW
+    while True:
+        mvs, score = alphaBeta(board, depth, alpha, beta)
+        if not searching:
+            break
+        # On a fail the bound is dropped and the iteration searched again
+        if score <= alpha and alpha > -MATE_VALUE:
+            alpha = -MATE_VALUE
+        elif score >= beta and beta < MATE_VALUE:
+            beta = MATE_VALUE
+        else:
+            break
+    
+    iterNodes = nodes - startNodes
+    if last is not None and last.nodes:
+        ebf = iterNodes / float(last.nodes)
+    else:
+        ebf = iterNodes ** (1. / depth)
+    stats = SearchStats(depth, score, iterNodes, qnodes - startQnodes,
+                        tthits - startHits, cutoffs - startCutoffs,
+                        firstCutoffs - startFirst, ebf)
+    return mvs, score, stats
+
+def formatStats (stats):
+    firstRate = 100. * stats.firstCutoffs / stats.cutoffs if stats.cutoffs else 0
+    return "depth %d nodes %d qnodes %d tthits %d cutoffs %d first move cutoffs %.1f%% ebf %.2f" % \
+        (stats.depth, stats.nodes, stats.qnodes, stats.tthits, stats.cutoffs,
+         firstRate, stats.ebf)
 
 def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
     """ This is a alphabeta/negamax/quiescent/iterativedeepend search algorithm
@@ -40,8 +120,8 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
             the deepest)
         *   a score of your standing the the last possition. """
     
-    global searching, nodes, table, endtime, timecheck_counter
-    foundPv = False
+    global searching, nodes, table, endtime, timecheck_counter, tthits, \
+        cutoffs, firstCutoffs
     hashf = hashfALPHA
     amove = []
     
@@ -108,11 +188,13 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
     if board.variant not in DROP_VARIANTS:
         if ply == 0:
             table.newSearch()
+            newPawnSearch()
 
         table.setHashMove (depth, -1)
         probe = table.probe (board, depth, alpha, beta)
         hashmove = None
         if probe:
+            tthits += 1
             move, score, hashf = probe
             score = VALUE_AT_PLY(score, ply)
             hashmove = move
@@ -134,7 +216,7 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
 
     timecheck_counter -= 1
     if timecheck_counter == 0:
-        if time() > endtime:
+        if time() > endtime or stopped is not None and stopped():
             searching = False
         timecheck_counter = TIMECHECK_FREQ
     
@@ -161,6 +243,27 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
             mvs, val = quiescent(board, alpha, beta, ply)
             return mvs, val
     
+    ############################################################################
+    # Null move pruning                                                        #
+    ############################################################################
+    
+    # If passing still fails high on a shallower search, a real move would too.
+    # Not on top of another null move, after a double pawn push, or with only
+    # pawns left, where zugzwang is likely.
+    color = board.color
+    if ply > 0 and depth >= NULL_MOVE_DEPTH and not isCheck and \
+            board.variant not in NO_NULL_MOVE_VARIANTS and \
+            beta < MATE_BOUND and board.enpassant is None and \
+            board.hist[HIST_MOVE] >> 12 != NULL_MOVE and \
+            board.boards[color][KNIGHT] | board.boards[color][BISHOP] | \
+            board.boards[color][ROOK] | board.boards[color][QUEEN] and \
+            evaluateComplete(board, color) >= beta:
+        board.applyMove(newMove(board.kings[color], board.kings[color], NULL_MOVE))
+        mvs, val = alphaBeta (board, depth-1-NULL_MOVE_REDUCTION, -beta, -beta+1, ply+1)
+        board.popMove()
+        if -val >= beta and searching:
+            return [], beta
+    
     ############################################################################
     # Find and sort moves                                                      #
     ############################################################################
@@ -180,25 +283,35 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
         else:
             mlist = [m for m in genAllMoves(board) if not kingExplode(board, m, board.color)]
         moves = [(-getMoveValue(board,table,depth,m),m) for m in mlist]
+    elif isCheck:
+        moves = [(-getMoveValue(board,table,depth,m),m) for m in genCheckEvasions(board)]
+    elif board.variant in ASEAN_VARIANTS or board.variant in DROP_VARIANTS:
+        moves = [(-getMoveValue(board,table,depth,m),m) for m in genAllMoves(board)]
     else:
-        if isCheck:
-            moves = [(-getMoveValue(board,table,depth,m),m) for m in genCheckEvasions(board)]
-        else:
-            moves = [(-getMoveValue(board,table,depth,m),m) for m in genAllMoves(board)]
-    moves.sort()
+        moves = None
+    
+    if moves is None:
+        # The moves are generated in stages, as they are searched
+        moves = pickMoves(board, table, depth, hashmove)
+    else:
+        moves.sort()
+        moves = [m for v, m in moves]
     
     # This is needed on checkmate
     catchFailLow = None
+    movesSearched = 0
+    lmr = depth >= LMR_DEPTH and not isCheck and board.variant not in NO_LMR_VARIANTS
     
     ############################################################################
     # Loop moves                                                               #
     ############################################################################
     
     
-    for moveValue, move in moves:
+    for move in moves:
         
         nodes += 1
         
+        quiet = move>>12 == NORMAL_MOVE and board.arBoard[move&63] == EMPTY
         board.applyMove(move)
         if not isCheck:
             if board.opIsChecked():
@@ -206,21 +319,34 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
                 continue
         
         catchFailLow = move
+        movesSearched += 1
         
-        if foundPv:
-            mvs, val = alphaBeta (board, depth-1, -alpha-1, -alpha, ply+1)
+        # Principal variation search: the first move gets the full window,
+        # the rest are only tested against alpha, unless they beat it
+        if movesSearched == 1:
+            mvs, val = alphaBeta (board, depth-1, -beta, -alpha, ply+1)
             val = -val
+        else:
+            reduction = 0
+            if lmr and quiet and movesSearched > LMR_FULL_MOVES and \
+                    not board.isChecked() and not table.isKiller(depth, move):
+                reduction = 1
+            mvs, val = alphaBeta (board, depth-1-reduction, -alpha-1, -alpha, ply+1)
+            val = -val
+            if val > alpha and reduction:
+                mvs, val = alphaBeta (board, depth-1, -alpha-1, -alpha, ply+1)
+                val = -val
             if val > alpha and val < beta:
                 mvs, val = alphaBeta (board, depth-1, -beta, -alpha, ply+1)
                 val = -val
-        else:
-            mvs, val = alphaBeta (board, depth-1, -beta, -alpha, ply+1)
-            val = -val
         
         board.popMove()
         
         if val > alpha:
             if val >= beta:
+                cutoffs += 1
+                if movesSearched == 1:
+                    firstCutoffs += 1
                 if searching and move>>12 != DROP:
                     table.record (board, move, VALUE_AT_PLY(beta, -ply), hashfBETA, depth)
                     # We don't want to use our valuable killer move spaces for
@@ -234,7 +360,6 @@ def alphaBeta (board, depth, alpha=-MATE_VALUE, beta=MATE_VALUE, ply=0):
             alpha = val
             amove = [move]+mvs
             hashf = hashfEXACT
-            foundPv = True
     
     ############################################################################
     # Return                                                                   #
@@ -263,7 +388,7 @@ def quiescent (board, alpha, beta, ply):
     if skipPruneChance and random() < skipPruneChance:
         return [], (alpha+beta) // 2
     
-    global nodes
+    global nodes, qnodes
     
     if ldraw.test(board):
         return [], 0
@@ -280,25 +405,18 @@ def quiescent (board, alpha, beta, ply):
     
     amove = []
     
-    heap = []
-    
     if isCheck:
-        someMove = False
-        for move in genCheckEvasions(board):
-            someMove = True
-            # Heap.append is fine, as we don't really do sorting on the few moves
-            heap.append((0, move))
-        if not someMove:
+        # We don't really do sorting on the few evasions
+        moves = [move for move in genCheckEvasions(board)]
+        if not moves:
             return [], -MATE_VALUE+ply
     else:
-        for move in genCaptures (board):
-            heappush(heap, (-getCaptureValue (board, move), move))
+        moves = pickCaptures(board)
     
-    while heap:
+    for move in moves:
         
         nodes += 1
-        
-        v, move = heappop(heap)
+        qnodes += 1
         
         board.applyMove(move)
         if not isCheck:
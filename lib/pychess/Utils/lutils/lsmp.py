@@ -0,0 +1,99 @@
+""" Lazy SMP for the built-in engine.
+
+    Helper processes search the same root position as the main search, each
+    one running its own iterative deepening, and share the transposition table
+    with it. The main search gets nothing else from the helpers; it simply
+    finds their results in the table. """
+
+from __future__ import absolute_import
+
+from multiprocessing import Process, Queue
+from multiprocessing.sharedctypes import RawArray, RawValue
+from time import sleep
+
+from . import lsearch
+from .TranspositionTable import TranspositionTable, SharedTranspositionTable
+
+
+def _helper (index, data, maxSize, generation, busy, nodes, jobs):
+    lsearch.table = TranspositionTable(maxSize, data)
+    jobGeneration = None
+    lsearch.stopped = lambda: generation.value != jobGeneration
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        jobGeneration, board, endtime, maxDepth, search_id, skipPruneChance = job
+
+        busy[index] = 1
+        if generation.value == jobGeneration:
+            lsearch.table.search_id = search_id
+            lsearch.skipPruneChance = skipPruneChance
+            lsearch.endtime = endtime
+            lsearch.searching = True
+            lsearch.nodes = 0
+            lsearch.timecheck_counter = lsearch.TIMECHECK_FREQ
+            # Every second helper starts one ply deeper, so they don't all
+            # walk the tree in lockstep with the main search
+            for depth in range(1 + (index + 1) % 2, maxDepth + 1):
+                lsearch.alphaBeta(board, depth)
+                nodes[index] = lsearch.nodes
+                if not lsearch.searching:
+                    break
+        busy[index] = 0
+
+class LazySMP (object):
+    def __init__ (self, cores):
+        """ Starts cores-1 helper processes. Unless the transposition table
+            of lsearch is a SharedTranspositionTable already, it is replaced
+            by one of the same size. """
+        self.cores = cores
+        if not isinstance(lsearch.table, SharedTranspositionTable):
+            lsearch.table = SharedTranspositionTable(len(lsearch.table.data))
+        self.table = lsearch.table
+
+        helpers = cores - 1
+        self.generation = RawValue('i', 0)
+        self.busy = RawArray('b', helpers)
+        self.helperNodes = RawArray('l', helpers)
+        self.jobs = [Queue() for i in range(helpers)]
+        self.processes = []
+        for i in range(helpers):
+            process = Process(target=_helper,
+                              args=(i, self.table.data, len(self.table.data),
+                                    self.generation, self.busy,
+                                    self.helperNodes, self.jobs[i]))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+    @property
+    def nodes (self):
+        """ The number of nodes the helpers searched since start() """
+        return sum(self.helperNodes)
+
+    def start (self, board, endtime, maxDepth):
+        """ Lets the helpers search board until stop() is called, endtime is
+            passed or they have reached maxDepth """
+        self.stop()
+        for i in range(len(self.processes)):
+            self.helperNodes[i] = 0
+        for jobs in self.jobs:
+            # The clone keeps its arrays while the main search changes board
+            jobs.put((self.generation.value, board.clone(), endtime, maxDepth,
+                      self.table.search_id, lsearch.skipPruneChance))
+
+    def stop (self):
+        """ Stops the helpers and waits for them to go idle """
+        self.generation.value += 1
+        while any(self.busy):
+            sleep(0.001)
+
+    def close (self):
+        self.stop()
+        for jobs in self.jobs:
+            jobs.put(None)
+        for process in self.processes:
+            process.join()
+        self.processes = []
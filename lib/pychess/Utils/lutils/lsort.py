@@ -3,6 +3,7 @@ from __future__ import print_function
 import sys
 
 from .attack import getAttacks, staticExchangeEvaluate
+from .lmovegen import genAllMoves, genCaptures, isPseudoLegal
 from pychess.Utils.eval import pos as positionValues
 from pychess.Variants.atomic import kingExplode
 
@@ -96,3 +97,58 @@ def sortMoves (board, table, ply, hashmove, moves):
     f = lambda move: getMoveValue (board, table, ply, hashmove, move)
     moves.sort(key=f, reverse=True)
     return moves
+
+def pickCaptures (board, losing=None, skip=None):
+    """ Yields the captures of board, best first by getCaptureValue. If losing
+        is a list, the captures losing material are put there instead of
+        yielded. The move skip is left out. """
+    captures = [(-getCaptureValue(board, move), move)
+                for move in genCaptures(board) if move != skip]
+    captures.sort()
+    for value, move in captures:
+        if value > 0 and losing is not None:
+            losing.append(move)
+        else:
+            yield move
+
+def pickMoves (board, table, depth, hashmove):
+    """ Yields the moves of board in the order
+        1.  The hash move
+        2.  Winning and equal captures, by static exchange evaluation
+        3.  Killers
+        4.  Quiet moves and promotions, by getMoveValue
+        5.  Losing captures
+        Every stage is generated when it is reached, so a cutoff early in the
+        list saves the work of the stages after it. Only for positions not in
+        check, of the variants isPseudoLegal supports. """
+    
+    if hashmove is not None and isPseudoLegal(board, hashmove):
+        yield hashmove
+    else:
+        hashmove = None
+    
+    losing = []
+    for move in pickCaptures(board, losing, hashmove):
+        yield move
+    
+    # Killers are recorded for quiet moves only, but may come from another
+    # position. Non capturing promotions are left for the quiet stage.
+    enemies = board.friends[1-board.color]
+    killers = []
+    for move in (table.killer1[depth], table.killer2[depth]):
+        if move != -1 and move != hashmove and move>>12 == NORMAL_MOVE and \
+                not enemies & bitPosArray[move & 63] and \
+                isPseudoLegal(board, move):
+            killers.append(move)
+            yield move
+    
+    quiets = [(-getMoveValue(board, table, depth, move), move)
+              for move in genAllMoves(board)
+              if not enemies & bitPosArray[move & 63] and move>>12 != ENPASSANT
+              and move != hashmove and move not in killers]
+    quiets.sort()
+    for value, move in quiets:
+        yield move
+    
+    for move in losing:
+        yield move
@@ -1,31 +1,179 @@
+from __future__ import absolute_import
 from __future__ import print_function
 
-import sys
+################################################################################
+# Perft counts the leaf nodes of the legal move tree to a given depth, to test #
+# the move generator against known counts. Besides the plain recursion it can  #
+# use a hash table of subtree counts and search the root moves in parallel.    #
+################################################################################
+
+from ctypes import create_string_buffer
+from multiprocessing import Pool
+from struct import Struct
 from time import time
 
-from pychess.Utils.lutils.lmovegen import genAllMoves
-from pychess.Utils.lutils.lmove import toSAN, toLAN
+from pychess.Utils.const import *
+from .attack import isAttacked, pinnedOnKing
+from .bitboard import iterBits
+from .ldata import directions, bitPosArray
+from .lmovegen import genAllMoves
+from .lmove import toLAN
 
+# Variants where a move not touching the king, made while not in check, can
+# be illegal other than by breaking a pin. The legal moves at the last ply
+# are counted without making them in the other variants.
+NO_BULK_VARIANTS = (ATOMICCHESS, LOSERSCHESS, SUICIDECHESS) + \
+                   tuple(ASEAN_VARIANTS) + tuple(DROP_VARIANTS)
 
-def do_perft(board, depth, root):
-    nodes = 0
+# Variants whose move generation depends on state the hash keys leave out
+# (holdings, cambodian first moves), so the perft hash can't be used
+UNHASHED_VARIANTS = tuple(DROP_VARIANTS) + (CAMBODIANCHESS,)
+
+################################################################################
+# The perft hash                                                               #
+################################################################################
+
+# key       board.hash xor'ed with a depth key
+# count     number of leaf nodes below the position
+perftEntryType = Struct('=Q Q')
+DEPTH_KEYS = [(depth * 0x9e3779b97f4a7c15) & 0xffffffffffffffff for depth in range(64)]
+
+class PerftHash (object):
+    """ An always replacing table of the perft counts of subtrees """
+
+    def __init__ (self, maxSize):
+        self.entries = max(1, maxSize // perftEntryType.size)
+        self.data = create_string_buffer(self.entries * perftEntryType.size)
+        self.hits = 0
+
+    def probe (self, board, depth):
+        key = board.hash ^ DEPTH_KEYS[depth]
+        offset = (key % self.entries) * perftEntryType.size
+        ekey, count = perftEntryType.unpack_from(self.data, offset)
+        if ekey == key and count:
+            self.hits += 1
+            return count
+
+    def record (self, board, depth, count):
+        key = board.hash ^ DEPTH_KEYS[depth]
+        offset = (key % self.entries) * perftEntryType.size
+        perftEntryType.pack_into(self.data, offset, key, count)
+
+################################################################################
+# Counting                                                                     #
+################################################################################
+
+def countLegalMoves (board):
+    """ Returns the number of legal moves of board """
+    count = 0
+    if board.variant not in NO_BULK_VARIANTS and not board.isChecked():
+        color = board.color
+        opcolor = 1 - color
+        kcord = board.kings[color]
+        kdirections = directions[kcord]
+        friends = board.friends[color]
+        pinned = 0
+        for cord in iterBits(friends):
+            if kdirections[cord] != -1 and pinnedOnKing(board, cord, color):
+                pinned |= bitPosArray[cord]
+
+        for move in genAllMoves(board):
+            fcord = (move >> 6) & 63
+            flag = move >> 12
+            if flag == ENPASSANT or flag == KING_CASTLE or flag == QUEEN_CASTLE:
+                board.applyMove(move)
+                if not board.opIsChecked():
+                    count += 1
+                board.popMove()
+            elif fcord == kcord:
+                # Not being in check, no slider can be looking through the
+                # king at its new cord
+                if not isAttacked(board, move & 63, opcolor):
+                    count += 1
+            elif not pinned & bitPosArray[fcord] or \
+                    kdirections[move & 63] == kdirections[fcord]:
+                count += 1
+        return count
+
+    for move in genAllMoves(board):
+        board.applyMove(move)
+        if not board.opIsChecked():
+            count += 1
+        board.popMove()
+    return count
+
+def do_perft (board, depth, root=0, table=None):
+    """ Returns the number of leaf nodes depth plies below board. For the
+        first root plies the count of every move is printed. The subtree
+        counts are kept in table, if it's a PerftHash. """
     if depth == 0:
         return 1
-    
+    if depth == 1 and root <= 0:
+        return countLegalMoves(board)
+    if table is not None:
+        count = table.probe(board, depth)
+        if count is not None:
+            return count
+
+    nodes = 0
     for move in genAllMoves(board):
         board.applyMove(move)
         if board.opIsChecked():
             board.popMove()
             continue
 
-        count = do_perft(board, depth-1, root-1)
+        count = do_perft(board, depth-1, root-1, table)
         nodes += count
         board.popMove()
         if root > 0:
             print("%8s %10d %10d" % (toLAN(board, move), count, nodes))
 
+    if table is not None:
+        table.record(board, depth, nodes)
     return nodes
 
+def _divideMove (job):
+    board, move, depth, hashSize = job
+    table = PerftHash(hashSize) if hashSize else None
+    board.applyMove(move)
+    return do_perft(board, depth-1, 0, table)
+
+def divide (board, depth, processes=1, hashSize=0):
+    """ Returns a list of the legal moves of board with their perft counts to
+        depth. The root moves are shared out to a pool of processes, if
+        processes > 1, each using a perft hash of hashSize bytes. """
+    if hashSize and board.variant in UNHASHED_VARIANTS:
+        hashSize = 0
+    moves = []
+    for move in genAllMoves(board):
+        board.applyMove(move)
+        if not board.opIsChecked():
+            moves.append(move)
+        board.popMove()
+
+    if processes > 1 and depth > 1:
+        jobs = [(board.clone(), move, depth, hashSize) for move in moves]
+        pool = Pool(processes)
+        try:
+            counts = pool.map(_divideMove, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        table = PerftHash(hashSize) if hashSize else None
+        counts = []
+        for move in moves:
+            board.applyMove(move)
+            counts.append(do_perft(board, depth-1, 0, table))
+            board.popMove()
+    return list(zip(moves, counts))
+
+def countNodes (board, depth, processes=1, hashSize=0):
+    """ Returns the perft count of board to depth, see divide """
+    if depth == 0:
+        return 1
+    return sum(count for move, count in divide(board, depth, processes, hashSize))
+
 def perft(board, depth, root):
     for i in range(depth):
         start_time = time()
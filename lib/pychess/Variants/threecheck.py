@@ -18,10 +18,10 @@ class ThreeCheckBoard(Board):
 def checkCount(board):
     cc = 0
     lboard = board.clone()
-    while lboard.hist_move:
+    while lboard.hist:
         if lboard.isChecked():
             cc += 1
         lboard.popMove()
-        if lboard.hist_move:
+        if lboard.hist:
             lboard.popMove()
     return cc
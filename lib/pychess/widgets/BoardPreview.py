@@ -8,7 +8,7 @@ from pychess.compat import unicode
 from pychess.System import conf
 from pychess.Utils.const import reprResult, BLACK, FEN_EMPTY, NORMALCHESS
 from pychess.Utils.Board import Board
-from pychess.System.protoopen import protoopen, splitUri
+from pychess.System.protoopen import protoopen, splitUri, uriEnding
 from pychess.widgets.BoardView import BoardView
 from pychess.Savers.ChessFile import LoadingError
 
@@ -91,8 +91,7 @@ class BoardPreview:
         if os.path.isdir(filename):            
             return
         
-        ending = filename[filename.rfind(".")+1:]
-        loader = self.enddir[ending]
+        loader = self.enddir[uriEnding(filename)]
         self.chessfile = chessfile = loader.load(protoopen(filename))
         
         self.list.get_model().clear()
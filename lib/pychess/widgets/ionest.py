@@ -154,6 +154,11 @@ def getOpenAndSaveDialogs():
             if hasattr(enddir[ending], "load"):
                 f.add_pattern("*."+ending)
                 all.add_pattern("*."+ending)
+                if ending == "pgn":
+                    # protoopen decompresses these while reading
+                    for pattern in ("*.pgn.gz", "*.pgn.bz2", "*.pgn.xz", "*.zip"):
+                        f.add_pattern(pattern)
+                        all.add_pattern(pattern)
                 opendialog.add_filter(f)
                 saveformats.append([label, endstr, saver])
                 i += 1
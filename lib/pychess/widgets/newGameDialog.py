@@ -33,6 +33,7 @@ from pychess.System.Log import log
 from pychess.System import conf
 from pychess.System.idle_add import idle_add
 from pychess.System.prefix import getDataPrefix, isInstalled, addDataPrefix
+from pychess.System.protoopen import uriEnding
 from pychess.Players.engineNest import discoverer
 from pychess.Players.Human import Human
 from pychess.widgets import BoardPreview
@@ -470,7 +471,7 @@ class LoadFileExtension (_GameInitializationMode):
             if res != Gtk.ResponseType.ACCEPT:
                 return
         else:
-            if not uri[uri.rfind(".")+1:] in ionest.enddir:
+            if not uriEnding(uri) in ionest.enddir:
                 log.info("Ignoring strange file: %s" % uri)
                 return
             cls.loadSidePanel.set_filename(uri)
@@ -486,7 +487,7 @@ class LoadFileExtension (_GameInitializationMode):
         def _callback (gamemodel, p0, p1):
             if not cls.loadSidePanel.is_empty():
                 uri =  cls.loadSidePanel.get_filename()
-                loader = ionest.enddir[uri[uri.rfind(".")+1:]]
+                loader = ionest.enddir[uriEnding(uri)]
                 position = cls.loadSidePanel.get_position()
                 gameno = cls.loadSidePanel.get_gameno()
                 ionest.generalStart(gamemodel, p0, p1, (uri, loader, gameno, position))
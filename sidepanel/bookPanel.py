@@ -97,7 +97,12 @@ class OpeningAdvisor(Advisor):
         b = m.getBoardAtPly(shown, boardview.shownVariationIdx)
         parent = self.empty_parent()
         
-        openings = getOpenings(b.board)
+        if conf.get("opening_database", False):
+            # The moves played in the positions of our own game database
+            from pychess.Database.positions import getOpenings as getDatabaseOpenings
+            openings = getDatabaseOpenings(b.board)
+        else:
+            openings = getOpenings(b.board)
         openings.sort(key=lambda t: t[1], reverse=True)
         if not openings:
             return
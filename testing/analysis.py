@@ -13,7 +13,7 @@ from gi.repository import GObject
 
 class DummyCECPAnalyzerEngine(GObject.GObject):
     __gsignals__ = {
-        "line": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        "lines": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
         "died": (GObject.SignalFlags.RUN_FIRST, None, ()),
     }
     def __init__(self):
@@ -21,10 +21,10 @@ class DummyCECPAnalyzerEngine(GObject.GObject):
         self.defname = 'Dummy'
         self.Q = Queue()
     def putline(self, line):
-        self.emit('line', line)
+        self.emit('lines', [line])
     def write(self, text):
         if text.strip() == 'protover 2':
-            self.emit('line', 'feature setboard=1 analyze=1 ping=1 draw=0 sigint=0 done=1')
+            self.emit('lines', ['feature setboard=1 analyze=1 ping=1 draw=0 sigint=0 done=1'])
         pass
     def readline(self):
         return self.Q.get()
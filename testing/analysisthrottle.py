@@ -0,0 +1,81 @@
+import unittest
+
+from gi.repository import GLib
+
+from pychess.Players.Engine import AnalysisThrottle
+
+
+class DummyEngine(object):
+    def __init__(self):
+        self.emitted = []
+    def emit(self, signal, analysis):
+        self.emitted.append((signal, analysis))
+
+def line(score):
+    return [(["e2e4", "e7e5"], score, "12")]
+
+class AnalysisThrottleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = DummyEngine()
+        self.throttle = AnalysisThrottle(self.engine)
+        # Instead of the analysis_rate of the user's config
+        self.throttle.interval = lambda: 0.1
+
+    def runLoop(self, secs):
+        loop = GLib.MainLoop()
+        GLib.timeout_add(int(secs*1000), loop.quit)
+        loop.run()
+
+    def test1(self):
+        """Testing that posted analyses are coalesced"""
+        for score in range(50):
+            self.throttle.post(line(score))
+        self.assertEqual(self.engine.emitted, [("analyze", line(0))])
+
+        self.runLoop(0.3)
+        self.assertEqual(self.engine.emitted, [("analyze", line(0)), ("analyze", line(49))])
+        self.assertEqual(self.throttle.delivered, 2)
+        self.assertEqual(self.throttle.dropped, 48)
+
+    def test2(self):
+        """Testing that flush publishes the pending analysis at once"""
+        self.throttle.post(line(1))
+        self.throttle.post(line(2))
+        self.throttle.flush()
+        self.assertEqual(self.engine.emitted, [("analyze", line(1)), ("analyze", line(2))])
+        self.assertEqual(self.throttle.timeoutId, None)
+
+        # Nothing is left to publish
+        self.throttle.flush()
+        self.runLoop(0.2)
+        self.assertEqual(self.throttle.delivered, 2)
+        self.assertEqual(self.throttle.dropped, 0)
+
+    def test3(self):
+        """Testing that discard drops the pending analysis"""
+        self.throttle.post(line(1))
+        self.throttle.post(line(2))
+        self.throttle.discard()
+        self.runLoop(0.2)
+        self.assertEqual(self.engine.emitted, [("analyze", line(1))])
+        self.assertEqual(self.throttle.delivered, 1)
+        self.assertEqual(self.throttle.dropped, 1)
+
+        # Later analyses are published again
+        self.throttle.post(line(3))
+        self.assertEqual(self.engine.emitted[-1], ("analyze", line(3)))
+
+    def test4(self):
+        """Testing that a rate of 0 publishes every analysis"""
+        self.throttle.interval = lambda: 0
+        analysis = line(1)
+        for score in range(5):
+            analysis[0] = (["d2d4"], score, "8")
+            self.throttle.post(analysis)
+        self.assertEqual([a[0][1] for s, a in self.engine.emitted], list(range(5)))
+        self.assertEqual(self.throttle.delivered, 5)
+        self.assertEqual(self.throttle.dropped, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from pychess.Utils.const import WHITE, BLACK
+from pychess.Players.batchAnalysis import judge, formatEval, Checkpoint
+
+
+class BatchAnalysisTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def test1(self):
+        """Testing the nags of the score losses"""
+        self.assertEqual(judge(50, -40), None)
+        self.assertEqual(judge(50, 60), "$2")
+        self.assertEqual(judge(50, 250), "$4")
+        self.assertEqual(judge(200, 0, mistake=150, blunder=500), "$2")
+        self.assertEqual(formatEval(35, "18", WHITE), "[%eval 0.35/18]")
+        self.assertEqual(formatEval(35, "18", BLACK), "[%eval -0.35/18]")
+
+    def test2(self):
+        """Testing the resume of the checkpoint records"""
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record(3, 10, (["e2e4", "e7e5"], 20, "12"))
+        checkpoint.record(3, 11, (["g1f3"], -15, "12"))
+        checkpoint.record(4, 0, (["d2d4"], 30, "10"))
+        checkpoint.finish(4)
+        checkpoint.close()
+        # An interrupted write
+        with open(self.path, "a") as f:
+            f.write('{"game": 3, "ply"')
+
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.done, set([4]))
+        self.assertEqual(checkpoint.scores, {3: {10: (["e2e4", "e7e5"], 20, "12"),
+                                                 11: (["g1f3"], -15, "12")}})
+        checkpoint.close()
+
+    def test3(self):
+        """Testing two resumes after an interrupted write"""
+        checkpoint = Checkpoint(self.path)
+        checkpoint.record(1, 0, (["e2e4"], 25, "10"))
+        checkpoint.close()
+        with open(self.path, "a") as f:
+            f.write('{"game": 1, "ply"')
+
+        checkpoint = Checkpoint(self.path)
+        checkpoint.finish(1)
+        checkpoint.close()
+
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.done, set([1]))
+        self.assertEqual(checkpoint.scores, {})
+        checkpoint.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils import leval
+from pychess.Savers.pgnbase import pgn_load
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class BatchEvalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.boards = []
+        for line in open('gamefiles/perftsuite.epd'):
+            board = LBoard(NORMALCHESS)
+            board.applyFen(line.split(";")[0])
+            self.boards.append(board)
+
+        cf = pgn_load(open('gamefiles/world_matches.pgn'))
+        for i in range(20):
+            board = LBoard(NORMALCHESS)
+            board.applyFen(FEN_START)
+            self.boards += cf.parse_string(cf.get_movetext(i), board, -1)
+
+        random.seed(0)
+        self.colors = [random.randint(WHITE, BLACK) for board in self.boards]
+
+    def test1(self):
+        """Testing the batch evaluation terms against leval"""
+        from pychess.Utils.lutils.batcheval import evaluateTerms
+        terms = evaluateTerms(self.boards, self.colors)
+
+        for i, (board, color) in enumerate(zip(self.boards, self.colors)):
+            material, phase = leval.evalMaterial(board, color)
+            self.assertEqual(terms["material"][i], material)
+            self.assertEqual(terms["phase"][i], phase)
+
+            tropism = leval.evalKingTropism(board, color, phase) - \
+                      leval.evalKingTropism(board, 1-color, phase)
+            self.assertEqual(terms["kingTropism"][i], tropism)
+
+            leval.clearPawnTable()
+            pawnScore, passed, weaked = leval.cacheablePawnInfo(board, phase)
+            pawnScore = pawnScore if color == WHITE else -pawnScore
+            self.assertEqual(terms["pawnStructure"][i], pawnScore)
+
+    def test2(self):
+        """Testing the batch passed and weak pawns against leval"""
+        from pychess.Utils.lutils.batcheval import packBoards, evalMaterial, \
+            cacheablePawnInfo
+        packed = packBoards(self.boards)
+        material, phases = evalMaterial(packed, packed.color)
+        scores, passed, weaked = cacheablePawnInfo(packed, phases)
+
+        for i, board in enumerate(self.boards):
+            leval.clearPawnTable()
+            self.assertEqual((scores[i], passed[i], weaked[i]),
+                             leval.cacheablePawnInfo(board, phases[i]))
+
+    def test3(self):
+        """Testing that batch evaluation refuses unsupported variants"""
+        from pychess.Utils.lutils.batcheval import packBoards
+        board = LBoard(CRAZYHOUSECHESS)
+        board.applyFen(FEN_START)
+        self.assertRaises(ValueError, packBoards, [board])
+
+if __name__ == '__main__':
+    unittest.main()
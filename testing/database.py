@@ -2,12 +2,18 @@ from __future__ import print_function
 import unittest
 
 from pychess.Utils.const import *
-from pychess.Savers.database import save, load
+from pychess.Savers import database
+from pychess.Savers.database import save, load, get_count
 from pychess.Savers.pgn import load as pgnload
 from pychess.Savers.pgn import walk
 from pychess.Database import model
 from pychess.Database.model import set_engine, metadata, collection, event,\
-                            site, player, game, annotator, ini_collection
+                            site, player, game, annotator, position, ini_collection
+from pychess.Database.positions import mainline_positions, get_games, get_move_stats
+from pychess.Database.headers import plan, apply_filters
+from pychess.Database.PgnImport import fingerprint
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils.lmove import parseSAN
 
 class TestPlayer():
     __type__ = LOCAL
@@ -24,6 +30,7 @@ class DbTestCase(unittest.TestCase):
         model.set_engine("sqlite://")
         metadata.create_all(model.engine)
         self.conn = model.engine.connect()
+        database.counts.clear()
     
     def test_databas(self):
         """Testing database save-load"""
@@ -52,6 +59,90 @@ class DbTestCase(unittest.TestCase):
         out_game = " ".join(out_game)
         
         self.assertEqual(in_game, out_game)
+
+    def test_get_position(self):
+        """Testing the main line replay of a saved game"""
+        model = pgnfile.loadToModel(0)
+        p0, p1 = pgnfile.get_player_names(0)
+        model.players = (TestPlayer(p0), TestPlayer(p1))
+        save(None, model)
+
+        db = load(None)
+        db.games = self.conn.execute(db.select).fetchall()
+        for ply in range(len(model.boards)):
+            board = db.get_position(0, ply)
+            self.assertEqual(board.asFen(), model.boards[ply].board.asFen())
+        self.assertEqual(db.get_position(0).asFen(), model.boards[-1].board.asFen())
+        self.assertEqual(db.comments, None)
+
+    def test_counts(self):
+        """Testing the cached game counts"""
+        where = plan({"white": "Alice"})[0]
+        self.assertEqual(get_count(self.conn), 0)
+        self.assertEqual(get_count(self.conn, where), 0)
+
+        for white in ("Alice", "Bob"):
+            gamemodel = pgnfile.loadToModel(0)
+            gamemodel.players = (TestPlayer(white), TestPlayer("Carol"))
+            save(None, gamemodel)
+        self.assertEqual(get_count(self.conn), 2)
+        self.assertEqual(get_count(self.conn, where), 1)
+
+    def test_filters(self):
+        """Testing the game list filters on the game headers"""
+        for white in ("Alice", "Bob"):
+            gamemodel = pgnfile.loadToModel(0)
+            gamemodel.players = (TestPlayer(white), TestPlayer("Carol"))
+            save(None, gamemodel)
+
+        db = load(None)
+        self.assertEqual(db.count, 2)
+        for filters, whites in (({"white": "ali"}, ["Alice"]),
+                                ({"player": "Carol"}, ["Alice", "Bob"]),
+                                ({"black": "Al"}, []),
+                                ({"white": "B", "result": gamemodel.status}, ["Bob"])):
+            rows = self.conn.execute(apply_filters(db.select, filters)).fetchall()
+            self.assertEqual(sorted(row["White"] for row in rows), whites)
+
+        self.assertEqual(plan({"white": "Kasparov", "result": WHITEWON})[1], "ix_game_header_white")
+        self.assertEqual(plan({"eco": "B", "year": (1990, 2000)})[1], "ix_game_header_eco")
+        self.assertEqual(plan({"result": WHITEWON})[1], None)
+
+    def test_fingerprint(self):
+        """Testing the game fingerprints of the import"""
+        fp = fingerprint("Kasparov, Garry", "Karpov, Anatoly", 1985, 10, 15, b"\x01\x02")
+        self.assertEqual(fingerprint("KASPAROV GARRY RUS", "Karpov Anatoly", 1985, 10, 15, b"\x01\x02"), fp)
+        self.assertNotEqual(fingerprint("Kasparov, Garry", "Karpov, Anatoly", 1985, 10, 15, b"\x01\x03"), fp)
+        self.assertNotEqual(fingerprint("Kasparov, Garry", "Karpov, Anatoly", 1985, None, None, b"\x01\x02"), fp)
+
+    def test_positions(self):
+        """Testing the position search"""
+        games = (("e4 e5 Nf3", WHITEWON), ("e4 c5", BLACKWON), ("e4 e5 Nc3", DRAW))
+        for game_id, (sans, result) in enumerate(games, 1):
+            board = LBoard()
+            board.applyFen(FEN_START)
+            start = board.clone()
+            moves = []
+            for san in sans.split():
+                moves.append(parseSAN(board, san))
+                board.applyMove(moves[-1])
+            self.conn.execute(game.insert(), {'id': game_id, 'result': result})
+            self.conn.execute(position.insert(), [
+                {'hash': hash, 'game_id': game_id, 'ply': ply, 'move': move}
+                for hash, ply, move in mainline_positions(start, moves, 2)])
+
+        board = LBoard()
+        board.applyFen(FEN_START)
+        board.applyMove(parseSAN(board, "e4"))
+        self.assertEqual(get_games(board, conn=self.conn), [(1, 1), (2, 1), (3, 1)])
+        self.assertEqual(get_move_stats(board, conn=self.conn), [
+            (parseSAN(board, "e5"), 2, 1, 1, 0),
+            (parseSAN(board, "c5"), 1, 0, 0, 1)])
+
+        # Positions past the last ply aren't stored
+        board.applyMove(parseSAN(board, "e5"))
+        board.applyMove(parseSAN(board, "Nf3"))
+        self.assertEqual(get_games(board, conn=self.conn), [])
             
 if __name__ == '__main__':
     unittest.main()
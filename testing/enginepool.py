@@ -0,0 +1,76 @@
+import unittest
+
+from pychess.Players.enginePool import EnginePool
+
+
+class DummySubProcess(object):
+    def __init__(self, pid):
+        self.pid = pid
+        self.defname = 'Dummy'
+        self.subprocExitCode = (None, None)
+        self.channelsClosed = False
+        self.discardMarker = None
+        self.written = []
+        self.killed = False
+    @property
+    def discarding(self):
+        return self.discardMarker is not None
+    def discardUntil(self, line):
+        self.discardMarker = line
+    def write(self, text):
+        self.written.append(text)
+    def gentleKill(self):
+        self.killed = True
+
+ENGINE = {"md5": "abc", "args": ["-x"],
+          "options": [{"name": "Hash", "default": 16, "value": 256},
+                      {"name": "Threads", "default": 1, "value": 1}]}
+
+class EnginePoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = EnginePool()
+        self.key = EnginePool.key(ENGINE)
+
+    def test1(self):
+        """Testing the pool keys of engines"""
+        self.assertEqual(self.key, ("abc", ("-x",), (("Hash", "256"),)))
+        other = dict(ENGINE, options=[{"name": "Hash", "default": 16, "value": 128}])
+        self.assertNotEqual(EnginePool.key(other), self.key)
+
+    def test2(self):
+        """Testing the reset and reuse of pooled processes"""
+        proc = DummySubProcess(1)
+        self.assertTrue(self.pool.put(self.key, proc, ["ucinewgame", "isready"], "readyok"))
+        self.assertEqual("".join(proc.written), "ucinewgame\nisready\n")
+        self.assertEqual(proc.discardMarker, "readyok")
+
+        self.assertEqual(self.pool.take(("other",)), None)
+        self.assertTrue(self.pool.take(self.key) is proc)
+        self.assertEqual(self.pool.take(self.key), None)
+
+    def test3(self):
+        """Testing that dead processes aren't reused"""
+        proc = DummySubProcess(1)
+        self.pool.put(self.key, proc, [], "readyok")
+        proc.subprocExitCode = (0, "Success")
+        self.assertEqual(self.pool.take(self.key), None)
+
+        proc.subprocExitCode = (None, None)
+        proc.channelsClosed = True
+        self.assertFalse(self.pool.put(self.key, proc, [], "readyok"))
+
+    def test4(self):
+        """Testing the eviction of pooled processes"""
+        procs = [DummySubProcess(pid) for pid in range(4)]
+        for proc in procs:
+            self.pool.put(self.key, proc, [], "readyok")
+        # The pool holds 2 processes by default
+        self.assertEqual([proc.killed for proc in procs], [True, True, False, False])
+
+        self.pool.clear()
+        self.assertTrue(all(proc.killed for proc in procs))
+        self.assertEqual(self.pool.take(self.key), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -55,6 +55,38 @@ class EvalTestCase(unittest.TestCase):
             sb = func(self.board, BLACK, phaseb)
             #print func, sw, sb
             self.assertEqual(sw, sb)
-    
+
+    def test4(self):
+        """Testing pawn hash probe, record and stats"""
+        leval.clearPawnTable()
+        self.assertEqual(leval.probePawns(self.board, 3), None)
+        leval.recordPawns(self.board, 3, -25, 0x100, 0x200)
+        self.assertEqual(leval.probePawns(self.board, 3), (-25, 0x100, 0x200))
+        # Phases are kept apart
+        self.assertEqual(leval.probePawns(self.board, 4), None)
+        stats = leval.pawnTableStats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["collisions"]), (1, 2, 0))
+
+    def test5(self):
+        """Testing pawn hash replacement and resize"""
+        leval.setPawnHashSize(leval.pawnBucketType.size)
+        try:
+            self.assertEqual(leval.pawnTableStats()["entries"], 4)
+            leval.clearPawnTable()
+            # Fill the one bucket, with the start position recorded last
+            for phase in range(1, 5):
+                leval.recordPawns(self.board, phase, phase, 0, 0)
+            leval.newPawnSearch()
+            board = LBoard(NORMALCHESS)
+            board.applyFen("4k3/8/8/8/8/8/4P3/4K3 w - - 0 1")
+            leval.recordPawns(board, 1, 50, 0, 0)
+            self.assertEqual(leval.pawnTableStats()["collisions"], 1)
+            self.assertEqual(leval.probePawns(board, 1), (50, 0, 0))
+            # The replaced entry was one of the older ones
+            hits = [leval.probePawns(self.board, phase) for phase in range(1, 5)]
+            self.assertEqual(hits.count(None), 1)
+        finally:
+            leval.setPawnHashSize(leval.PAWN_HASH_SIZE * leval.pawnEntryType.size)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from array import array
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Database.dbwalk import walk
+from pychess.Database import gameformat
+from pychess.Savers.pgnbase import pgn_load
+
+
+class GameFormatTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.games = []
+        for name in ('gamefiles/annotated.pgn', 'gamefiles/world_matches.pgn'):
+            cf = pgn_load(open(name))
+            for i in range(len(cf.games)):
+                board = LBoard(NORMALCHESS)
+                board.applyFen(FEN_START)
+                boards = cf.parse_string(cf.get_movetext(i), board.clone(), -1)
+                movelist = array("H")
+                comments = []
+                walk(boards[0], movelist, comments)
+                self.games.append((board, boards, movelist, comments))
+
+    def test1(self):
+        """Testing that binary movelists decode to the walk() elements"""
+        for board, boards, movelist, comments in self.games:
+            for start in (None, board):
+                data = gameformat.encode(movelist, comments, start)
+                self.assertTrue(gameformat.is_binary(data))
+                arr, texts = gameformat.to_array(data, board)
+                self.assertEqual(list(arr), list(movelist))
+                self.assertEqual(texts, comments)
+
+    def test2(self):
+        """Testing the main line replay of binary movelists"""
+        for board, boards, movelist, comments in self.games[:100]:
+            for start in (None, board):
+                data = gameformat.encode(movelist, comments, start)
+                last = board.clone()
+                gameformat.replay(data, last)
+                self.assertEqual(last.asFen(), boards[-1].asFen())
+
+                ply = min(10, len(boards)-1)
+                middle = board.clone()
+                gameformat.replay(data, middle, ply)
+                self.assertEqual(middle.asFen(), boards[ply].asFen())
+
+    def test3(self):
+        """Testing the annotations of a ply and comments holding a '|'"""
+        board, boards, movelist, comments = self.games[0]
+        comments = ["%s|%s" % (text, "x" * 70000) for text in comments]
+        for start in (None, board):
+            data = gameformat.encode(movelist, comments, start)
+            self.assertEqual(gameformat.to_array(data, board)[1], comments)
+
+            texts = []
+            for ply in range(len(boards)):
+                elements = gameformat.annotations(data, ply, texts)
+                self.assertEqual(len(elements) > 0,
+                                 bool(boards[ply].nags or boards[ply].children))
+            self.assertEqual(texts, comments)
+
+    def test4(self):
+        """Testing indexed main lines of chess960 games and promotions"""
+        for name in ('gamefiles/chess960rwch.pgn', 'gamefiles/promotion.pgn'):
+            cf = pgn_load(open(name))
+            for i in range(len(cf.games)):
+                fen = cf._getTag(i, "FEN")
+                board = LBoard(FISCHERRANDOMCHESS if fen else NORMALCHESS)
+                board.applyFen(fen or FEN_START)
+                boards = cf.parse_string(cf.get_movetext(i), board.clone(), -1)
+                movelist = array("H")
+                comments = []
+                walk(boards[0], movelist, comments)
+
+                data = gameformat.encode(movelist, comments, board)
+                self.assertTrue(ord(data[3:4]) & gameformat.INDEXED)
+                self.assertEqual(list(gameformat.to_array(data, board)[0]), list(movelist))
+                last = board.clone()
+                gameformat.replay(data, last)
+                self.assertEqual(last.asFen(), boards[-1].asFen())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import unittest
 
 from pychess.Utils.Move import Move
 from pychess.Utils.lutils.LBoard import LBoard
-from pychess.Utils.lutils.lmove import parseAN, parseSAN, parseFAN, toFAN, ParsingError
+from pychess.Utils.lutils.lmove import parseAN, parseSAN, parseFAN, toFAN, toSAN, \
+    parseTrustedSAN, ParsingError
 from pychess.Utils.lutils.lmovegen import genAllMoves
 
 
@@ -66,6 +67,27 @@ class MoveTestCase(unittest.TestCase):
             fan = toFAN(board, lmove)
             self.assertEqual(parseFAN(board, fan), lmove)
 
+    def test_parseTrustedSAN(self):
+        """Testing parseTrustedSAN against parseSAN"""
+
+        for fen in ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                    # The knight on c3 is pinned, so Ne2 is the one from g1
+                    "4k3/8/8/b7/8/2N5/8/4K1N1 w - - 0 1",
+                    # Three queens can reach d4
+                    "4k3/8/1Q3Q2/8/8/8/1Q6/4K3 w - - 0 1"):
+            board = LBoard()
+            board.applyFen(fen)
+            for lmove in genAllMoves(board):
+                board.applyMove(lmove)
+                if board.opIsChecked():
+                    board.popMove()
+                    continue
+                board.popMove()
+
+                san = toSAN(board, lmove)
+                self.assertEqual(parseTrustedSAN(board, san), lmove)
+                self.assertEqual(parseTrustedSAN(board, san), parseSAN(board, san))
+
 
 if __name__ == '__main__':
     unittest.main()
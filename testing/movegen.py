@@ -1,7 +1,10 @@
 from __future__ import print_function
 import unittest
 
-from pychess.Utils.lutils.lmovegen import genAllMoves, genCheckEvasions
+from pychess.Utils.lutils.lmovegen import genAllMoves, genCheckEvasions, isPseudoLegal
+from pychess.Utils.lutils.lsort import pickMoves
+from pychess.Utils.lutils.perft import countNodes, divide
+from pychess.Utils.lutils.TranspositionTable import TranspositionTable
 from pychess.Utils.lutils.LBoard import LBoard
 from pychess.Utils.lutils.bitboard import toString, iterBits
 from pychess.Utils.lutils.ldata import *
@@ -172,5 +175,68 @@ class FindMovesTestCase(unittest.TestCase):
         self.MAXDEPTH = 3
         self.movegen(positions, MAKRUKCHESS)
 
+    def testMovegen6(self):
+        """Testing NORMAL variant move generator with the rotated bitboard tables"""
+        print()
+        self.MAXDEPTH = 2
+        positions = []
+        for line in open('gamefiles/perftsuite.epd'):
+            if line.startswith("#"):
+                continue
+            parts = line.split(";")
+            depths = [(int(s[1]), int(s[3:].rstrip())) for s in parts[1:]]
+            positions.append( (parts[0], depths) )
+
+        setSliderTables(False)
+        try:
+            self.movegen(positions, NORMALCHESS)
+        finally:
+            setSliderTables(SLIDER_TABLES)
+
+    def testMovegen7(self):
+        """Testing isPseudoLegal and the staged move picker with perftsuite.epd"""
+        boards = []
+        for line in open('gamefiles/perftsuite.epd'):
+            board = LBoard(NORMALCHESS)
+            board.applyFen(line.split(";")[0])
+            boards.append(board)
+        allMoves = set()
+        for board in boards:
+            allMoves.update(genAllMoves(board))
+        allMoves = sorted(allMoves)
+
+        table = TranspositionTable(1024 * 1024)
+        for i, board in enumerate(boards):
+            moves = set(genAllMoves(board))
+            for move in allMoves:
+                self.assertEqual(isPseudoLegal(board, move), move in moves)
+
+            if board.isChecked():
+                continue
+            # Hash moves and killers from other positions must be left out
+            table.killer1[3] = allMoves[i % len(allMoves)]
+            table.killer2[3] = allMoves[-i % len(allMoves)]
+            for hashmove in (None, allMoves[3*i % len(allMoves)]):
+                picked = list(pickMoves(board, table, 3, hashmove))
+                self.assertEqual(len(picked), len(moves))
+                self.assertEqual(set(picked), moves)
+
+    def testMovegen8(self):
+        """Testing the perft tool with bulk counting and the perft hash"""
+        for line in open('gamefiles/perftsuite.epd'):
+            parts = line.split(";")
+            board = LBoard(NORMALCHESS)
+            board.applyFen(parts[0])
+            for s in parts[1:4]:
+                depth, count = int(s[1]), int(s[3:].rstrip())
+                self.assertEqual(countNodes(board, depth), count)
+                self.assertEqual(countNodes(board, depth, hashSize=1024 * 1024), count)
+
+        board = LBoard(NORMALCHESS)
+        board.applyFen(FEN_START)
+        counts = divide(board, 3, processes=2)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(sum(count for move, count in counts), 8902)
+
 if __name__ == '__main__':
     unittest.main()
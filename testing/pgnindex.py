@@ -0,0 +1,156 @@
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from array import array
+from io import BytesIO
+
+from pychess.compat import StringIO, open
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Database.dbwalk import walk
+from pychess.Savers import pgnbase
+from pychess.Savers.pgnbase import pgn_load
+from pychess.System.protoopen import protoopen, uriEnding
+
+
+def gzipCompress(data):
+    # gzip.compress is new in Python 3.2
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class PgnIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "world_matches.pgn")
+        shutil.copy('gamefiles/world_matches.pgn', self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test1(self):
+        """Testing that indexed games match the line by line split"""
+        with open(self.path, encoding="latin_1") as f:
+            expected = [tuple(game) for game in pgnbase._readGames(f)]
+        with open(self.path, encoding="latin_1") as f:
+            cf = pgn_load(f)
+        self.assertEqual(len(cf), len(expected))
+        self.assertEqual(list(cf.games), expected)
+        self.assertEqual(cf.games[-1], expected[-1])
+
+    def test2(self):
+        """Testing games from a file object that can't be mapped"""
+        text = '1. e4 e5\n\n[Event "a"]\n[White "b"]\n\n1. d4 *\n%escaped\n[Event "c"]\n1. c4 *\n'
+        cf = pgn_load(StringIO(text))
+        self.assertEqual(list(cf.games), [
+            ("", "1. e4 e5\n"),
+            ('[Event "a"]\n[White "b"]\n', "1. d4 *\n"),
+            ('[Event "c"]\n', "1. c4 *\n")])
+        self.assertEqual(cf.get_player_names(1), ("b", "Unknown"))
+
+    def test3(self):
+        """Testing that a saved index is used again while the file is unchanged"""
+        saveSize, scanGames = pgnbase.INDEX_SAVE_SIZE, pgnbase.scanGames
+        scans = []
+        def countingScan(data):
+            scans.append(1)
+            return scanGames(data)
+        pgnbase.INDEX_SAVE_SIZE = 0
+        pgnbase.scanGames = countingScan
+        try:
+            with open(self.path, encoding="latin_1") as f:
+                count = len(pgn_load(f))
+            self.assertTrue(os.path.isfile(self.path + ".pidx"))
+            with open(self.path, encoding="latin_1") as f:
+                self.assertEqual(len(pgn_load(f)), count)
+            self.assertEqual(len(scans), 1)
+
+            with open(self.path, "a") as f:
+                f.write(u'\n[Event "new"]\n1. e4 *\n')
+            os.utime(self.path, (0, 0))
+            with open(self.path, encoding="latin_1") as f:
+                self.assertEqual(len(pgn_load(f)), count+1)
+            self.assertEqual(len(scans), 2)
+        finally:
+            pgnbase.INDEX_SAVE_SIZE, pgnbase.scanGames = saveSize, scanGames
+
+    def test4(self):
+        """Testing that the trusted replay walks like parse_string"""
+        with open(self.path, encoding="latin_1") as f:
+            cf = pgn_load(f)
+        for i in range(0, len(cf), 7):
+            walks = []
+            for trusted in (False, True):
+                board = LBoard()
+                board.applyFen(FEN_START)
+                cf.error = None
+                boards = cf.parse_string(cf.get_movetext(i), board, -1, trusted=trusted)
+                movelist, comments = array("H"), []
+                walk(boards[0], movelist, comments)
+                walks.append((movelist, comments, cf.error is None))
+            self.assertEqual(walks[0], walks[1])
+
+    def test5(self):
+        """Testing that scanning in chunks finds the games of one scan"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        lines = data.splitlines(True)
+        for size in (1, 7, 100):
+            chunks = [b"".join(lines[i:i+size]) for i in range(0, len(lines), size)]
+            offsets, length = pgnbase.scanChunks(chunks)
+            self.assertEqual(list(offsets), list(pgnbase.scanGames(data)))
+            self.assertEqual(length, len(data))
+
+    def test6(self):
+        """Testing the games of compressed pgn files"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, encoding="latin_1") as f:
+            cf = pgn_load(f)
+            expected = [cf.games[i] for i in range(len(cf))]
+
+        paths = []
+        for ending, compress in (("gz", gzipCompress), ("bz2", bz2.compress)):
+            paths.append("%s.%s" % (self.path, ending))
+            with open(paths[-1], "wb") as f:
+                f.write(compress(data))
+        paths.append(os.path.join(self.tmpdir, "world_matches.zip"))
+        with zipfile.ZipFile(paths[-1], "w") as zf:
+            zf.writestr("world_matches.pgn", data)
+
+        for path in paths:
+            self.assertEqual(uriEnding(path), "pgn")
+            done = []
+            with protoopen(path) as f:
+                cf = pgn_load(f, progress=done.append)
+                self.assertEqual(done[-1], 1.0)
+                self.assertEqual([cf.games[i] for i in range(len(cf))], expected)
+                # backwards
+                self.assertEqual(cf.games[3], expected[3])
+
+        # Only local files are decompressed
+        self.assertEqual(uriEnding("http://example.com/world_matches.pgn.gz"), "gz")
+
+    def test7(self):
+        """Testing the lines of compressed fen files"""
+        fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1\n"
+        path = os.path.join(self.tmpdir, "start.fen.gz")
+        with open(path, "wb") as f:
+            f.write(gzipCompress(fen.encode("latin_1") * 2))
+
+        self.assertEqual(uriEnding(path), "fen")
+        with protoopen(path) as f:
+            self.assertEqual(f.readline(), fen)
+            self.assertEqual([line for line in f], [fen])
+
+
+if __name__ == '__main__':
+    unittest.main()
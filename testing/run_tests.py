@@ -18,6 +18,15 @@ modules_to_test = (
     "suicide",
     "zobrist",
     "polyglot",
+    "transposition",
+    "batcheval",
+    "pgnindex",
+    "gameformat",
+    "enginepool",
+    "analysisthrottle",
+    "batchanalysis",
+    "tournament",
+    "search",
     'ficsmanagers',
     'analysis',
     ) 
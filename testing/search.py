@@ -0,0 +1,42 @@
+import sys
+import unittest
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils.ldata import MATE_VALUE
+from pychess.Utils.lutils.lmove import toSAN
+from pychess.Utils.lutils import lsearch
+
+
+class SearchTestCase(unittest.TestCase):
+
+    def setUp (self):
+        lsearch.table.clear()
+        lsearch.searching = True
+        lsearch.endtime = sys.maxsize
+
+    def search (self, fen, maxDepth):
+        board = LBoard(NORMALCHESS)
+        board.applyFen(fen)
+        stats = None
+        for depth in range(1, maxDepth+1):
+            mvs, score, stats = lsearch.iterate(board, depth, stats)
+        return board, mvs, score, stats
+
+    def test1(self):
+        """Testing that a mate in two is found"""
+        board, mvs, score, stats = self.search("7k/8/5K2/8/8/8/8/R7 w - - 0 1", 4)
+        self.assertTrue(toSAN(board, mvs[0]) in ("Kg6", "Kf7"))
+        self.assertEqual(score, MATE_VALUE-3)
+
+    def test2(self):
+        """Testing the search statistics of an iteration"""
+        board, mvs, score, stats = self.search(FEN_START, 4)
+        self.assertEqual(stats.depth, 4)
+        self.assertEqual(stats.score, score)
+        self.assertTrue(0 < stats.qnodes < stats.nodes)
+        self.assertTrue(0 < stats.firstCutoffs <= stats.cutoffs)
+        self.assertTrue(stats.ebf > 0)
+
+if __name__ == '__main__':
+    unittest.main()
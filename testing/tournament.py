@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.ldata import MATE_VALUE
+from pychess.Players.tournament import round_robin, gauntlet, schedule, \
+    epd_openings, parseScore, Adjudicator, eloDifference, los, Standings, \
+    readFinished, cpuSets
+
+
+FINISHED = """[Event "Test"]
+[Round "1"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0
+
+[Event "Test"]
+[Round "2"]
+[White "B"]
+[Black "A"]
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+
+"""
+
+class TournamentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test1(self):
+        """Testing the round robin and gauntlet schedules"""
+        self.assertEqual(round_robin(3), [(0, 1), (1, 0), (0, 2), (2, 0), (1, 2), (2, 1)])
+        self.assertEqual(len(round_robin(4, rounds=2)), 24)
+        self.assertEqual(gauntlet(3), [(0, 1), (1, 0), (0, 2), (2, 0)])
+
+        pairings = schedule(gauntlet(3), openings=3)
+        self.assertEqual([p.game for p in pairings], [1, 2, 3, 4])
+        self.assertEqual([p.opening for p in pairings], [0, 0, 1, 1])
+        self.assertEqual([p.opening for p in schedule(gauntlet(3))], [None] * 4)
+
+    def test2(self):
+        """Testing the openings of epd files"""
+        with open(self.path, "w") as f:
+            f.write("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - id \"e4\";\n\n")
+        self.assertEqual(epd_openings(self.path),
+            [("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1", [])])
+
+    def test3(self):
+        """Testing the scores of engine output"""
+        self.assertEqual(parseScore("info depth 12 seldepth 18 score cp -35 nodes 1000 pv e2e4\n"), (-35, "12"))
+        self.assertEqual(parseScore("info depth 20 score mate 3 pv e2e4"), (MATE_VALUE, "20"))
+        self.assertEqual(parseScore("info depth 9 score cp 40 lowerbound pv e2e4"), None)
+        self.assertEqual(parseScore("info nodes 1000 nps 5000"), None)
+        self.assertEqual(parseScore(" 9     156      65    286142 Nf3 Nf6 c4"), (156, "9"))
+        self.assertEqual(parseScore("move e2e4"), None)
+
+    def test4(self):
+        """Testing the adjudication from scores"""
+        adjudicator = Adjudicator(resignMoves=2, resignScore=500, drawMoveNumber=30,
+                                  drawMoves=2, drawScore=5)
+        self.assertEqual(adjudicator.adjudicate([0, 600, 700, 650], 10), None)
+        self.assertEqual(adjudicator.adjudicate([0, 600, 700, 650, 800], 10),
+                         (WHITEWON, WON_ADJUDICATION))
+        self.assertEqual(adjudicator.adjudicate([-600, None, -700, -900], 10), None)
+        self.assertEqual(adjudicator.adjudicate([0, 3, -2, 0], 20), None)
+        self.assertEqual(adjudicator.adjudicate([0, 3, -2, 0], 30), (DRAW, DRAW_ADJUDICATION))
+
+    def test5(self):
+        """Testing the Elo and LOS of the standings"""
+        self.assertAlmostEqual(eloDifference(0.75), 190.85, places=2)
+        self.assertEqual(eloDifference(1), None)
+        self.assertEqual(los(5, 5), 0.5)
+        self.assertTrue(los(10, 2) > 0.98)
+
+        standings = Standings(["A", "B"])
+        standings.record(0, 1, WHITEWON)
+        standings.record(1, 0, DRAW)
+        rows = standings.table()
+        self.assertEqual([row[0] for row in rows], ["A", "B"])
+        self.assertEqual(rows[0][1:6], (2, 1, 0, 1, 1.5))
+
+    def test6(self):
+        """Testing the resume from a partial pgn file"""
+        with open(self.path, "w") as f:
+            f.write(FINISHED + '[Event "Test"]\n[Round "3"]\n[White "A"]\n[Black "B"]\n[Result "0-1"]\n\n1. f3 e5 2.')
+        self.assertEqual(readFinished(self.path),
+                         {1: ("A", "B", WHITEWON), 2: ("B", "A", DRAW)})
+        with open(self.path) as f:
+            self.assertEqual(f.read(), FINISHED)
+
+    def test7(self):
+        """Testing the split of the cpus between games"""
+        self.assertEqual(cpuSets(2, range(5)), [set([0, 1]), set([2, 3])])
+        self.assertEqual(cpuSets(4, range(2)), [None] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
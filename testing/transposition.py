@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils.TranspositionTable import TranspositionTable, \
+    SharedTranspositionTable, entryType
+
+
+class TranspositionTableTestCase(unittest.TestCase):
+
+    def setUp (self):
+        self.board = LBoard(NORMALCHESS)
+        self.board.applyFen(FEN_START)
+        self.table = TranspositionTable(1024 * 1024)
+
+    def _index (self, table):
+        baseIndex = (self.board.hash % table.buckets) * 4
+        for i in range(baseIndex, baseIndex + 4):
+            if entryType.unpack_from(table.data, i * entryType.size) != (0, 0, 0):
+                return i
+
+    def test1(self):
+        """Testing record and probe of an entry"""
+        self.table.record(self.board, 796, -150, hashfEXACT, 5)
+        self.assertEqual(self.table.probe(self.board, 5, -1000, 1000), (796, -150, hashfEXACT))
+        self.assertEqual(self.table.probe(self.board, 6, -1000, 1000), (796, -150, hashfBAD))
+
+    def test2(self):
+        """Testing that torn entries are not used"""
+        self.table.record(self.board, 796, 150, hashfEXACT, 5)
+        offset = self._index(self.table) * entryType.size
+        check, info, result = entryType.unpack_from(self.table.data, offset)
+        # Half of another write, with a different move
+        entryType.pack_into(self.table.data, offset, check, info, result ^ 1 << 16)
+        self.assertEqual(self.table.probe(self.board, 5, -1000, 1000), None)
+
+    def test3(self):
+        """Testing hashfull and resize"""
+        self.assertEqual(self.table.hashfull(), 0)
+        self.table.record(self.board, 796, 150, hashfEXACT, 5)
+        self.table.resize(2 * 1024 * 1024)
+        self.assertEqual(self.table.probe(self.board, 5, -1000, 1000), None)
+        self.assertEqual(self.table.buckets, 2 * 1024 * 1024 // (4 * entryType.size))
+
+    def test4(self):
+        """Testing a table shared through a named segment"""
+        name = "pychess-test-%s" % os.getpid()
+        table1 = SharedTranspositionTable(1024 * 1024, name)
+        try:
+            table2 = SharedTranspositionTable(4 * 1024 * 1024, name)
+            # The second table keeps the size of the first one
+            self.assertEqual(table1.buckets, table2.buckets)
+            table1.record(self.board, 796, 150, hashfEXACT, 5)
+            self.assertEqual(table2.probe(self.board, 5, -1000, 1000), (796, 150, hashfEXACT))
+            table2.close()
+        finally:
+            table1.close()
+
+if __name__ == '__main__':
+    unittest.main()
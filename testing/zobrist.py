@@ -1,9 +1,11 @@
+import pickle
 import unittest
 
 from pychess.Utils.const import *
 from pychess.Utils.Board import Board
 from pychess.Utils.lutils.leval import LBoard
 from pychess.Utils.lutils.lmove import parseAN
+from pychess.Utils.lutils.lmovegen import newMove
 
 FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
 
@@ -92,5 +94,62 @@ class ZobristTestCase(unittest.TestCase):
 
         self.assertEqual(hash1, hash2)
 
+    def testZobrist_5(self):
+        """Testing zobrist hashing with null move and take back"""
+        
+        self.make_move("a2a4")
+        fen = self.board.asFen()
+        hash = self.board.hash
+        pawnhash = self.board.pawnhash
+        
+        self.board.applyMove(newMove(0, 0, NULL_MOVE))
+        self.make_move("e8g8")
+        self.board.popMove()
+        self.board.popMove()
+
+        self.assertEqual(fen, self.board.asFen())
+        self.assertEqual(hash, self.board.hash)
+        self.assertEqual(pawnhash, self.board.pawnhash)
+
+    def testZobrist_6(self):
+        """Testing that a board and its clone don't change each other"""
+
+        self.make_move("a2a4")
+        fen = self.board.asFen()
+        hash = self.board.hash
+
+        clone = self.board.clone()
+        clone.applyMove(parseAN(clone, "b4a3"))
+        clone_fen = clone.asFen()
+
+        self.make_move("e8g8")
+        self.board.popMove()
+        self.board.popMove()
+
+        self.assertEqual(clone_fen, clone.asFen())
+        clone.popMove()
+        clone.popMove()
+
+        self.assertEqual(FEN, clone.asFen())
+        self.assertEqual(FEN, self.board.asFen())
+        self.board.applyMove(parseAN(self.board, "a2a4"))
+        self.assertEqual(fen, self.board.asFen())
+        self.assertEqual(hash, self.board.hash)
+
+    def testZobrist_7(self):
+        """Testing the pickling of a board with a long history"""
+
+        for i in range(1000):
+            self.make_move(("c3b1", "f6g8", "b1c3", "g8f6")[i % 4])
+        fen = self.board.asFen()
+        board = pickle.loads(pickle.dumps(self.board.clone(), 2))
+
+        self.assertEqual(fen, board.asFen())
+        self.assertEqual(self.board.hist_move, board.hist_move)
+        for i in range(1000):
+            board.popMove()
+        self.assertEqual(FEN, board.asFen())
+        self.assertEqual(fen, self.board.asFen())
+
 if __name__ == '__main__':
     unittest.main()
@@ -42,11 +42,16 @@ Log.DEBUG = False
 ###############################################################################
 # Do the rest of the imports
 from pychess.Players.engineNest import discoverer
+from pychess.System import SubProcess
 from pychess.Savers.pgn import save
 from pychess.Utils.GameModel import GameModel
 from pychess.Utils.TimeModel import TimeModel
 from pychess.Variants import variants
 
+# Parse the engine output on the engine reader threads, rather than waiting
+# for the main loop
+SubProcess.dispatch = SubProcess.direct_dispatch
+
 ###############################################################################
 # Look up engines
 def prepare():
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+    PyChess batch analysis script.
+    This script analyzes every position of the games of a pgn file, or of a
+    PyChess database, with a number of engine processes. Evaluations, the
+    better lines of the mistakes and the mistake and blunder nags are written
+    to an annotated pgn file, or back into the database.
+    An interrupted run is resumed by running the same command again.
+
+    PYTHONPATH=lib/ python batch_analysis.py [options] FILENAME
+'''
+from __future__ import print_function
+
+import sys
+import atexit
+from threading import Event
+
+from pychess.System import SubProcess
+from pychess.Players.engineNest import discoverer
+from pychess.Players.batchAnalysis import BatchAnalyzer, pgn_games, \
+    database_games, PgnWriter, database_writer
+
+# No main loop runs here, the engine output is parsed on the reader threads
+SubProcess.dispatch = SubProcess.direct_dispatch
+
+USAGE = """Usage: python batch_analysis.py [options] FILENAME
+  FILENAME             a pgn file, or a .pdb PyChess database
+Options:
+  --engine=NAME        the analyzer engine, by default the last one found
+  --workers=N          number of engine processes, 1 by default
+  --time=SECS          seconds of analysis of each position, 1 by default
+  --mistake=CP         centipawns lost by a mistake, 100 by default
+  --blunder=CP         centipawns lost by a blunder, 300 by default
+  --output=FILENAME    the annotated pgn file, FILENAME.analyzed.pgn by default
+  --white=NAME --black=NAME --player=NAME --eco=CODE
+                       only analyze the database games matching these
+  --help               display this help and exit"""
+
+def option(name, default=None):
+    for arg in sys.argv[1:]:
+        if arg.startswith("--%s=" % name):
+            return arg[len(name)+3:]
+    return default
+
+args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+if len(args) != 1 or "--help" in sys.argv:
+    print(USAGE)
+    sys.exit()
+path = args[0]
+
+discovered = Event()
+discoverer.connect("all_engines_discovered", lambda discoverer: discovered.set())
+discoverer.discover()
+discovered.wait()
+atexit.register(SubProcess.finishAllSubprocesses)
+
+analyzers = list(discoverer.getAnalyzers())
+if option("engine"):
+    engine = discoverer.getEngineByName(option("engine"))
+else:
+    engine = analyzers[-1] if analyzers else None
+if engine is None:
+    print("No analyzer engine found")
+    sys.exit(1)
+
+if path.lower().endswith(".pdb"):
+    from pychess.Database.model import set_engine
+    set_engine("sqlite:///" + path)
+    filters = dict((key, option(key)) for key in ("white", "black", "player", "eco")
+                   if option(key))
+    games = database_games(filters)
+    write = database_writer
+    checkpoint = path + ".checkpoint"
+else:
+    games = pgn_games(path)
+    output = option("output", path.rsplit(".", 1)[0] + ".analyzed.pgn")
+    write = PgnWriter(output)
+    checkpoint = output + ".checkpoint"
+
+def progress(key, analyzed, total):
+    sys.stdout.write("\rGame %s: %d/%d positions " % (key, analyzed, total))
+    sys.stdout.flush()
+
+print("%s will analyze %s with %s processes" % \
+    (discoverer.getName(engine), path, option("workers", 1)))
+analyzer = BatchAnalyzer(engine, int(option("workers", 1)), float(option("time", 1)),
+                         int(option("mistake", 100)), int(option("blunder", 300)),
+                         checkpoint)
+analyzer.run(games, write, progress)
+print()
+print("Finished")
@@ -31,6 +31,10 @@ from pychess.Utils.const import *
 from pychess.Utils.Move import listToSan, toSAN
 from pychess.Savers import pgn
 
+# Parse the engine output on the engine reader threads, rather than waiting
+# for the main loop
+SubProcess.dispatch = SubProcess.direct_dispatch
+
 if PY2:
     # This hack fixes some UnicodDecode Errors caused pygi not making
     # magic hidden automatic unicode conversion pygtk did
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+    PyChess perft tool.
+    Counts the leaf nodes of the move tree of a position, or checks the counts
+    of an epd suite like testing/gamefiles/perftsuite.epd, where every line
+    holds a fen and ;D<depth> <count> fields. Prints one JSON object per count,
+    and exits with status 1 if any count of a suite was wrong.
+
+    PYTHONPATH=lib/ python3 utilities/perft.py [options] "<fen>" depth
+    PYTHONPATH=lib/ python3 utilities/perft.py [options] --epd suite.epd [maxdepth]
+'''
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+from time import time
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Utils.lutils.lmove import toAN
+from pychess.Utils.lutils.perft import divide
+from pychess.Variants import variants
+
+def variant_by_name (name):
+    for variant, board in variants.items():
+        if board.cecp_name == name:
+            return variant
+    raise argparse.ArgumentTypeError("unknown variant %s" % name)
+
+def run (fen, depth, args):
+    board = LBoard(args.variant)
+    board.applyFen(fen)
+    start = time()
+    counts = divide(board, depth, args.jobs, args.hash * 1024 * 1024)
+    elapsed = time() - start
+    nodes = sum(count for move, count in counts) if depth else 1
+    result = {"fen": fen, "depth": depth, "nodes": nodes,
+              "time": round(elapsed, 3),
+              "nps": int(nodes / elapsed) if elapsed else None}
+    if args.divide:
+        result["divide"] = dict((toAN(board, move), count) for move, count in counts)
+    return result
+
+def main (argv):
+    parser = argparse.ArgumentParser(description="PyChess perft tool")
+    parser.add_argument("fen", nargs="?", help="position to count, if no --epd")
+    parser.add_argument("depth", type=int, nargs="?", help="depth, or the maximum depth of --epd")
+    parser.add_argument("--epd", help="check the counts of an epd perft suite")
+    parser.add_argument("--variant", type=variant_by_name, default=NORMALCHESS,
+                        help="variant, by its cecp name, e.g. fischerandom")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of processes searching the root moves")
+    parser.add_argument("--hash", type=int, default=0,
+                        help="megabytes of perft hash per process")
+    parser.add_argument("--divide", action="store_true",
+                        help="include the counts of the root moves")
+    args = parser.parse_args(argv)
+
+    if args.epd is None:
+        if args.fen is None or args.depth is None:
+            parser.error("a fen and a depth are needed without --epd")
+        print(json.dumps(run(args.fen, args.depth, args)))
+        return 0
+
+    if args.depth is None and args.fen is not None and args.fen.isdigit():
+        args.depth = int(args.fen)
+    failed = 0
+    for line in open(args.epd):
+        if not line.strip() or line.startswith("#"):
+            continue
+        parts = line.split(";")
+        for part in parts[1:]:
+            depth, expected = part.strip()[1:].split()
+            depth = int(depth)
+            if args.depth is not None and depth > args.depth:
+                continue
+            result = run(parts[0].strip(), depth, args)
+            result["expected"] = int(expected)
+            if result["nodes"] != result["expected"]:
+                failed += 1
+            print(json.dumps(result))
+            sys.stdout.flush()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
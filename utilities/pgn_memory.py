@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+    PyChess pgn memory benchmark.
+    Measures the memory the LBoard trees of the games in a pgn file take.
+    First all games are parsed and kept, like a GameModel keeps the boards of a
+    loaded game, then they are parsed one at a time and dropped again, like
+    PgnImport.do_import does.
+
+    PYTHONPATH=lib/ python3 utilities/pgn_memory.py games.pgn [maxgames]
+'''
+from __future__ import print_function
+
+import sys
+import tracemalloc
+
+from pychess.Utils.const import *
+from pychess.Utils.lutils.LBoard import LBoard
+from pychess.Savers.pgnbase import pgn_load
+
+def parse_game (cf, gameno):
+    fenstr = cf._getTag(gameno, "FEN")
+    variant = cf.get_variant(gameno)
+    board = LBoard(FISCHERRANDOMCHESS if variant == "Fischerandom" else NORMALCHESS)
+    board.applyFen(fenstr if fenstr else FEN_START)
+    cf.error = None
+    return cf.parse_string(cf.get_movetext(gameno), board, -1)
+
+def count_boards (boards):
+    count = 0
+    for board in boards:
+        count += 1
+        for child in board.children:
+            if isinstance(child, list):
+                count += count_boards(child)
+    return count
+
+def main (filename, maxgames):
+    cf = pgn_load(open(filename))
+    games = range(min(len(cf), maxgames))
+
+    tracemalloc.start()
+    kept = [parse_game(cf, i) for i in games]
+    current, peak = tracemalloc.get_traced_memory()
+    nboards = sum(count_boards(boards) for boards in kept)
+    print("Kept %d games, %d boards" % (len(kept), nboards))
+    print("  memory: %d kB, %d bytes/board" % (current // 1024, current // max(nboards, 1)))
+    del kept
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    for i in games:
+        parse_game(cf, i)
+    current, peak = tracemalloc.get_traced_memory()
+    print("Parsed %d games one at a time" % len(games))
+    print("  peak memory: %d kB" % (peak // 1024))
+    tracemalloc.stop()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else sys.maxsize)
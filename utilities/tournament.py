@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+    PyChess tournament script.
+    This script plays a round robin or gauntlet tournament between engines
+    installed on your system, without asking anything. A number of games
+    are played at a time, each with its engines pinned to processors of
+    their own, and games are adjudicated from the engine scores.
+    The games are appended to a pgn file. A stopped tournament is resumed by
+    running the same command again.
+
+    PYTHONPATH=lib/ python tournament.py [options]
+'''
+from __future__ import print_function
+
+import sys
+import atexit
+from threading import Event
+
+from pychess.System import SubProcess
+from pychess.Utils.const import reprResult
+from pychess.Players.engineNest import discoverer
+from pychess.Players.tournament import Tournament, Adjudicator, round_robin, \
+    gauntlet, schedule, load_openings
+
+# No main loop runs here, the engine output is parsed on the reader threads
+SubProcess.dispatch = SubProcess.direct_dispatch
+
+USAGE = """Usage: python tournament.py [options]
+Options:
+  --engines=A,B,...    the engines playing, all installed engines by default
+  --gauntlet           the first engine plays the others, rather than a
+                       round robin between all of them
+  --rounds=N           number of rounds, 1 by default
+  --time=SECS          seconds on the clock of each player, 60 by default
+  --incr=SECS          seconds added to the clock after each move, 0 by default
+  --concurrency=N      number of games played at a time, 1 by default
+  --nopin              don't pin the engines of each game to processors
+  --openings=FILENAME  an epd or pgn file of the openings to start games from
+  --resign=MOVES,CP    adjudicate a game won after MOVES moves of each engine
+                       scoring it CP centipawns, 3,600 by default
+  --draw=MOVE,MOVES,CP adjudicate a game drawn from move number MOVE on, after
+                       MOVES moves of each engine scoring it within CP
+                       centipawns of equality, 40,8,10 by default
+  --output=FILENAME    the pgn file of the games, tournament.pgn by default
+  --event=NAME         the Event tag of the games
+  --help               display this help and exit"""
+
+def option(name, default=None):
+    for arg in sys.argv[1:]:
+        if arg.startswith("--%s=" % name):
+            return arg[len(name)+3:]
+    return default
+
+def numbers(name, default):
+    return [int(value) for value in option(name, default).split(",")]
+
+if "--help" in sys.argv:
+    print(USAGE)
+    sys.exit()
+
+discovered = Event()
+discoverer.connect("all_engines_discovered", lambda discoverer: discovered.set())
+discoverer.discover()
+discovered.wait()
+atexit.register(SubProcess.finishAllSubprocesses)
+
+if option("engines"):
+    try:
+        engines = [discoverer.getEngineByName(name) for name in option("engines").split(",")]
+    except ValueError:
+        print("Unknown engine in %s" % option("engines"))
+        sys.exit(1)
+else:
+    engines = discoverer.getEngines()
+if len(engines) < 2:
+    print("A tournament needs at least two engines")
+    sys.exit(1)
+
+rounds = int(option("rounds", 1))
+if "--gauntlet" in sys.argv:
+    pairs = gauntlet(len(engines), rounds)
+else:
+    pairs = round_robin(len(engines), rounds)
+openings = load_openings(option("openings")) if option("openings") else []
+pairings = schedule(pairs, len(openings))
+
+resignMoves, resignScore = numbers("resign", "3,600")
+drawMoveNumber, drawMoves, drawScore = numbers("draw", "40,8,10")
+adjudicator = Adjudicator(resignMoves, resignScore, drawMoveNumber, drawMoves, drawScore)
+
+tournament = Tournament(engines, pairings, openings,
+                        float(option("time", 60)), float(option("incr", 0)),
+                        int(option("concurrency", 1)), adjudicator,
+                        pin="--nopin" not in sys.argv,
+                        event=option("event", "PyChess tournament"))
+output = option("output", "tournament.pgn")
+
+def progress(pairing, status, reason):
+    print("Game %d: %s - %s %s" % (pairing.game, tournament.names[pairing.white],
+                                   tournament.names[pairing.black], reprResult[status]))
+
+print("Playing %d games between %s" % (len(pairings), ", ".join(tournament.names)))
+standings = tournament.run(output, progress)
+print()
+print(standings)